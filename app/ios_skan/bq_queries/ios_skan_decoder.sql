@@ -37,13 +37,13 @@ AS (
     SkanInputSchema AS (
       SELECT
         app_id,
-        CAST(skan_conversion_value AS INT64) AS skan_conversion_value,
+        skan_conversion_value,
         skan_event_count,
         skan_event_value_low,
         skan_event_value_high,
         skan_event_value_mean,
         skan_mapped_event
-      FROM `{bq_dataset}.skan_schema_input_table`
+      FROM `{bq_dataset}.skan_schema_lookup`
     ),
     PreparedData AS (
       SELECT
@@ -337,7 +337,8 @@ print_configuration() {
 run_google_ads_queries() {
   echo -e "${COLOR}===fetching ads data for $1===${NC}"
     local config_file=${2:-$config_file}
-    gaarf $(dirname $0)/$1/google_ads_queries/*.sql -c=$config_file \
+    $(which python3) $(dirname $0)/scripts/fetch_ads_queries.py \
+      $(dirname $0)/$1/google_ads_queries/*.sql -c=$config_file \
       --ads-config=$ads_config --log=$loglevel --api-version=$API_VERSION
 }
 
@@ -416,7 +417,6 @@ run_with_config() {
   if [[ $modules =~ "core" ]]; then
     echo -e "${COLOR}===Running 'core' module===${NC}"
     check_initial_load "ad_group_network_split"
-    check_missing_incremental_snapshot "ad_group_network_split"
     define_runtime_config "ad_group_network_split"
     run_google_ads_queries "core" $runtime_config
     echo -e "${COLOR}===calculating conversion lag adjustment===${NC}"
@@ -438,12 +438,11 @@ run_with_config() {
   if [[ $modules =~ "assets" ]]; then
     echo -e "${COLOR}===Running 'assets' module===${NC}"
     check_initial_load "asset_performance"
-    check_missing_incremental_snapshot "asset_performance"
     define_runtime_config "asset_performance"
     run_google_ads_queries "assets" $runtime_config
     echo -e "${COLOR}===getting video orientation===${NC}"
     $(which python3) $(dirname $0)/scripts/fetch_video_orientation.py \
-      -c=$config_file \
+      -c=$config_file --incremental \
       --ads-config=$ads_config --log=$loglevel --api-version=$API_VERSION
     infer_answer_from_config $config_file backfill
     if [[ $backfill = "y" ]]; then
@@ -463,7 +462,6 @@ run_with_config() {
   if [[ $modules =~ "geo" ]]; then
     echo -e "${COLOR}===Running 'geo' module===${NC}"
     check_initial_load "geo_performance"
-    check_missing_incremental_snapshot "geo_performance"
     define_runtime_config "geo_performance"
     run_google_ads_queries "geo" $runtime_config
     run_bq_queries "geo"
@@ -471,7 +469,6 @@ run_with_config() {
   if [[ $modules =~ "ios_skan" ]]; then
     echo -e "${COLOR}===Running 'ios_skan' module===${NC}"
     check_initial_load "skan_decoder"
-    check_missing_incremental_snapshot "skan_decoder"
     define_runtime_config "skan_decoder"
     if cat "$config_file" | grep -q skan_mode:; then
     run_google_ads_queries "ios_skan" $runtime_config
@@ -15,11 +15,14 @@
 
 import argparse
 import datetime
-import functools
 import itertools
 import logging
+import re
+import time
+import uuid
 from bisect import bisect_left
-from collections.abc import Sequence
+from collections.abc import Iterable, Sequence
+from concurrent import futures
 from typing import Generator
 
 import gaarf
@@ -28,9 +31,13 @@ import pandas as pd
 from gaarf import api_clients
 from gaarf.cli import utils as gaarf_utils
 from gaarf.executors import bq_executor
-from gaarf.io.writers import bigquery_writer
 from google.api_core import exceptions as google_api_exceptions
-from src import queries
+from src import cache, fetchers, queries, writers
+
+_BID_BUDGET_EVENT_TYPES = ('budget_amount', 'target_cpa', 'target_roas')
+_BID_BUDGETS_TABLE_PREFIX = 'bid_budgets_'
+_CHANGE_HISTORY_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+_MIN_CHANGE_HISTORY_WINDOW = datetime.timedelta(minutes=1)
 
 
 def get_new_date_for_missing_incremental_snapshots(
@@ -50,30 +57,82 @@ def get_new_date_for_missing_incremental_snapshots(
       table_name: BQ table that are checked for incremental snapshots.
   """
   start_date = ''
-  base_table_id = f'{bigquery_executor.project_id}.{bq_dataset}.{table_name}'
-  base_output_table_id = (
-    f'{bigquery_executor.project_id}.{bq_dataset}_output.{table_name}'
-  )
+  output_dataset = f'{bq_dataset}_output'
+  if missing_snapshot := find_missing_incremental_snapshot(
+    bigquery_executor, output_dataset, table_name
+  ):
+    new_start_date, suffix = missing_snapshot
+    delete_ddl = (
+      f'DROP TABLE `{bigquery_executor.project_id}.{output_dataset}.'
+      f'{table_name}_{suffix}`;'
+    )
+    try:
+      bigquery_executor.execute('drop_table', delete_ddl)
+      start_date = new_start_date
+    except bq_executor.BigQueryExecutorException:
+      pass
+  print(start_date)
+
+
+def find_missing_incremental_snapshot(
+  bigquery_executor: bq_executor.BigQueryExecutor,
+  dataset: str,
+  table_name: str,
+  current_date: datetime.date | None = None,
+) -> tuple[str, str] | None:
+  """Finds incremental snapshot that should be replaced to close data gap.
+
+  Snapshots are found based on table metadata; only the latest snapshot is
+  queried to get its first day so amount of processed data does not depend
+  on the number of snapshots.
+
+  Args:
+      bigquery_executor: Executor to run big query queries.
+      dataset: BQ dataset with incremental snapshots.
+      table_name: BQ table that are checked for incremental snapshots.
+      current_date: Date of the run, today by default.
+
+  Returns:
+      New start date in YYYY-MM-DD format and suffix of the snapshot to be
+      replaced if there's a gap in data, otherwise None.
+  """
+  current_date = current_date or datetime.date.today()
+  dataset_id = f'{bigquery_executor.project_id}.{dataset}'
+  snapshot_pattern = re.compile(rf'{re.escape(table_name)}_(\d{{8}})')
+  try:
+    suffixes = [
+      match.group(1)
+      for table in bigquery_executor.client.list_tables(dataset_id)
+      if (match := snapshot_pattern.fullmatch(table.table_id))
+    ]
+  except google_api_exceptions.NotFound:
+    return None
+  if not suffixes:
+    return None
+  latest_suffix = max(suffixes)
+  yesterday = current_date - datetime.timedelta(days=1)
+  if latest_suffix >= yesterday.strftime('%Y%m%d'):
+    return None
   try:
     result = bigquery_executor.execute(
       'missing_incremental_snapshot',
-      f'SELECT TABLE_SUFFIX, new_start_date FROM `{base_table_id}_missing`',
+      f"""
+      SELECT MIN(day) AS new_start_date
+      FROM `{dataset_id}.{table_name}_{latest_suffix}`
+      """,
     )
-
-    if not result.empty:
-      start_date = result.new_start_date.squeeze().strftime('%Y-%m-%d')
-      suffix = result.TABLE_SUFFIX.squeeze()
-      delete_ddl = f'DROP TABLE `{base_output_table_id}_{suffix}`;'
-      bigquery_executor.execute('drop_table', delete_ddl)
   except bq_executor.BigQueryExecutorException:
-    pass
-  print(start_date)
+    return None
+  if result.empty or pd.isna(new_start_date := result.new_start_date.squeeze()):
+    return None
+  return new_start_date.strftime('%Y-%m-%d'), latest_suffix
 
 
 def restore_missing_bid_budgets(
   report_fetcher: gaarf.report_fetcher.AdsReportFetcher,
   customer_ids: Sequence[str],
   date_range: tuple[str, str],
+  max_workers: int = 1,
 ) -> pd.DataFrame:
   """Fills missing gaps in bid and budget snapshots in BigQuery.
 
@@ -81,6 +140,8 @@ def restore_missing_bid_budgets(
     report_fetcher: Instantiated AdsReportFetcher to get data from Ads API.
     customer_ids: Accounts to check for bid / budgets events.
     date_range: Period for backfilling change history.
+    max_workers: Maximum number of concurrent requests to Ads API shared by
+      change history and the rest of the reports.
 
   Returns:
     DataFrame with restored change history.
@@ -97,24 +158,43 @@ def restore_missing_bid_budgets(
     len(customer_ids),
     customer_ids,
   )
-  # extract change history report
-  change_history = report_fetcher.fetch(
-    queries.ChangeHistory(start_date, end_date), customer_ids
-  ).to_pandas()
-  campaign_ids = report_fetcher.fetch(
-    queries.CampaignsWithSpend(start_date, end_date), customer_ids
-  ).to_list(row_type='scalar', distinct=True)
+  # change history is fetched in the background while the other reports
+  # are fetched concurrently, both pools share a single limit of requests
+  report_fetcher = fetchers.BoundedReportFetcher(report_fetcher, max_workers)
+  with futures.ThreadPoolExecutor(max_workers=1) as executor:
+    change_history_future = executor.submit(
+      fetch_change_history,
+      report_fetcher,
+      customer_ids,
+      date_range,
+      max_workers,
+    )
+    reports = fetchers.fetch_reports(
+      report_fetcher,
+      {
+        'campaigns_with_spend': queries.CampaignsWithSpend(
+          start_date, end_date
+        ),
+        'bids_budgets_active_campaigns': queries.BidsBudgetsActiveCampaigns(),
+        'bids_budgets_inactive_campaigns': queries.BidsBudgetsInactiveCampaigns(
+          start_date, end_date
+        ),
+      },
+      customer_ids,
+      max_workers,
+    )
+    change_history = change_history_future.result()
+  campaign_ids = reports['campaigns_with_spend'].to_list(
+    row_type='scalar', distinct=True
+  )
   logging.info(
     'Change history will be restored for %d campaign_ids', len(campaign_ids)
   )
 
   current_bids_budgets = (
     (
-      report_fetcher.fetch(queries.BidsBudgetsActiveCampaigns(), customer_ids)
-      + report_fetcher.fetch(
-        queries.BidsBudgetsInactiveCampaigns(start_date, end_date),
-        customer_ids,
-      )
+      reports['bids_budgets_active_campaigns']
+      + reports['bids_budgets_inactive_campaigns']
     )
     .to_pandas()
     .drop_duplicates()
@@ -129,13 +209,133 @@ def restore_missing_bid_budgets(
   )
 
 
+def fetch_change_history(
+  report_fetcher: gaarf.report_fetcher.AdsReportFetcher,
+  customer_ids: Sequence[str],
+  date_range: tuple[str, str],
+  max_workers: int = 1,
+  limit: int = queries.CHANGE_EVENT_LIMIT,
+) -> pd.DataFrame:
+  """Fetches change history for each account and day concurrently.
+
+  Ads API returns only a limited number of change events per request so
+  change history is fetched in chunks (one account and one day each); chunks
+  that reach the limit are split in half until all events are fetched.
+
+  Args:
+    report_fetcher: Instantiated AdsReportFetcher to get data from Ads API.
+    customer_ids: Accounts to get change history for.
+    date_range: Period for fetching change history.
+    max_workers: Maximum number of concurrent requests to Ads API.
+    limit: Maximum number of change events returned by a single request.
+
+  Returns:
+    DataFrame with deduplicated change history events.
+  """
+  start_date, end_date = date_range
+  windows = [
+    (day, day + datetime.timedelta(days=1))
+    for day in pd.date_range(start_date, end_date).to_pydatetime().tolist()
+  ]
+  with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+    chunks = [
+      executor.submit(
+        _fetch_change_history_chunk,
+        report_fetcher,
+        customer_id,
+        window,
+        limit,
+      )
+      for customer_id, window in itertools.product(customer_ids, windows)
+    ]
+    if not chunks:
+      return pd.DataFrame()
+    change_history = pd.concat(
+      [chunk.result() for chunk in chunks], ignore_index=True
+    )
+  return change_history.drop_duplicates(ignore_index=True)
+
+
+def _fetch_change_history_chunk(
+  report_fetcher: gaarf.report_fetcher.AdsReportFetcher,
+  customer_id: str,
+  window: tuple[datetime.datetime, datetime.datetime],
+  limit: int,
+) -> pd.DataFrame:
+  """Fetches change history for a single account and period.
+
+  Args:
+    report_fetcher: Instantiated AdsReportFetcher to get data from Ads API.
+    customer_id: Account to get change history for.
+    window: Start and end (both inclusive) of the period.
+    limit: Maximum number of change events returned by a single request.
+
+  Returns:
+    DataFrame with change history events for the period.
+  """
+  start, end = window
+  change_history = report_fetcher.fetch(
+    queries.ChangeHistory(
+      start.strftime(_CHANGE_HISTORY_DATETIME_FORMAT),
+      end.strftime(_CHANGE_HISTORY_DATETIME_FORMAT),
+      limit,
+    ),
+    customer_id,
+  ).to_pandas()
+  if len(change_history) < limit:
+    return change_history
+  if end - start <= _MIN_CHANGE_HISTORY_WINDOW:
+    logging.warning(
+      'Change history for account %s between %s and %s exceeds %d events, '
+      'some events might be missing',
+      customer_id,
+      start,
+      end,
+      limit,
+    )
+    return change_history
+  middle = start + (end - start) // 2
+  logging.debug(
+    'Change history for account %s between %s and %s reached the limit, '
+    'splitting at %s',
+    customer_id,
+    start,
+    end,
+    middle,
+  )
+  return pd.concat(
+    [
+      _fetch_change_history_chunk(
+        report_fetcher, customer_id, (start, middle), limit
+      ),
+      _fetch_change_history_chunk(
+        report_fetcher, customer_id, (middle, end), limit
+      ),
+    ],
+    ignore_index=True,
+  )
+
+
 def _prepare_placeholders(
-  campaign_ids: list[int], dates: list[str]
+  campaign_ids: Sequence[int], dates: Sequence[str]
 ) -> pd.DataFrame:
-  """Generates all possible combinations of dates and campaign_ids."""
+  """Generates all possible combinations of dates and campaign_ids.
+
+  Args:
+    campaign_ids: Campaigns to generate placeholders for.
+    dates: Days in YYYY-MM-DD format to generate placeholders for.
+
+  Returns:
+    DataFrame with integer campaign_id and datetime day columns.
+  """
+  days = pd.to_datetime(dates, format='%Y-%m-%d').to_numpy()
   return pd.DataFrame(
-    data=list(itertools.product(campaign_ids, dates)),
-    columns=['campaign_id', 'day'],
+    {
+      'campaign_id': np.repeat(
+        np.asarray(campaign_ids, dtype=np.int64), len(days)
+      ),
+      'day': np.tile(days, len(campaign_ids)),
+    }
   )
 
 
@@ -146,6 +346,11 @@ def _restore_bid_budget_history(
 ) -> pd.DataFrame:
   """Restore change history for target roas, target_cpa, and budgets.
 
+  Placeholders are sorted by campaign_id and day only once and all event types
+  are restored in a single columnar pass: new values of events are filled
+  forward and old values of events are filled backward within each campaign,
+  remaining gaps are filled with the last observable values.
+
   Args:
     placeholders:
       Contains all possible combinations of dates for set of campaigns.
@@ -157,113 +362,135 @@ def _restore_bid_budget_history(
   Returns:
     DataFrame with merged restored change histories.
   """
-  change_history_events = [
-    _restore_event_history(
-      placeholders, change_history, current_bids_budgets, event_type
-    )
-    for event_type in ('budget_amount', 'target_cpa', 'target_roas')
-  ]
-  return functools.reduce(
-    lambda left, right: pd.merge(
-      left, right, on=['day', 'campaign_id'], how='left'
-    ),
-    change_history_events,
+  restored = placeholders[['day', 'campaign_id']].reset_index(drop=True)
+  order = restored.sort_values(
+    ['campaign_id', 'day'], kind='stable'
+  ).index.to_numpy()
+  sorted_placeholders = restored.take(order)
+  events = _prepare_events(change_history)
+  joined = pd.merge(
+    sorted_placeholders, events, on=['day', 'campaign_id'], how='left'
+  )
+  old_values = joined[
+    [f'old_{event_type}' for event_type in _BID_BUDGET_EVENT_TYPES]
+  ].to_numpy(dtype=float)
+  new_values = joined[
+    [f'new_{event_type}' for event_type in _BID_BUDGET_EVENT_TYPES]
+  ].to_numpy(dtype=float)
+
+  campaign_ids = sorted_placeholders['campaign_id'].to_numpy()
+  is_segment_start = np.ones(len(campaign_ids), dtype=bool)
+  is_segment_start[1:] = campaign_ids[1:] != campaign_ids[:-1]
+  filled_forward = _forward_fill_segments(new_values, is_segment_start)
+  filled_backward = _backward_fill_segments(old_values, is_segment_start)
+  filled = np.where(np.isnan(filled_forward), filled_backward, filled_forward)
+  inverse_order = np.empty_like(order)
+  inverse_order[order] = np.arange(len(order))
+  filled = filled[inverse_order]
+
+  current_values = pd.merge(
+    restored[['campaign_id']],
+    current_bids_budgets.drop_duplicates('campaign_id'),
+    on='campaign_id',
+    how='left',
   )
+  for i, event_type in enumerate(_BID_BUDGET_EVENT_TYPES):
+    if events[f'new_{event_type}'].notna().any():
+      restored[event_type] = np.where(
+        np.isnan(filled[:, i]),
+        current_values[event_type],
+        filled[:, i],
+      )
+    else:
+      restored[event_type] = current_values[event_type]
+    if event_type != 'target_roas':
+      restored[event_type] = restored[event_type].astype(int)
+  return restored
 
 
-def _restore_event_history(
-  placeholders: pd.DataFrame,
-  change_history: pd.DataFrame,
-  current_bids_budgets: pd.DataFrame,
-  event_type: str,
-) -> pd.DataFrame:
-  """Restores gaps in change history for a single event_type.
+def _forward_fill_segments(
+  values: np.ndarray, is_segment_start: np.ndarray
+) -> np.ndarray:
+  """Propagates last non-null value forward without crossing segments.
 
   Args:
-    placeholders:
-      Contains all possible combinations of dates for set of campaigns.
-    change_history:
-      Contains only changes in bid and budget events.
-    current_bids_budgets:
-      Contains last observable values of bid and budgets.
-    event_type:
-      Specifies type of event to restore change history for.
+    values: 2D array where each column is filled independently.
+    is_segment_start: Marks rows where a new segment (campaign) begins.
 
   Returns:
-    DataFrame with filled gaps in change history for a given event_type.
+    Array of the same shape as values with gaps filled.
   """
-  partial_history = _prepare_events(change_history, event_type)
-  if not partial_history.empty:
-    joined = pd.merge(
-      placeholders, partial_history, on=['campaign_id', 'day'], how='left'
-    )
-    joined['filled_backward'] = joined.groupby('campaign_id')[
-      'value_old'
-    ].bfill()
-    joined['filled_forward'] = joined.groupby('campaign_id')[
-      'value_new'
-    ].ffill()
-    joined['filled_forward'] = joined.groupby('campaign_id')[
-      'filled_forward'
-    ].fillna(joined.pop('filled_backward'))
-    joined = pd.merge(
-      joined, current_bids_budgets, on='campaign_id', how='left'
-    )
-    joined[event_type] = np.where(
-      joined['filled_forward'].isnull(),
-      joined[event_type],
-      joined['filled_forward'],
-    )
-  else:
-    joined = pd.merge(
-      placeholders, current_bids_budgets, on='campaign_id', how='left'
-    )
-  if event_type != 'target_roas':
-    joined[event_type] = joined[event_type].astype(int)
-  return joined[['day', 'campaign_id', event_type]]
+  positions = np.arange(len(values))
+  segment_starts = np.maximum.accumulate(
+    np.where(is_segment_start, positions, 0)
+  )
+  last_valid = np.maximum.accumulate(
+    np.where(np.isnan(values), -1, positions[:, None]), axis=0
+  )
+  filled = np.take_along_axis(values, np.maximum(last_valid, 0), axis=0)
+  return np.where(last_valid >= segment_starts[:, None], filled, np.nan)
 
 
-def _prepare_events(
-  change_history: pd.DataFrame, event_type: str
-) -> pd.DataFrame:
-  """Exacts change history events only for a given event_type.
+def _backward_fill_segments(
+  values: np.ndarray, is_segment_start: np.ndarray
+) -> np.ndarray:
+  """Propagates next non-null value backward without crossing segments.
 
   Args:
-    change_history: Contains only changes in bid and budget events.
-    event_type: Specifies type of event filter by.
+    values: 2D array where each column is filled independently.
+    is_segment_start: Marks rows where a new segment (campaign) begins.
 
   Returns:
-    DataFrame with subset of change history for a given event_type.
+    Array of the same shape as values with gaps filled.
   """
-  events = change_history.loc[
-    (change_history[f'old_{event_type}'] > 0)
-    & (change_history[f'new_{event_type}'] > 0)
-  ]
-  if not events.empty:
-    events = _format_partial_event_history(events, event_type)
-    logging.info('%d %s events were found', len(events), event_type)
-  else:
-    logging.info('no %s events were found', event_type)
-  return events
+  is_segment_end = np.roll(is_segment_start, -1)
+  return _forward_fill_segments(values[::-1], is_segment_end[::-1])[::-1]
 
 
-def _format_partial_event_history(
-  events: pd.DataFrame, event_type: str
-) -> pd.DataFrame:
-  """Performs renaming and selecting last value for the date.
+def _prepare_events(change_history: pd.DataFrame) -> pd.DataFrame:
+  """Exacts last bid and budget event values for each day and campaign.
+
+  Values of events that do not represent a change for a given event type
+  (both old and new values should be positive) are replaced with NaN.
 
   Args:
-    events: Change history data.
-    event_type: Type of event to perform the formatting by.
+    change_history: Contains only changes in bid and budget events.
+
+  Returns:
+    DataFrame with last event values for each day and campaign_id.
   """
-  events.loc[:, ('day')] = events['change_date'].str.split(expand=True)[0]
-  events = events.rename(
-    columns={
-      f'old_{event_type}': 'value_old',
-      f'new_{event_type}': 'value_new',
-    }
-  )[['day', 'campaign_id', 'value_old', 'value_new']]
-  return events.groupby(['day', 'campaign_id']).last()
+  value_columns = [
+    f'{prefix}_{event_type}'
+    for event_type in _BID_BUDGET_EVENT_TYPES
+    for prefix in ('old', 'new')
+  ]
+  if change_history.empty:
+    return pd.DataFrame(
+      {
+        'day': pd.Series(dtype='datetime64[ns]'),
+        'campaign_id': pd.Series(dtype='int64'),
+      }
+      | {column: pd.Series(dtype=float) for column in value_columns}
+    )
+  events = change_history[['campaign_id'] + value_columns].astype(
+    {column: float for column in value_columns}
+  )
+  events.insert(
+    0,
+    'day',
+    pd.to_datetime(
+      change_history['change_date'].str.slice(stop=10), format='%Y-%m-%d'
+    ),
+  )
+  for event_type in _BID_BUDGET_EVENT_TYPES:
+    old_value, new_value = f'old_{event_type}', f'new_{event_type}'
+    is_event = (events[old_value] > 0) & (events[new_value] > 0)
+    events.loc[~is_event, [old_value, new_value]] = np.nan
+    if n_events := is_event.sum():
+      logging.info('%d %s events were found', n_events, event_type)
+    else:
+      logging.info('no %s events were found', event_type)
+  return events.groupby(['day', 'campaign_id'], as_index=False).last()
 
 
 def _get_asset_cohorts_snapshots(
@@ -365,7 +592,7 @@ def restore_missing_cohorts(
 
 def save_restored_asset_cohort(
   bigquery_executor: bq_executor.BigQueryExecutor, query: str, table_id: str
-) -> None:
+) -> bool:
   """Execute query for backfilling asset cohort snapshot.
 
   Cohorts snapshots can be restored only for the last 5 days.
@@ -374,12 +601,60 @@ def save_restored_asset_cohort(
     bigquery_executor: Instantiated executor to write data to BigQuery.
     query: Query for snapshot backfilling.
     table_id: Full name of the table when snapshot saved to.
+
+  Returns:
+    Whether snapshot has been created.
   """
+  start = time.perf_counter()
   try:
     bigquery_executor.execute('restore_conversion_lag_snapshot', query)
-    logging.info("table '%s' has been created", table_id)
+    logging.info(
+      "table '%s' has been created in %.2f seconds",
+      table_id,
+      time.perf_counter() - start,
+    )
+    return True
   except bq_executor.BigQueryExecutorException:
     logging.warning("table '%s' already exists", table_id)
+    return False
+
+
+def save_restored_asset_cohorts(
+  bigquery_executor: bq_executor.BigQueryExecutor,
+  statements: Iterable[tuple[str, str]],
+  max_workers: int = 1,
+) -> dict[str, bool]:
+  """Executes queries for backfilling asset cohort snapshots concurrently.
+
+  All queries are submitted at once to a pool of `max_workers` threads, so
+  total time is close to the time of the slowest restoration job.
+
+  Args:
+    bigquery_executor: Instantiated executor to write data to BigQuery.
+    statements: Pairs of table_id and query for snapshot backfilling.
+    max_workers: Maximum number of queries to be executed concurrently.
+
+  Returns:
+    Mapping between table_id and whether snapshot has been created.
+  """
+  with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+    future_to_table = {
+      executor.submit(
+        save_restored_asset_cohort, bigquery_executor, query, table_id
+      ): table_id
+      for table_id, query in statements
+    }
+    outcomes = {
+      future_to_table[future]: future.result()
+      for future in futures.as_completed(future_to_table)
+    }
+  if outcomes:
+    logging.info(
+      '%d out of %d asset cohort snapshots have been restored',
+      sum(outcomes.values()),
+      len(outcomes),
+    )
+  return outcomes
 
 
 def _get_bid_budget_snapshot_dates(
@@ -432,33 +707,227 @@ def _get_bid_budget_snapshot_missing_dates(
   return set(dates).difference(snapshot_dates)
 
 
+def restore_and_save_bid_budgets(
+  report_fetcher: gaarf.report_fetcher.AdsReportFetcher,
+  customer_ids: Sequence[str],
+  date_range: tuple[str, str],
+  missing_dates: set[str],
+  bq_writer: writers.ColumnarBigQueryWriter,
+  append_bq_writer: writers.ColumnarBigQueryWriter,
+  shard_size: int = 0,
+  max_fetch_workers: int = 1,
+  max_write_workers: int = 1,
+) -> dict[str, bool]:
+  """Restores and saves bid and budget snapshots for shards of accounts.
+
+  Each shard is fetched, restored and appended to staging tables of this run
+  before the next one so memory usage depends on the shard size rather than
+  on the number of accounts. Snapshots are created from staging tables only
+  after all shards are saved, so a failed run leaves no partial snapshots
+  behind; staging tables are removed in any case.
+
+  Args:
+    report_fetcher: Instantiated AdsReportFetcher to get data from Ads API.
+    customer_ids: Accounts to check for bid / budgets events.
+    date_range: Period for backfilling change history.
+    missing_dates: Dates for saving snapshots.
+    bq_writer: BigQueryWriter that fails when snapshot already exists.
+    append_bq_writer: BigQueryWriter that appends data to staging tables.
+    shard_size: Maximum number of accounts in a shard, 0 means all accounts.
+    max_fetch_workers: Maximum number of concurrent requests to Ads API.
+    max_write_workers: Maximum number of snapshots to be written concurrently.
+
+  Returns:
+    Mapping between date and whether snapshot for this date has been saved.
+
+  Raises:
+    ValueError: If data of a shard cannot be saved to a staging table.
+  """
+  shard_size = shard_size or len(customer_ids) or 1
+  staging_prefix = f'tmp_{_BID_BUDGETS_TABLE_PREFIX}{uuid.uuid4().hex[:8]}_'
+  staged_dates: set[str] = set()
+  try:
+    for shard_start in range(0, len(customer_ids), shard_size):
+      shard = customer_ids[shard_start : shard_start + shard_size]
+      restored_bid_budget_history = restore_missing_bid_budgets(
+        report_fetcher,
+        shard,
+        date_range,
+        max_workers=max_fetch_workers,
+      )
+      outcomes = save_restored_change_history(
+        append_bq_writer,
+        restored_bid_budget_history,
+        missing_dates,
+        max_workers=max_write_workers,
+        table_prefix=staging_prefix,
+      )
+      if failed_dates := sorted(
+        date for date, saved in outcomes.items() if not saved
+      ):
+        raise ValueError(
+          'Unable to save restored bids and budgets for '
+          f'{", ".join(failed_dates)}'
+        )
+      staged_dates.update(outcomes)
+      del restored_bid_budget_history
+    return _copy_daily_snapshots(
+      bq_writer, staging_prefix, staged_dates, max_write_workers
+    )
+  finally:
+    _delete_tables(
+      append_bq_writer,
+      [_get_snapshot_name(staging_prefix, date) for date in missing_dates],
+      max_write_workers,
+    )
+
+
+def _delete_tables(
+  bq_writer: writers.ColumnarBigQueryWriter,
+  tables: Sequence[str],
+  max_workers: int = 1,
+) -> None:
+  """Deletes tables concurrently logging tables that cannot be deleted."""
+  with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+    future_to_table = {
+      executor.submit(bq_writer.delete, table): table for table in tables
+    }
+    for future in futures.as_completed(future_to_table):
+      if error := future.exception():
+        logging.warning(
+          "table '%s' cannot be deleted: %s", future_to_table[future], error
+        )
+
+
+def _copy_daily_snapshots(
+  bq_writer: writers.ColumnarBigQueryWriter,
+  staging_prefix: str,
+  dates: set[str],
+  max_workers: int = 1,
+) -> dict[str, bool]:
+  """Copies staging tables to daily snapshots concurrently.
+
+  Args:
+    bq_writer: BigQueryWriter that fails when snapshot already exists.
+    staging_prefix: Prefix of staging tables.
+    dates: Dates of snapshots in YYYY-MM-DD format.
+    max_workers: Maximum number of snapshots to be copied concurrently.
+
+  Returns:
+    Mapping between date and whether snapshot for this date has been saved.
+  """
+  with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+    future_to_date = {
+      executor.submit(
+        _copy_daily_snapshot,
+        bq_writer,
+        _get_snapshot_name(staging_prefix, date),
+        _get_snapshot_name(_BID_BUDGETS_TABLE_PREFIX, date),
+      ): date
+      for date in dates
+    }
+    return {
+      future_to_date[future]: future.result()
+      for future in futures.as_completed(future_to_date)
+    }
+
+
+def _copy_daily_snapshot(
+  bq_writer: writers.ColumnarBigQueryWriter, source: str, table_id: str
+) -> bool:
+  """Copies staging table to snapshot unless snapshot already exists."""
+  try:
+    bq_writer.copy(source, table_id)
+    logging.info("table '%s' has been saved", table_id)
+    return True
+  except google_api_exceptions.Conflict:
+    logging.warning("table '%s' already exists", table_id)
+    return False
+
+
 def save_restored_change_history(
-  bq_writer: bigquery_writer.BigQueryWriter,
+  bq_writer: writers.ColumnarBigQueryWriter,
   restored_bid_budget_history: pd.DataFrame,
   missing_dates: set[str],
-) -> None:
+  max_workers: int = 1,
+  table_prefix: str = _BID_BUDGETS_TABLE_PREFIX,
+) -> dict[str, bool]:
   """Saves snapshot data to BigQuery only for missing dates.
 
+  Restored history is partitioned by day only once, daily snapshots are
+  written concurrently by a pool of `max_workers` threads.
+
   Args:
     bq_writer: Instantiated BigQueryWriter to perform saving to BQ.
     restored_bid_budget_history: DataFrame with fully restored change history.
     missing_dates: Dates for saving snapshots.
+    max_workers: Maximum number of snapshots to be written concurrently.
+    table_prefix: Prefix of daily tables followed by YYYYMMDD date.
+
+  Returns:
+    Mapping between date and whether snapshot for this date has been saved.
   """
-  for date in missing_dates:
-    daily_history = restored_bid_budget_history.loc[
-      restored_bid_budget_history['day'] == date
-    ]
-    daily_history.loc[:, ('day')] = datetime.datetime.strptime(
-      date, '%Y-%m-%d'
-    ).date()
-    table_id = f'bid_budgets_{date.replace("-","")}'
-    try:
-      bq_writer.write(
-        gaarf.report.GaarfReport.from_pandas(daily_history), table_id
+  if not missing_dates:
+    return {}
+  restored_days = pd.to_datetime(restored_bid_budget_history['day'])
+  missing_history = restored_bid_budget_history.loc[
+    restored_days.isin(pd.to_datetime(list(missing_dates), format='%Y-%m-%d'))
+  ]
+  with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+    future_to_date = {
+      executor.submit(
+        _save_daily_snapshot,
+        bq_writer,
+        daily_history,
+        day.date(),
+        table_prefix,
+      ): day.strftime('%Y-%m-%d')
+      for day, daily_history in missing_history.groupby(
+        restored_days, sort=True
       )
-      logging.info("table '%s' has been created", table_id)
-    except (google_api_exceptions.Conflict, ValueError):
-      logging.warning("table '%s' already exists", table_id)
+    }
+    return {
+      future_to_date[future]: future.result()
+      for future in futures.as_completed(future_to_date)
+    }
+
+
+def _save_daily_snapshot(
+  bq_writer: writers.ColumnarBigQueryWriter,
+  daily_history: pd.DataFrame,
+  day: datetime.date,
+  table_prefix: str = _BID_BUDGETS_TABLE_PREFIX,
+) -> bool:
+  """Writes restored bids and budgets for a single day to BigQuery.
+
+  Args:
+    bq_writer: Instantiated BigQueryWriter to perform saving to BQ.
+    daily_history: Restored change history for a single day.
+    day: Day of the snapshot.
+    table_prefix: Prefix of the table followed by YYYYMMDD date.
+
+  Returns:
+    Whether snapshot has been saved.
+  """
+  daily_history = daily_history.assign(day=day)
+  table_id = _get_snapshot_name(table_prefix, day.strftime('%Y-%m-%d'))
+  start = time.perf_counter()
+  try:
+    bq_writer.write(daily_history, table_id)
+    logging.info(
+      "table '%s' has been saved in %.2f seconds",
+      table_id,
+      time.perf_counter() - start,
+    )
+    return True
+  except (google_api_exceptions.Conflict, ValueError):
+    logging.warning("table '%s' already exists", table_id)
+    return False
+
+
+def _get_snapshot_name(table_prefix: str, date: str) -> str:
+  """Returns name of a daily table for a date in YYYY-MM-DD format."""
+  return f'{table_prefix}{date.replace("-", "")}'
 
 
 def main():
@@ -475,6 +944,23 @@ def main():
     '--restore-incremental-snapshots', dest='incremental', action='store_true'
   )
   parser.add_argument('--incremental-table', dest='incremental_table')
+  parser.add_argument('--shard-size', dest='shard_size', type=int, default=0)
+  parser.add_argument(
+    '--max-fetch-workers', dest='max_fetch_workers', type=int, default=8
+  )
+  parser.add_argument('--cache-dir', dest='cache_dir', default=None)
+  parser.add_argument(
+    '--cache-ttl-hours', dest='cache_ttl_hours', type=float, default=24
+  )
+  parser.add_argument(
+    '--cache-max-size-mb',
+    dest='cache_max_size_mb',
+    type=float,
+    default=cache.DEFAULT_MAX_SIZE_MB,
+  )
+  parser.add_argument(
+    '--max-write-workers', dest='max_write_workers', type=int, default=8
+  )
 
   args, kwargs = parser.parse_known_args()
 
@@ -499,10 +985,17 @@ def main():
         path_to_config=args.ads_config, version=config.api_version
       )
     )
+    if args.cache_dir:
+      report_fetcher = cache.CachedReportFetcher(
+        report_fetcher,
+        args.cache_dir,
+        ttl=datetime.timedelta(hours=args.cache_ttl_hours),
+        max_size_mb=args.cache_max_size_mb,
+      )
     customer_ids = report_fetcher.expand_mcc(
       config.account, config.customer_ids_query
     )
-    bq_writer = bigquery_writer.BigQueryWriter(
+    bq_writer = writers.ColumnarBigQueryWriter(
       project=bq_project,
       dataset=bq_dataset,
       write_disposition='WRITE_EMPTY',
@@ -527,11 +1020,20 @@ def main():
       ', '.join(sorted(missing_dates)),
     )
 
-    restored_bid_budget_history = restore_missing_bid_budgets(
-      report_fetcher, customer_ids, date_range
-    )
-    save_restored_change_history(
-      bq_writer, restored_bid_budget_history, missing_dates
+    restore_and_save_bid_budgets(
+      report_fetcher,
+      customer_ids,
+      date_range,
+      missing_dates,
+      bq_writer,
+      writers.ColumnarBigQueryWriter(
+        project=bq_project,
+        dataset=bq_dataset,
+        write_disposition='WRITE_APPEND',
+      ),
+      shard_size=args.shard_size,
+      max_fetch_workers=args.max_fetch_workers,
+      max_write_workers=args.max_write_workers,
     )
 
   if args.cohorts and (
@@ -539,8 +1041,11 @@ def main():
       bigquery_executor, bq_dataset
     )
   ):
-    for table_id, query in restore_missing_cohorts(snapshot_dates, bq_dataset):
-      save_restored_asset_cohort(bigquery_executor, query, table_id)
+    save_restored_asset_cohorts(
+      bigquery_executor,
+      restore_missing_cohorts(snapshot_dates, bq_dataset),
+      max_workers=args.max_write_workers,
+    )
 
 
 if __name__ == '__main__':
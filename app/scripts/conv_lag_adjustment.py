@@ -14,37 +14,81 @@
 """Calculates values of conversion lags for a given day of lag.
 
 Script creates table in BigQuery that contains adjustment coefficients for
-each lag (from 1 till 90 day) for a given conversion_id and network
+each lag (from 1 till 90 day) for a given conversion_id and network; lags for
+additional granularity levels (campaign, account) are saved in separate tables.
 """
 
 import argparse
+import itertools
 from datetime import datetime, timedelta
 
 import gaarf
 from gaarf import api_clients
 from gaarf.cli import utils as gaarf_utils
-from gaarf.io.writers import bigquery_writer
-from src import conv_lag_builder, queries
+from src import cache, conv_lag_builder, fetchers, lag_store, queries, writers
 
+_PLACEHOLDER_VALUES = {
+  'network': '',
+  'conversion_id': '',
+  'campaign_id': 0,
+  'account_id': 0,
+  'lag_day': 0,
+  'lag_adjustment': 0.0,
+}
 
-def generate_placeholders() -> gaarf.report.GaarfReport:
+
+def generate_placeholders(
+  level: str = 'conversion',
+) -> gaarf.report.GaarfReport:
   """Returns empty report if no lag data were found."""
+  column_names = (
+    conv_lag_builder.BASE_GROUPBY
+    + conv_lag_builder.GRANULARITY_LEVELS[level]
+    + ['lag_day', 'lag_adjustment']
+  )
   return gaarf.report.GaarfReport(
-    results=[['', '', 0, 0.0]],
-    column_names=['network', 'conversion_id', 'lag_day', 'lag_adjustment'],
+    results=[[_PLACEHOLDER_VALUES[column] for column in column_names]],
+    column_names=column_names,
   )
 
 
+def get_table_name(level: str) -> str:
+  """Returns name of conversion lag adjustment table for granularity level."""
+  if level == 'conversion':
+    return 'conversion_lag_adjustments'
+  return f'conversion_lag_adjustments_{level}'
+
+
 def main():
   parser = argparse.ArgumentParser()
   parser.add_argument('-c', '--config', dest='gaarf_config', default=None)
   parser.add_argument('--ads-config', dest='ads_config')
   parser.add_argument('--log', '--loglevel', dest='loglevel', default='info')
   parser.add_argument('--logger', dest='logger', default='local')
+  parser.add_argument('--cache-dir', dest='cache_dir', default=None)
+  parser.add_argument(
+    '--cache-ttl-hours', dest='cache_ttl_hours', type=float, default=24
+  )
+  parser.add_argument(
+    '--cache-max-size-mb',
+    dest='cache_max_size_mb',
+    type=float,
+    default=cache.DEFAULT_MAX_SIZE_MB,
+  )
+  parser.add_argument('--granularity', dest='granularity', default='conversion')
+  parser.add_argument('--lag-store-dir', dest='lag_store_dir', default=None)
+  parser.add_argument(
+    '--max-fetch-workers', dest='max_fetch_workers', type=int, default=8
+  )
+  parser.add_argument('--workers', dest='workers', type=int, default=1)
 
   args, kwargs = parser.parse_known_args()
 
   config = gaarf_utils.ConfigBuilder('gaarf').build(vars(args), kwargs)
+  levels = {
+    level: conv_lag_builder.GRANULARITY_LEVELS[level]
+    for level in args.granularity.split(',')
+  }
 
   project, dataset = (
     config.writer_params.get('project'),
@@ -56,6 +100,13 @@ def main():
       path_to_config=args.ads_config, version=config.api_version
     )
   )
+  if args.cache_dir:
+    report_fetcher = cache.CachedReportFetcher(
+      report_fetcher,
+      args.cache_dir,
+      ttl=timedelta(hours=args.cache_ttl_hours),
+      max_size_mb=args.cache_max_size_mb,
+    )
   customer_ids = report_fetcher.expand_mcc(
     config.account, config.customer_ids_query
   )
@@ -63,19 +114,43 @@ def main():
   days_ago_180 = (datetime.now() - timedelta(days=180)).strftime('%Y-%m-%d')
   days_ago_30 = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
 
-  lag_data = report_fetcher.fetch(
-    queries.ConversionLagQuery(days_ago_180, days_ago_30), customer_ids
-  )
-  if lag_data:
-    conv_lag_table = conv_lag_builder.ConversionLagBuilder(
-      lag_data.to_pandas(), ['network', 'conversion_id']
-    ).calculate_reference_values()
+  if args.lag_store_dir:
+    lag_data = lag_store.ConversionLagStore(args.lag_store_dir).update(
+      report_fetcher,
+      customer_ids,
+      days_ago_180,
+      days_ago_30,
+      max_workers=args.max_fetch_workers,
+    )
   else:
-    conv_lag_table = generate_placeholders()
-  bigquery_writer.BigQueryWriter(
+    lag_data = fetchers.fetch_and_aggregate(
+      report_fetcher,
+      queries.ConversionLagQuery(days_ago_180, days_ago_30),
+      customer_ids,
+      group_by=list(
+        dict.fromkeys(
+          itertools.chain(
+            conv_lag_builder.BASE_GROUPBY,
+            *levels.values(),
+            ['conversion_lag_bucket'],
+          )
+        )
+      ),
+      value_columns=['all_conversions'],
+      max_workers=args.max_fetch_workers,
+    )
+  if not lag_data.empty:
+    conv_lag_tables = conv_lag_builder.ConversionLagBuilder(
+      lag_data, conv_lag_builder.BASE_GROUPBY, workers=args.workers
+    ).calculate_reference_values_by_levels(levels)
+  else:
+    conv_lag_tables = {level: generate_placeholders(level) for level in levels}
+  writer = writers.ColumnarBigQueryWriter(
     project=project,
     dataset=dataset,
-  ).write(conv_lag_table, 'conversion_lag_adjustments')
+  )
+  for level, conv_lag_table in conv_lag_tables.items():
+    writer.write(conv_lag_table, get_table_name(level))
 
 
 if __name__ == '__main__':
@@ -15,16 +15,30 @@
 
 SKAN Schema can be copied from existing BigQuery table; if no input table is
 provided than placeholder table is created.
+
+Copying is skipped when the input table has not changed since the last copy;
+changes are detected with a fingerprint (last modification time, number of
+rows and hash of content) of the input table saved along with the copy.
+
+Copied schema is compiled into a dense lookup table with exactly one row for
+each app and SKAN conversion value (0-63); duplicated and missing conversion
+values are reported.
 """
 
+from __future__ import annotations
+
 import argparse
+import logging
 import os
 
+import pandas as pd
 import smart_open
 import yaml
 from gaarf.cli import utils as gaarf_utils
 from gaarf.executors import bq_executor
 
+MAX_SKAN_CONVERSION_VALUE = 63
+
 
 def update_config(path: str, mode: str) -> None:
   """Helper methods for saving values to config.
@@ -94,6 +108,424 @@ def copy_schema(
   bigquery_executor.execute('skan_schema', query, config.params)
 
 
+def copy_schema_if_changed(
+  bigquery_executor: bq_executor.BigQueryExecutor,
+  config: gaarf_utils.GaarfBqConfig,
+  force: bool = False,
+) -> bool:
+  """Copies SKAN schema only if input table has changed since the last copy.
+
+  Modification time and number of rows of input table are checked first;
+  if they differ from the saved ones, content of input table is hashed so
+  that tables rewritten with the same data are not copied.
+
+  Args:
+    bigquery_executor: Executor responsible for writing data to BigQuery.
+    config: GaarfBqConfig with parameters for copying.
+    force: Whether to copy schema regardless of its fingerprint.
+
+  Returns:
+    Whether schema has been copied.
+  """
+  macros = config.params.get('macro', {})
+  bq_dataset = macros.get('bq_dataset')
+  source_table = macros.get('skan_schema_input_table')
+  saved_fingerprint = None
+  if not force and has_existing_schema(bigquery_executor, bq_dataset):
+    saved_fingerprint = get_saved_fingerprint(bigquery_executor, bq_dataset)
+  if saved_fingerprint and saved_fingerprint['source_table'] != source_table:
+    saved_fingerprint = None
+  metadata = get_source_metadata(bigquery_executor, source_table)
+  if saved_fingerprint and metadata and all(
+    saved_fingerprint[key] == value for key, value in metadata.items()
+  ):
+    logging.info(
+      'Skipping SKAN schema copy: %s has not been modified', source_table
+    )
+    return False
+  fingerprint = {
+    'source_table': source_table,
+    'last_modified_time': None,
+    **(metadata or {}),
+    **get_source_content_fingerprint(bigquery_executor, source_table),
+  }
+  if saved_fingerprint and all(
+    saved_fingerprint[key] == fingerprint[key]
+    for key in ('row_count', 'content_hash')
+  ):
+    logging.info(
+      'Skipping SKAN schema copy: content of %s has not changed', source_table
+    )
+    save_fingerprint(bigquery_executor, bq_dataset, fingerprint)
+    return False
+  logging.info(
+    'Copying SKAN schema from %s: %s',
+    source_table,
+    'input table has changed' if saved_fingerprint else 'no previous copy',
+  )
+  copy_schema(bigquery_executor, config)
+  save_fingerprint(bigquery_executor, bq_dataset, fingerprint)
+  return True
+
+
+def get_source_metadata(
+  bigquery_executor: bq_executor.BigQueryExecutor, source_table: str
+) -> dict[str, int] | None:
+  """Gets modification time and number of rows of SKAN schema input table.
+
+  Args:
+    bigquery_executor: Executor responsible for writing data to BigQuery.
+    source_table: Input table in `project.dataset.table` format.
+
+  Returns:
+    Last modification time (in milliseconds) and number of rows of the
+    table; None if metadata are not available (i.e. for views).
+  """
+  dataset, _, table_name = source_table.rpartition('.')
+  try:
+    metadata = bigquery_executor.execute(
+      'skan_schema_input_table_metadata',
+      f"""
+      SELECT
+        last_modified_time,
+        row_count
+      FROM `{dataset}.__TABLES__`
+      WHERE table_id = '{table_name}' AND type = 1
+      """,
+    )
+  except bq_executor.BigQueryExecutorException:
+    return None
+  if metadata.empty:
+    return None
+  return {
+    'last_modified_time': int(metadata['last_modified_time'].iloc[0]),
+    'row_count': int(metadata['row_count'].iloc[0]),
+  }
+
+
+def get_source_content_fingerprint(
+  bigquery_executor: bq_executor.BigQueryExecutor, source_table: str
+) -> dict[str, int]:
+  """Calculates number of rows and order-independent hash of input table.
+
+  Args:
+    bigquery_executor: Executor responsible for writing data to BigQuery.
+    source_table: Input table in `project.dataset.table` format.
+
+  Returns:
+    Number of rows and hash of copied columns of the table.
+  """
+  fingerprint = bigquery_executor.execute(
+    'skan_schema_input_table_fingerprint',
+    f"""
+    SELECT
+      COUNT(*) AS row_count,
+      BIT_XOR(
+        FARM_FINGERPRINT(
+          TO_JSON_STRING(
+            STRUCT(
+              app_id,
+              skan_conversion_value,
+              skan_event_count,
+              skan_event_value_low,
+              skan_event_value_high,
+              skan_event_value_mean,
+              skan_mapped_event
+            )
+          )
+        )
+      ) AS content_hash
+    FROM `{source_table}`
+    """,
+  )
+  if fingerprint.empty:
+    return {'row_count': 0, 'content_hash': None}
+  content_hash = fingerprint['content_hash'].iloc[0]
+  return {
+    'row_count': int(fingerprint['row_count'].iloc[0]),
+    'content_hash': None if pd.isna(content_hash) else int(content_hash),
+  }
+
+
+def get_saved_fingerprint(
+  bigquery_executor: bq_executor.BigQueryExecutor, bq_dataset: str
+) -> dict[str, str | int | None] | None:
+  """Reads fingerprint of input table saved during the last copy.
+
+  Args:
+    bigquery_executor: Executor responsible for writing data to BigQuery.
+    bq_dataset: BigQuery dataset with SKAN schema.
+
+  Returns:
+    Saved fingerprint; None if schema has never been copied.
+  """
+  try:
+    fingerprint = bigquery_executor.execute(
+      'skan_schema_fingerprint',
+      f"""
+      SELECT
+        source_table,
+        last_modified_time,
+        row_count,
+        content_hash
+      FROM `{bq_dataset}.skan_schema_fingerprint`
+      """,
+    )
+  except bq_executor.BigQueryExecutorException:
+    return None
+  if fingerprint.empty:
+    return None
+  return {
+    key: None if pd.isna(value) else value
+    for key, value in fingerprint.iloc[0].to_dict().items()
+  }
+
+
+def save_fingerprint(
+  bigquery_executor: bq_executor.BigQueryExecutor,
+  bq_dataset: str,
+  fingerprint: dict[str, str | int | None],
+) -> None:
+  """Saves fingerprint of copied input table.
+
+  Args:
+    bigquery_executor: Executor responsible for writing data to BigQuery.
+    bq_dataset: BigQuery dataset with SKAN schema.
+    fingerprint: Source table, modification time, number of rows and hash
+      of content of the input table.
+  """
+
+  def to_sql(value: str | int | None) -> str:
+    if value is None:
+      return 'NULL'
+    if isinstance(value, str):
+      return f"'{value}'"
+    return str(int(value))
+
+  bigquery_executor.execute(
+    'save_skan_schema_fingerprint',
+    f"""
+    CREATE OR REPLACE TABLE `{bq_dataset}.skan_schema_fingerprint` AS
+    SELECT
+      {to_sql(fingerprint['source_table'])} AS source_table,
+      CAST({to_sql(fingerprint['last_modified_time'])} AS INT64)
+        AS last_modified_time,
+      {to_sql(fingerprint['row_count'])} AS row_count,
+      CAST({to_sql(fingerprint['content_hash'])} AS INT64) AS content_hash,
+      CURRENT_TIMESTAMP() AS copied_at
+    """,
+  )
+
+
+def compile_schema(
+  bigquery_executor: bq_executor.BigQueryExecutor, bq_dataset: str
+) -> pd.DataFrame:
+  """Compiles SKAN schema into a dense lookup table.
+
+  `skan_schema_lookup` contains a row for each app and every conversion
+  value from 0 to 63 and is clustered by app_id. Exact duplicates in input
+  schema are removed, conversion values defined several times are merged
+  into a single row (mapped events are concatenated, event counts are summed,
+  revenue range is widened to the lowest low and the highest high value and
+  mean values are averaged); conversion values missing in input schema get
+  NULL events.
+
+  Args:
+    bigquery_executor: Executor responsible for writing data to BigQuery.
+    bq_dataset: BigQuery dataset with SKAN schema.
+
+  Returns:
+    Issues found in input schema for each app.
+  """
+  issues = validate_schema(bigquery_executor, bq_dataset)
+  report_schema_issues(issues)
+  bigquery_executor.execute(
+    'skan_schema_lookup',
+    f"""
+    CREATE OR REPLACE TABLE `{bq_dataset}.skan_schema_lookup`
+    CLUSTER BY app_id
+    AS (
+      WITH
+        DistinctSchema AS (
+          SELECT DISTINCT
+            app_id,
+            CAST(skan_conversion_value AS INT64) AS skan_conversion_value,
+            skan_event_count,
+            skan_event_value_low,
+            skan_event_value_high,
+            skan_event_value_mean,
+            skan_mapped_event
+          FROM `{bq_dataset}.skan_schema_input_table`
+          WHERE
+            app_id IS NOT NULL
+            AND CAST(skan_conversion_value AS INT64)
+              BETWEEN 0 AND {MAX_SKAN_CONVERSION_VALUE}
+        ),
+        CompiledSchema AS (
+          SELECT
+            app_id,
+            skan_conversion_value,
+            SUM(skan_event_count) AS skan_event_count,
+            MIN(skan_event_value_low) AS skan_event_value_low,
+            MAX(skan_event_value_high) AS skan_event_value_high,
+            AVG(skan_event_value_mean) AS skan_event_value_mean,
+            STRING_AGG(
+              DISTINCT skan_mapped_event, ', ' ORDER BY skan_mapped_event)
+              AS skan_mapped_event
+          FROM DistinctSchema
+          GROUP BY 1, 2
+        ),
+        Apps AS (
+          SELECT DISTINCT app_id
+          FROM DistinctSchema
+        )
+      SELECT
+        A.app_id,
+        skan_conversion_value,
+        S.skan_event_count,
+        S.skan_event_value_low,
+        S.skan_event_value_high,
+        S.skan_event_value_mean,
+        S.skan_mapped_event
+      FROM Apps AS A
+      CROSS JOIN
+        UNNEST(GENERATE_ARRAY(0, {MAX_SKAN_CONVERSION_VALUE}))
+          AS skan_conversion_value
+      LEFT JOIN CompiledSchema AS S
+        USING (app_id, skan_conversion_value)
+    )
+    """,
+  )
+  return issues
+
+
+def validate_schema(
+  bigquery_executor: bq_executor.BigQueryExecutor, bq_dataset: str
+) -> pd.DataFrame:
+  """Finds duplicated, missing and invalid conversion values in SKAN schema.
+
+  Args:
+    bigquery_executor: Executor responsible for writing data to BigQuery.
+    bq_dataset: BigQuery dataset with SKAN schema.
+
+  Returns:
+    DataFrame with number of duplicated rows, conversion values defined
+    several times, missing and invalid conversion values for each app.
+  """
+  return bigquery_executor.execute(
+    'validate_skan_schema',
+    f"""
+    WITH
+      InputSchema AS (
+        SELECT
+          app_id,
+          CAST(skan_conversion_value AS INT64) AS skan_conversion_value,
+          TO_JSON_STRING(
+            STRUCT(
+              skan_event_count,
+              skan_event_value_low,
+              skan_event_value_high,
+              skan_event_value_mean,
+              skan_mapped_event
+            )
+          ) AS definition
+        FROM `{bq_dataset}.skan_schema_input_table`
+      ),
+      ConversionValues AS (
+        SELECT
+          app_id,
+          skan_conversion_value,
+          COUNT(*) AS definitions,
+          COUNT(DISTINCT definition) AS distinct_definitions
+        FROM InputSchema
+        WHERE skan_conversion_value BETWEEN 0 AND {MAX_SKAN_CONVERSION_VALUE}
+        GROUP BY 1, 2
+      ),
+      InvalidValues AS (
+        SELECT
+          app_id,
+          COUNT(*) AS invalid_values
+        FROM InputSchema
+        WHERE
+          skan_conversion_value IS NULL
+          OR skan_conversion_value
+            NOT BETWEEN 0 AND {MAX_SKAN_CONVERSION_VALUE}
+        GROUP BY 1
+      )
+    SELECT
+      app_id,
+      IFNULL(SUM(definitions - distinct_definitions), 0) AS duplicate_rows,
+      COUNTIF(distinct_definitions > 1) AS merged_values,
+      {MAX_SKAN_CONVERSION_VALUE + 1} - COUNT(skan_conversion_value)
+        AS missing_values,
+      IFNULL(ANY_VALUE(invalid_values), 0) AS invalid_values
+    FROM ConversionValues
+    FULL JOIN InvalidValues
+      USING (app_id)
+    GROUP BY 1
+    """,
+  )
+
+
+def report_schema_issues(issues: pd.DataFrame) -> None:
+  """Logs issues found in SKAN schema for each app.
+
+  Args:
+    issues: Result of `validate_schema`.
+  """
+  if issues.empty:
+    logging.warning('SKAN schema is empty')
+    return
+  for issue in issues.itertuples(index=False):
+    app_id = issue.app_id if pd.notna(issue.app_id) else 'unknown app'
+    if issue.duplicate_rows:
+      logging.warning(
+        'SKAN schema for %s: %d duplicate row(s) removed',
+        app_id,
+        issue.duplicate_rows,
+      )
+    if issue.merged_values:
+      logging.warning(
+        'SKAN schema for %s: %d conversion value(s) defined several times, '
+        'definitions are merged',
+        app_id,
+        issue.merged_values,
+      )
+    if issue.invalid_values:
+      logging.warning(
+        'SKAN schema for %s: %d row(s) with conversion value outside 0-%d '
+        'ignored',
+        app_id,
+        issue.invalid_values,
+        MAX_SKAN_CONVERSION_VALUE,
+      )
+    if issue.missing_values:
+      logging.info(
+        'SKAN schema for %s: %d conversion value(s) are not defined',
+        app_id,
+        issue.missing_values,
+      )
+
+
+def has_compiled_schema(
+  bigquery_executor: bq_executor.BigQueryExecutor, bq_dataset: str
+) -> bool:
+  """Checks whether SKAN schema lookup has been already created.
+
+  Args:
+    bigquery_executor: Executor responsible for writing data to BigQuery.
+    bq_dataset: BigQuery dataset to write data to.
+  """
+  try:
+    bigquery_executor.execute(
+      'check_existing_skan_schema_lookup',
+      f'SELECT app_id FROM `{bq_dataset}.skan_schema_lookup` LIMIT 0',
+    )
+    return True
+  except bq_executor.BigQueryExecutorException:
+    return False
+
+
 def generate_placeholder_schema(
   bigquery_executor: bq_executor.BigQueryExecutor, bq_dataset: str
 ) -> None:
@@ -116,6 +548,10 @@ def generate_placeholder_schema(
             LIMIT 1
         """
   bigquery_executor.execute('skan_schema', query)
+  bigquery_executor.execute(
+    'delete_skan_schema_fingerprint',
+    f'DROP TABLE IF EXISTS `{bq_dataset}.skan_schema_fingerprint`',
+  )
 
 
 def main():
@@ -126,6 +562,7 @@ def main():
   parser.add_argument('--logger', dest='logger', default='local')
   parser.add_argument('--save-config', dest='save_config', action='store_true')
   parser.add_argument('--dry-run', dest='dry_run', action='store_true')
+  parser.add_argument('--force-copy', dest='force_copy', action='store_true')
   parser.set_defaults(save_config=False)
   parser.set_defaults(dry_run=False)
   args, kwargs = parser.parse_known_args()
@@ -157,18 +594,27 @@ def main():
   ):
     logger.info('Generating placeholders for SKAN schema')
     generate_placeholder_schema(bigquery_executor, bq_dataset)
+    is_schema_changed = True
   else:
     try:
-      logger.info('Copying SKAN schema')
-      copy_schema(bigquery_executor, config)
+      is_schema_changed = copy_schema_if_changed(
+        bigquery_executor, config, args.force_copy
+      )
     except bq_executor.BigQueryExecutorException:
-      if not has_existing_schema(bigquery_executor, config):
+      if not has_existing_schema(bigquery_executor, bq_dataset):
         logger.info(
           'Failed to copy SKAN schema, generating placeholders instead'
         )
         generate_placeholder_schema(bigquery_executor, bq_dataset)
+        is_schema_changed = True
       else:
         logger.info('Failed to copy SKAN schema, re-using existing schema')
+        is_schema_changed = False
+  if is_schema_changed or not has_compiled_schema(
+    bigquery_executor, bq_dataset
+  ):
+    logger.info('Compiling SKAN schema')
+    compile_schema(bigquery_executor, bq_dataset)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,240 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Fetches Google Ads queries for shards of accounts concurrently.
+
+Works as `gaarf` command but every query file and shard of accounts is
+fetched as a separate task in a shared pool of threads; each report is
+written as soon as all its shards are fetched. A query that fails to be
+fetched or written is logged and skipped without stopping other queries.
+Status, number of accounts, rows and time spent on fetching and writing of
+each query are logged and optionally saved to a JSON file.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import time
+from collections.abc import Mapping, Sequence
+from concurrent import futures
+from pathlib import Path
+from typing import Any
+
+import gaarf
+import smart_open
+import yaml
+from gaarf import api_clients, query_editor
+from gaarf.cli import utils as gaarf_utils
+from gaarf.io import reader, writer
+from gaarf.io.writers import abs_writer
+from src import fetchers
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_MAX_WRITE_WORKERS = 4
+
+
+def fetch_and_write(
+  report_fetcher: gaarf.report_fetcher.AdsReportFetcher,
+  report_queries: Mapping[str, query_editor.QueryElements],
+  customer_ids: Sequence[str],
+  writer_client: abs_writer.AbsWriter,
+  shard_size: int = fetchers.DEFAULT_SHARD_SIZE,
+  max_workers: int = DEFAULT_MAX_WORKERS,
+  max_write_workers: int = DEFAULT_MAX_WRITE_WORKERS,
+) -> list[dict[str, Any]]:
+  """Fetches queries for all accounts and writes each report once it's ready.
+
+  Args:
+    report_fetcher: Instantiated AdsReportFetcher to get data from Ads API.
+    report_queries: Mapping between query path and query to fetch.
+    customer_ids: Accounts to fetch data from.
+    writer_client: Writer saving each report under its query path.
+    shard_size: Maximum number of accounts fetched in a single task.
+    max_workers: Maximum number of concurrent requests to Ads API.
+    max_write_workers: Maximum number of reports written concurrently.
+
+  Returns:
+    Statistics of every query (status, number of accounts, shards and rows,
+    seconds spent on fetching and writing, error of a failed query) sorted
+    by time of fetching.
+  """
+  stats = []
+  with futures.ThreadPoolExecutor(max_workers=max_write_workers) as executor:
+    writes = {}
+    for name, report, query_stats in fetchers.fetch_sharded_reports(
+      report_fetcher,
+      report_queries,
+      customer_ids,
+      shard_size=shard_size,
+      max_workers=max_workers,
+    ):
+      stats.append(query_stats)
+      if report is None:
+        query_stats['write_seconds'] = 0.0
+        continue
+      logging.info(
+        "Fetched %d row(s) of '%s' in %.1f seconds",
+        query_stats['rows'],
+        name,
+        query_stats['wall_seconds'],
+      )
+      writes[name] = executor.submit(
+        _write_report, writer_client, report, name
+      )
+    for query_stats in stats:
+      if (write := writes.get(query_stats['query'])) is None:
+        continue
+      try:
+        query_stats['write_seconds'] = write.result()
+      except Exception as e:
+        logging.error(
+          "Failed to write report '%s': %s", query_stats['query'], e
+        )
+        query_stats.update(
+          {'status': 'failed', 'error': str(e), 'write_seconds': 0.0}
+        )
+  return sorted(stats, key=lambda value: value['wall_seconds'], reverse=True)
+
+
+def _write_report(
+  writer_client: abs_writer.AbsWriter,
+  report: gaarf.report.GaarfReport,
+  destination: str,
+) -> float:
+  """Writes report and returns number of seconds it took."""
+  start = time.perf_counter()
+  writer_client.write(report, destination)
+  return time.perf_counter() - start
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('query', nargs='+')
+  parser.add_argument('-c', '--config', dest='gaarf_config', default=None)
+  parser.add_argument('--account', dest='account', default=None)
+  parser.add_argument('--output', dest='output', default=None)
+  parser.add_argument(
+    '--ads-config',
+    dest='ads_config',
+    default=str(Path.home() / 'google-ads.yaml'),
+  )
+  parser.add_argument('--api-version', dest='api_version', default=None)
+  parser.add_argument('--log', '--loglevel', dest='loglevel', default='info')
+  parser.add_argument('--logger', dest='logger', default='local')
+  parser.add_argument(
+    '--customer-ids-query', dest='customer_ids_query', default=None
+  )
+  parser.add_argument(
+    '--customer-ids-query-file', dest='customer_ids_query_file', default=None
+  )
+  parser.add_argument(
+    '--shard-size',
+    dest='shard_size',
+    type=int,
+    default=fetchers.DEFAULT_SHARD_SIZE,
+  )
+  parser.add_argument(
+    '--max-workers', dest='max_workers', type=int, default=DEFAULT_MAX_WORKERS
+  )
+  parser.add_argument(
+    '--max-write-workers',
+    dest='max_write_workers',
+    type=int,
+    default=DEFAULT_MAX_WRITE_WORKERS,
+  )
+  parser.add_argument('--report', dest='report', default=None)
+  args, kwargs = parser.parse_known_args()
+
+  gaarf_utils.init_logging(args.loglevel.upper(), args.logger)
+  with smart_open.open(args.ads_config, 'r', encoding='utf-8') as f:
+    ads_config = yaml.safe_load(f)
+  config = gaarf_utils.ConfigBuilder('gaarf').build(vars(args), kwargs)
+  if not config.account:
+    config.account = str(ads_config.get('login_customer_id') or '')
+  if config.params:
+    config = gaarf_utils.initialize_runtime_parameters(config)
+  report_fetcher = gaarf.report_fetcher.AdsReportFetcher(
+    api_clients.GoogleAdsApiClient(
+      config_dict=ads_config, version=config.api_version
+    )
+  )
+  file_reader = reader.FileReader()
+  customer_ids_query = config.customer_ids_query or (
+    file_reader.read(config.customer_ids_query_file)
+    if config.customer_ids_query_file
+    else None
+  )
+  if not (
+    customer_ids := report_fetcher.expand_mcc(
+      config.account, customer_ids_query
+    )
+  ):
+    logging.warning(
+      'No accounts found under %s that satisfy customer_ids query',
+      config.account,
+    )
+    return
+  logging.info('Total number of customer_ids is %d', len(customer_ids))
+  writer_client = writer.WriterFactory().create_writer(
+    config.output, **config.writer_params
+  )
+  if config.output == 'bq':
+    writer_client.create_or_get_dataset()
+  report_queries = {
+    query: query_editor.QuerySpecification(
+      file_reader.read(query),
+      query,
+      config.params,
+      report_fetcher.api_client.api_version,
+    ).generate()
+    for query in args.query
+  }
+  stats = fetch_and_write(
+    report_fetcher,
+    report_queries,
+    customer_ids,
+    writer_client,
+    shard_size=args.shard_size,
+    max_workers=args.max_workers,
+    max_write_workers=args.max_write_workers,
+  )
+  for query_stats in stats:
+    logging.info(
+      '%-40s %-9s %8d rows %4d shard(s) %8.1fs fetch %8.1fs wall '
+      '%6.1fs write',
+      os.path.basename(query_stats['query']),
+      query_stats['status'],
+      query_stats['rows'],
+      query_stats['shards'],
+      query_stats['fetch_seconds'],
+      query_stats['wall_seconds'],
+      query_stats['write_seconds'],
+    )
+  if failed_queries := [
+    query_stats['query']
+    for query_stats in stats
+    if query_stats['status'] == 'failed'
+  ]:
+    logging.error(
+      '%d query(ies) failed: %s', len(failed_queries), ', '.join(failed_queries)
+    )
+  if args.report:
+    with smart_open.open(args.report, 'w', encoding='utf-8') as f:
+      json.dump(stats, f, indent=2)
+
+
+if __name__ == '__main__':
+  main()
@@ -14,25 +14,63 @@
 
 # pylint: disable=C0330, g-bad-import-order, g-multiple-import
 
-"""Module for performing video orientation parsing."""
+"""Module for performing video orientation parsing.
+
+Orientation is either fetched from YouTube Data API ('youtube' mode) or parsed
+from names of video assets ('regex' and 'custom_regex' modes); mode and its
+options are taken from `scripts.video_orientation` section of the config.
+
+In incremental mode only videos without orientation (and videos with
+'Unknown' orientation fetched long enough ago) are fetched and appended to
+the existing table; stale 'Unknown' rows are removed once the append
+succeeds.
+"""
 
 from __future__ import annotations
 
 import argparse
 import logging
+import re
 from collections.abc import Sequence
 
-import garf_core
 import garf_youtube_data_api
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import smart_open
+import yaml
 from gaarf.cli import utils as gaarf_utils
 from garf_executors import bq_executor
-from garf_io.writers import bigquery_writer
+from google.cloud import bigquery
+from google.cloud import exceptions as google_cloud_exceptions
+from pyarrow import compute
+from src import writers, youtube
+
+DEFAULT_RETRY_UNKNOWN_DAYS = 7
+DEFAULT_MODE = 'youtube'
+NAME_PARSING_MODES = ('regex', 'custom_regex')
 
 
 def get_video_orientations_from_youtube_data_api(
   videos: Sequence[str],
-) -> garf_core.report.GarfReport:
-  """Fetches video orientations based on YouTube Data API."""
+  max_workers: int = youtube.DEFAULT_MAX_WORKERS,
+  rate_limiter: youtube.RateLimiter | None = None,
+  api_client: youtube.YouTubeDataApiClient | None = None,
+) -> pd.DataFrame:
+  """Fetches video orientations based on YouTube Data API.
+
+  Videos are fetched in concurrent batches; videos from batches that failed
+  and videos missing in API response get 'Unknown' orientation.
+
+  Args:
+    videos: Ids of YouTube videos.
+    max_workers: Maximum number of concurrent requests to API.
+    rate_limiter: Limiter of requests to API.
+    api_client: Client to YouTube Data API.
+
+  Returns:
+    DataFrame with video_id and video_orientation columns.
+  """
   youtube_video_orientations_query = """
   SELECT
     id AS video_id,
@@ -41,38 +79,396 @@ def get_video_orientations_from_youtube_data_api(
   FROM videos
   """
 
-  youtube_api_fetcher = garf_youtube_data_api.YouTubeDataApiReportFetcher()
-  video_orientations = youtube_api_fetcher.fetch(
+  youtube_api_fetcher = garf_youtube_data_api.YouTubeDataApiReportFetcher(
+    api_client or youtube.YouTubeDataApiClient()
+  )
+  video_orientations, failed_videos = youtube.fetch_by_ids(
+    youtube_api_fetcher,
     youtube_video_orientations_query,
-    id=videos,
+    videos,
+    max_workers=max_workers,
+    rate_limiter=rate_limiter,
     maxWidth=500,
   )
-  for row in video_orientations:
-    row['aspect_ratio'] = round(int(row.width) / int(row.height), 2)
-    if row['aspect_ratio'] > 1:
-      row['video_orientation'] = 'Landscape'
-    elif row['aspect_ratio'] < 1:
-      row['video_orientation'] = 'Portrait'
-    else:
-      row['video_orientation'] = 'Square'
-  return video_orientations
+  if not video_orientations:
+    return generate_placeholders(videos)
+  video_orientations = video_orientations.to_pandas()
+  video_orientations['video_orientation'] = classify_orientations(
+    video_orientations['width'], video_orientations['height']
+  )
+  videos = pd.Series(videos, dtype=object)
+  missing_videos = videos[
+    ~videos.isin(video_orientations['video_id']) & ~videos.isin(failed_videos)
+  ].to_list()
+  if missing_videos:
+    logging.warning(
+      '%d video(s) are not found in YouTube Data API', len(missing_videos)
+    )
+  return pd.concat(
+    [
+      video_orientations[['video_id', 'video_orientation']],
+      generate_placeholders(failed_videos + missing_videos),
+    ],
+    ignore_index=True,
+  )
+
+
+def get_video_orientations_from_asset_names(
+  video_assets: pd.DataFrame, mode: str, **kwargs: str
+) -> pd.DataFrame:
+  """Parses video orientations from names of video assets.
+
+  When a video is used in several assets, the first asset with parsable
+  name defines the orientation.
+
+  Args:
+    video_assets: DataFrame with youtube_video_id and asset_name columns.
+    mode: Parsing mode - 'regex' or 'custom_regex'.
+    kwargs: Options of parsing mode from config.
+
+  Returns:
+    DataFrame with video_id and video_orientation columns.
+
+  Raises:
+    ValueError: If mode is not supported.
+  """
+  if mode == 'regex':
+    dimensions = parse_dimensions_from_asset_names(
+      video_assets['asset_name'],
+      element_delimiter=kwargs.get('element_delimiter', '_'),
+      orientation_position=int(kwargs.get('orientation_position', 0)),
+      orientation_delimiter=kwargs.get('orientation_delimiter', 'x'),
+    )
+  elif mode == 'custom_regex':
+    dimensions = extract_dimensions_from_asset_names(
+      video_assets['asset_name'],
+      width_expression=kwargs['width_expression'],
+      height_expression=kwargs['height_expression'],
+    )
+  else:
+    raise ValueError(f'Unsupported video orientation parsing mode: {mode}')
+  video_orientations = pd.DataFrame(
+    {
+      'video_id': video_assets['youtube_video_id'].to_numpy(),
+      'video_orientation': classify_orientations(
+        dimensions['width'], dimensions['height']
+      ),
+    }
+  )
+  is_unknown = video_orientations['video_orientation'] == 'Unknown'
+  return (
+    video_orientations.iloc[np.argsort(is_unknown.to_numpy(), kind='stable')]
+    .drop_duplicates('video_id')
+    .reset_index(drop=True)
+  )
+
+
+def parse_dimensions_from_asset_names(
+  asset_names: pd.Series,
+  element_delimiter: str = '_',
+  orientation_position: int = 0,
+  orientation_delimiter: str = 'x',
+) -> pd.DataFrame:
+  """Parses width and height encoded in asset names.
+
+  Asset name is split by `element_delimiter`, element at
+  `orientation_position` is expected to be `<width><orientation_delimiter>
+  <height>`, i.e. for `my_video_1920x1080.mp4` with '_' as element delimiter
+  and 'x' as orientation delimiter dimensions are at position 2.
+
+  Args:
+    asset_names: Names of video assets.
+    element_delimiter: Delimiter between elements of asset name.
+    orientation_position: Position of dimensions element starting from zero.
+    orientation_delimiter: Delimiter between width and height.
+
+  Returns:
+    DataFrame with width and height columns; NaN for unparsable names.
+  """
+  delimiter = re.escape(element_delimiter)
+  element = (
+    f'[^{delimiter}]*{delimiter}'
+    if len(element_delimiter) == 1
+    else f'.*?{delimiter}'
+  )
+  pattern = (
+    f'^(?:{element}){{{orientation_position}}}'
+    rf'\s*(?P<width>\d+)\s*{re.escape(orientation_delimiter)}'
+    r'\s*(?P<height>\d+)'
+  )
+  dimensions = compute.extract_regex(_to_arrow_strings(asset_names), pattern)
+  return pd.DataFrame(
+    {
+      name: compute.cast(
+        compute.struct_field(dimensions, name), pa.float64()
+      ).to_numpy(zero_copy_only=False)
+      for name in ('width', 'height')
+    },
+    index=asset_names.index,
+  )
+
 
+def extract_dimensions_from_asset_names(
+  asset_names: pd.Series, width_expression: str, height_expression: str
+) -> pd.DataFrame:
+  """Extracts width and height from asset names with regular expressions.
 
-def generate_placeholders(videos: Sequence[str]) -> garf_core.report.GarfReport:
+  The first number in the text matched by expression is used, i.e.
+  `\\d+x` for width and `x\\d+` for height of `my_video_1920x1080.mp4`.
+
+  Args:
+    asset_names: Names of video assets.
+    width_expression: Regular expression matching width.
+    height_expression: Regular expression matching height.
+
+  Returns:
+    DataFrame with width and height columns; NaN for unparsable names.
+  """
+  names = _to_arrow_strings(asset_names)
+  dimensions = {}
+  for name, expression in (
+    ('width', width_expression),
+    ('height', height_expression),
+  ):
+    matches = compute.struct_field(
+      compute.extract_regex(names, f'(?P<match>{expression})'), 'match'
+    )
+    number = compute.struct_field(
+      compute.extract_regex(matches, r'(?P<number>\d+)'), 'number'
+    )
+    dimensions[name] = compute.cast(number, pa.float64()).to_numpy(
+      zero_copy_only=False
+    )
+  return pd.DataFrame(dimensions, index=asset_names.index)
+
+
+def classify_orientations(
+  width: pd.Series | np.ndarray, height: pd.Series | np.ndarray
+) -> np.ndarray:
+  """Maps video dimensions to orientation based on their aspect ratio.
+
+  Args:
+    width: Widths of videos.
+    height: Heights of videos.
+
+  Returns:
+    'Landscape', 'Portrait' or 'Square' for each video; 'Unknown' if video
+    has no valid dimensions.
+  """
+  width = pd.to_numeric(pd.Series(width), errors='coerce').to_numpy(float)
+  height = pd.to_numeric(pd.Series(height), errors='coerce').to_numpy(float)
+  is_valid = (width > 0) & (height > 0)
+  with np.errstate(divide='ignore', invalid='ignore'):
+    aspect_ratio = width / height
+  # Same as comparing aspect ratio rounded to 2 decimal places with 1.
+  return np.select(
+    [
+      is_valid & (aspect_ratio > 1.005),
+      is_valid & (aspect_ratio <= 0.995),
+      is_valid,
+    ],
+    ['Landscape', 'Portrait', 'Square'],
+    default='Unknown',
+  ).astype(object)
+
+
+def generate_placeholders(videos: Sequence[str]) -> pd.DataFrame:
   """Creates 'Unknown' orientation for every video."""
-  results = []
-  for video in videos:
-    results.append([video, 'Unknown'])
-  return garf_core.report.GarfReport(
-    results=results, column_names=['video_id', 'video_orientation']
+  return pd.DataFrame(
+    {
+      'video_id': pd.Series(videos, dtype=object),
+      'video_orientation': 'Unknown',
+    }
   )
 
 
+def _to_arrow_strings(values: pd.Series) -> pa.Array:
+  """Converts values to Arrow strings; missing values become null."""
+  return pa.array(values, type=pa.string(), from_pandas=True)
+
+
+def get_all_videos(
+  executor: bq_executor.BigQueryExecutor, bq_dataset: str
+) -> list[str]:
+  """Returns all YouTube videos from asset_mapping table."""
+  return executor.execute(
+    script_name='video_orientations',
+    query_text=f"""
+    SELECT DISTINCT
+      youtube_video_id
+    FROM `{bq_dataset}.asset_mapping`
+    WHERE type = 'YOUTUBE_VIDEO'
+    """,
+  ).get('youtube_video_id', pd.Series(dtype=str)).to_list()
+
+
+def get_video_assets(
+  executor: bq_executor.BigQueryExecutor, bq_dataset: str
+) -> pd.DataFrame:
+  """Returns YouTube videos and names of their assets from asset_mapping."""
+  video_assets = executor.execute(
+    script_name='video_asset_names',
+    query_text=f"""
+    SELECT DISTINCT
+      youtube_video_id,
+      asset_name
+    FROM `{bq_dataset}.asset_mapping`
+    WHERE type = 'YOUTUBE_VIDEO'
+    """,
+  )
+  if video_assets.empty:
+    return pd.DataFrame(
+      {
+        'youtube_video_id': pd.Series(dtype=object),
+        'asset_name': pd.Series(dtype=object),
+      }
+    )
+  return video_assets
+
+
+def get_video_orientation_config(path: str | None) -> dict[str, str]:
+  """Reads `scripts.video_orientation` section of the config.
+
+  Args:
+    path: Path to config file.
+
+  Returns:
+    Mode of getting video orientation and its options.
+  """
+  if not path:
+    return {}
+  with smart_open.open(path, 'r', encoding='utf-8') as f:
+    raw_config = yaml.safe_load(f) or {}
+  return (raw_config.get('scripts') or {}).get('video_orientation') or {}
+
+
+def get_videos_without_orientation(
+  executor: bq_executor.BigQueryExecutor,
+  bq_dataset: str,
+  retry_unknown_days: int = DEFAULT_RETRY_UNKNOWN_DAYS,
+) -> list[str] | None:
+  """Returns YouTube videos that should be added to video_orientation table.
+
+  Args:
+    executor: Executor to run queries in BigQuery.
+    bq_dataset: Dataset with asset_mapping and video_orientation tables.
+    retry_unknown_days: Number of days after which videos with 'Unknown'
+      orientation are fetched again.
+
+  Returns:
+    Videos missing in video_orientation table or having stale 'Unknown'
+    orientation; None if video_orientation table can't be updated
+    incrementally.
+  """
+  try:
+    videos = executor.execute(
+      script_name='new_video_orientations',
+      query_text=f"""
+      SELECT DISTINCT
+        AM.youtube_video_id
+      FROM `{bq_dataset}.asset_mapping` AS AM
+      LEFT JOIN `{bq_dataset}.video_orientation` AS VO
+        ON AM.youtube_video_id = VO.video_id
+      WHERE
+        AM.type = 'YOUTUBE_VIDEO'
+        AND (
+          VO.video_id IS NULL
+          OR (
+            VO.video_orientation = 'Unknown'
+            AND VO.fetched_at < TIMESTAMP_SUB(
+              CURRENT_TIMESTAMP(), INTERVAL {retry_unknown_days} DAY)
+          )
+        )
+      """,
+    )
+  except bq_executor.BigQueryExecutorError:
+    logging.warning(
+      'video_orientation table cannot be updated incrementally, '
+      'fetching orientation for all videos'
+    )
+    return None
+  return videos.get('youtube_video_id', pd.Series(dtype=str)).to_list()
+
+
+def delete_stale_unknown_orientations(
+  executor: bq_executor.BigQueryExecutor,
+  bq_dataset: str,
+  videos: Sequence[str],
+  fetched_at: pd.Timestamp,
+) -> None:
+  """Removes 'Unknown' orientation of videos that have been fetched again.
+
+  Videos are passed as a query parameter so the query text doesn't grow with
+  number of videos.
+
+  Args:
+    executor: Executor to run queries in BigQuery.
+    bq_dataset: Dataset with video_orientation table.
+    videos: Videos that have been fetched again.
+    fetched_at: Time of the new fetch; only older rows are removed.
+
+  Raises:
+    BigQueryExecutorError: If rows cannot be removed.
+  """
+  job = executor.client.query(
+    f"""
+    DELETE FROM `{bq_dataset}.video_orientation`
+    WHERE
+      video_orientation = 'Unknown'
+      AND video_id IN UNNEST(@videos)
+      AND fetched_at < @fetched_at
+    """,
+    job_config=bigquery.QueryJobConfig(
+      query_parameters=[
+        bigquery.ArrayQueryParameter('videos', 'STRING', list(videos)),
+        bigquery.ScalarQueryParameter(
+          'fetched_at', 'TIMESTAMP', fetched_at.to_pydatetime()
+        ),
+      ]
+    ),
+  )
+  try:
+    job.result()
+  except google_cloud_exceptions.GoogleCloudError as e:
+    raise bq_executor.BigQueryExecutorError(e) from e
+
+
 def main():
   parser = argparse.ArgumentParser()
   parser.add_argument('-c', '--config', dest='gaarf_config', default=None)
   parser.add_argument('--log', '--loglevel', dest='loglevel', default='info')
   parser.add_argument('--logger', dest='logger', default='local')
+  parser.add_argument('--incremental', dest='incremental', action='store_true')
+  parser.add_argument(
+    '--mode',
+    dest='mode',
+    choices=['youtube', 'placeholders', *NAME_PARSING_MODES],
+    default=None,
+  )
+  parser.add_argument(
+    '--retry-unknown-days',
+    dest='retry_unknown_days',
+    type=int,
+    default=DEFAULT_RETRY_UNKNOWN_DAYS,
+  )
+  parser.add_argument(
+    '--youtube-max-workers',
+    dest='youtube_max_workers',
+    type=int,
+    default=youtube.DEFAULT_MAX_WORKERS,
+  )
+  parser.add_argument(
+    '--youtube-requests-per-second',
+    dest='youtube_requests_per_second',
+    type=float,
+    default=youtube.DEFAULT_REQUESTS_PER_SECOND,
+  )
+  parser.add_argument(
+    '--youtube-max-requests',
+    dest='youtube_max_requests',
+    type=int,
+    default=None,
+  )
   args, kwargs = parser.parse_known_args()
 
   gaarf_utils.init_logging(
@@ -82,33 +478,63 @@ def main():
   config = gaarf_utils.ConfigBuilder('gaarf').build(vars(args), kwargs)
   bq_project = config.writer_params.get('project')
   bq_dataset = config.writer_params.get('dataset')
-  videos = (
-    bq_executor.BigQueryExecutor(bq_project)
-    .execute(
-      script_name='video_orientations',
-      query_text=f"""
-      SELECT DISTINCT
-        youtube_video_id
-      FROM `{bq_dataset}.asset_mapping`
-      WHERE type = 'YOUTUBE_VIDEO'
-      """,
+  orientation_config = get_video_orientation_config(args.gaarf_config)
+  mode = args.mode or orientation_config.pop('mode', None) or DEFAULT_MODE
+  executor = bq_executor.BigQueryExecutor(bq_project)
+  videos = None
+  if args.incremental:
+    videos = get_videos_without_orientation(
+      executor, bq_dataset, args.retry_unknown_days
     )
-    .youtube_video_id.to_list()
-  )
-  try:
-    video_orientations = get_video_orientations_from_youtube_data_api(videos)
-  except Exception as e:
-    logging.error(e)
-    logging.error(
-      'Failed to get data from YouTube Data API, generating placeholders'
+  if is_incremental := videos is not None:
+    if not videos:
+      logging.info('All videos already have orientation')
+      return
+    logging.info('Fetching orientation for %d new video(s)', len(videos))
+  else:
+    videos = get_all_videos(executor, bq_dataset)
+  if mode in NAME_PARSING_MODES:
+    video_assets = get_video_assets(executor, bq_dataset)
+    video_assets = video_assets[video_assets['youtube_video_id'].isin(videos)]
+    video_orientations = get_video_orientations_from_asset_names(
+      video_assets, mode, **orientation_config
+    )
+    video_orientations = pd.concat(
+      [
+        video_orientations,
+        generate_placeholders(
+          pd.Index(videos).difference(video_orientations['video_id'])
+        ),
+      ],
+      ignore_index=True,
     )
+  elif mode == 'placeholders':
     video_orientations = generate_placeholders(videos)
-  bigquery_writer.BigQueryWriter(
+  else:
+    try:
+      video_orientations = get_video_orientations_from_youtube_data_api(
+        videos,
+        max_workers=args.youtube_max_workers,
+        rate_limiter=youtube.RateLimiter(
+          args.youtube_requests_per_second, args.youtube_max_requests
+        ),
+      )
+    except Exception as e:
+      logging.error(e)
+      logging.error(
+        'Failed to get data from YouTube Data API, generating placeholders'
+      )
+      video_orientations = generate_placeholders(videos)
+  video_orientations['fetched_at'] = fetched_at = pd.Timestamp.now(tz='UTC')
+  writers.ColumnarBigQueryWriter(
     project=bq_project,
     dataset=bq_dataset,
-  ).write(
-    video_orientations[['video_id', 'video_orientation']], 'video_orientation'
-  )
+    write_disposition='WRITE_APPEND' if is_incremental else 'WRITE_TRUNCATE',
+  ).write(video_orientations, 'video_orientation')
+  if is_incremental:
+    delete_stale_unknown_orientations(
+      executor, bq_dataset, videos, fetched_at
+    )
 
 
 if __name__ == '__main__':
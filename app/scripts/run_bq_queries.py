@@ -0,0 +1,150 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Runs BigQuery queries of modules as a graph of table dependencies.
+
+Works as `gaarf-bq` command for snapshots, views, output tables, legacy views
+and incremental saving of selected modules (or for provided SQL files); each
+query starts as soon as queries creating tables, views and functions it uses
+are completed.
+
+Run after Ads API data for all selected modules are fetched:
+
+  python app/scripts/run_bq_queries.py -c=app_reporting_pack.yaml \\
+    --modules=core,assets,geo --max-workers=8
+"""
+
+from __future__ import annotations
+
+import argparse
+import functools
+import json
+import logging
+import os
+from collections.abc import Mapping, Sequence
+from typing import Any
+
+import smart_open
+import yaml
+from gaarf.cli import utils as gaarf_utils
+from gaarf.executors import bq_executor
+from gaarf.io import reader
+from src import pipeline, sql_graph
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODULES = sql_graph.MODULES
+DEFAULT_MAX_WORKERS = 8
+
+
+def build_steps(
+  paths: Sequence[str],
+  executor: bq_executor.BigQueryExecutor,
+  params: Mapping[str, Any] | None = None,
+) -> list[pipeline.Step]:
+  """Creates a step for every query depending on queries it uses data of.
+
+  Args:
+    paths: Paths to SQL files in order they would run one after another.
+    executor: Executor running queries in BigQuery.
+    params: Macros and templates of queries.
+
+  Returns:
+    Steps named by paths of queries.
+  """
+  params = params or {}
+  file_reader = reader.FileReader()
+  texts = {path: file_reader.read(path) for path in paths}
+  queries = [
+    sql_graph.parse_query(path, text, params.get('macro'))
+    for path, text in texts.items()
+  ]
+  dependencies = sql_graph.get_dependencies(queries)
+  return [
+    pipeline.Step(
+      query.path,
+      functools.partial(
+        executor.execute, query.path, texts[query.path], params
+      ),
+      dependencies[query.path],
+      inputs=query.sources,
+      outputs=query.targets,
+    )
+    for query in queries
+  ]
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('query', nargs='*')
+  parser.add_argument('-c', '--config', dest='gaarf_config', default=None)
+  parser.add_argument('--project', dest='project')
+  parser.add_argument(
+    '--dataset-location', dest='dataset_location', default=None
+  )
+  parser.add_argument('--log', '--loglevel', dest='loglevel', default='info')
+  parser.add_argument('--logger', dest='logger', default='local')
+  parser.add_argument(
+    '--modules', dest='modules', default=','.join(DEFAULT_MODULES)
+  )
+  parser.add_argument('--legacy', dest='legacy', action='store_true')
+  parser.add_argument('--incremental', dest='incremental', action='store_true')
+  parser.add_argument(
+    '--max-workers', dest='max_workers', type=int, default=DEFAULT_MAX_WORKERS
+  )
+  parser.add_argument('--report', dest='report', default=None)
+  parser.add_argument('--dry-run', dest='dry_run', action='store_true')
+  args, kwargs = parser.parse_known_args()
+
+  gaarf_utils.init_logging(
+    loglevel=args.loglevel.upper(), logger_type=args.logger
+  )
+  app_config = {}
+  if args.gaarf_config:
+    with smart_open.open(args.gaarf_config, 'r', encoding='utf-8') as f:
+      app_config = yaml.safe_load(f) or {}
+  config = gaarf_utils.ConfigBuilder('gaarf-bq').build(vars(args), kwargs)
+  config = gaarf_utils.initialize_runtime_parameters(config)
+  paths = args.query or sql_graph.get_module_queries(
+    APP_DIR,
+    [module.strip() for module in args.modules.split(',')],
+    legacy=args.legacy or bool(app_config.get('legacy')),
+    incremental=args.incremental or bool(app_config.get('incremental')),
+  )
+  executor = bq_executor.BigQueryExecutor(
+    project_id=config.project, location=config.dataset_location
+  )
+  queries_pipeline = pipeline.Pipeline(
+    build_steps(paths, executor, config.params)
+  )
+  if args.dry_run:
+    for i, level in enumerate(queries_pipeline.levels):
+      print(f'{i}: {", ".join(os.path.relpath(path) for path in level)}')
+    return
+  executor.create_datasets(config.params.get('macro'))
+  try:
+    queries_pipeline.run(max_workers=args.max_workers)
+  finally:
+    report = queries_pipeline.get_report()
+    logging.info(
+      'Wall time %.1fs, critical path %.1fs: %s',
+      report['wall_time_seconds'],
+      report['critical_path_seconds'],
+      ' -> '.join(os.path.relpath(path) for path in report['critical_path']),
+    )
+    if args.report:
+      with smart_open.open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,434 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Runs App Reporting Pack modules as a dependency graph.
+
+Each module is split into steps (fetching data from Ads API, module scripts,
+snapshots, views, output tables, legacy views and incremental saving); steps
+of different modules that do not depend on each other run concurrently.
+
+Run from the repository root:
+
+  python app/scripts/run_pipeline.py -c=app_reporting_pack.yaml \\
+    --ads-config=google-ads.yaml --max-workers=4
+"""
+
+from __future__ import annotations
+
+import argparse
+import functools
+import json
+import logging
+import os
+import sys
+import tempfile
+from collections.abc import Mapping, Sequence
+from typing import Any
+
+import smart_open
+import yaml
+from gaarf.cli import utils as gaarf_utils
+from src import pipeline, sql_graph
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS_DIR = os.path.join(APP_DIR, 'scripts')
+DEFAULT_MODULES = sql_graph.MODULES
+DEFAULT_MAX_WORKERS = 4
+
+# Tables checked for missing incremental snapshots before fetching data.
+_INCREMENTAL_TABLES = {
+  'core': 'ad_group_network_split',
+  'assets': 'asset_performance',
+  'geo': 'geo_performance',
+  'ios_skan': 'skan_decoder',
+}
+
+
+class PipelineBuilder:
+  """Builds steps of App Reporting Pack modules.
+
+  Attributes:
+    config_path: Path to App Reporting Pack config.
+    config: Content of the config.
+    ads_config: Path to google-ads.yaml.
+    loglevel: Log level passed to all commands.
+    api_version: Google Ads API version.
+    legacy: Whether to generate legacy views.
+    app_dir: Directory with modules.
+    fetch_report_dir: Directory to save timings of Ads API queries to.
+  """
+
+  def __init__(
+    self,
+    config_path: str,
+    config: Mapping[str, Any],
+    ads_config: str | None = None,
+    loglevel: str = 'info',
+    api_version: str | None = None,
+    legacy: bool = False,
+    app_dir: str = APP_DIR,
+    fetch_report_dir: str | None = None,
+  ) -> None:
+    """Initializes PipelineBuilder.
+
+    Args:
+      config_path: Path to App Reporting Pack config.
+      config: Content of the config.
+      ads_config: Path to google-ads.yaml.
+      loglevel: Log level passed to all commands.
+      api_version: Google Ads API version.
+      legacy: Whether to generate legacy views.
+      app_dir: Directory with modules.
+      fetch_report_dir: Directory to save timings of Ads API queries to.
+    """
+    self.config_path = config_path
+    self.config = config
+    self.ads_config = ads_config
+    self.loglevel = loglevel
+    self.api_version = api_version
+    self.legacy = legacy or bool(config.get('legacy'))
+    self.app_dir = app_dir
+    self.fetch_report_dir = fetch_report_dir
+
+  @property
+  def ads_flags(self) -> list[str]:
+    """Flags of commands accessing Ads API."""
+    flags = [f'-c={self.config_path}', f'--log={self.loglevel}']
+    if self.ads_config:
+      flags.append(f'--ads-config={self.ads_config}')
+    if self.api_version:
+      flags.append(f'--api-version={self.api_version}')
+    return flags
+
+  def build(
+    self, modules: Sequence[str] = DEFAULT_MODULES
+  ) -> list[pipeline.Step]:
+    """Builds steps for the selected modules.
+
+    Dependencies between modules: BigQuery steps of all modules depend on
+    core views (they use core functions, views and mapping tables); steps
+    reading or writing the same tables, views or functions keep the order
+    they have when modules run one after another.
+
+    Args:
+      modules: Modules to build steps for.
+
+    Returns:
+      Steps of all modules and the final step saving time of the run.
+    """
+    if 'ios_skan' in modules and 'skan_mode' not in (
+      self.config.get('scripts') or {}
+    ):
+      logging.info('SKAN mode is not configured, skipping ios_skan module')
+      modules = [module for module in modules if module != 'ios_skan']
+    steps = []
+    for module in sql_graph.sort_modules(modules):
+      steps.extend(self._build_module(module, 'core' in modules))
+    object_dependencies = sql_graph.get_dependencies(
+      [
+        sql_graph.SqlQuery(step.name, step.outputs, step.inputs)
+        for step in steps
+      ]
+    )
+    for step in steps:
+      step.dependencies = list(
+        dict.fromkeys([*step.dependencies, *object_dependencies[step.name]])
+      )
+    steps.append(
+      pipeline.Step(
+        'last_run',
+        self._save_last_run,
+        [step.name for step in steps],
+      )
+    )
+    return steps
+
+  def _build_module(self, module: str, has_core: bool) -> list[pipeline.Step]:
+    """Builds steps of a single module."""
+    queries_dir = os.path.join(self.app_dir, module, 'bq_queries')
+    fetch = f'{module}.fetch'
+    steps = [
+      pipeline.Step(
+        fetch,
+        functools.partial(self._fetch, module),
+        outputs=[
+          f'{{bq_dataset}}.{os.path.basename(query)[: -len(".sql")]}'
+          for query in sql_graph.list_queries(
+            os.path.join(self.app_dir, module, 'google_ads_queries')
+          )
+        ],
+      )
+    ]
+    core_dependencies = (
+      ['core.views'] if has_core and module != 'core' else []
+    )
+    last_step = fetch
+    output_dependencies = []
+    if module == 'core':
+      steps.append(
+        self._python_step(
+          'core.conv_lag_adjustment', 'conv_lag_adjustment.py', self.ads_flags
+        )
+      )
+      output_dependencies.append('core.conv_lag_adjustment')
+    elif module == 'assets':
+      steps.append(
+        self._python_step(
+          'assets.video_orientation',
+          'fetch_video_orientation.py',
+          [*self.ads_flags, '--incremental'],
+          [fetch],
+        )
+      )
+      output_dependencies.append('assets.video_orientation')
+      if self.config.get('backfill'):
+        steps.append(
+          self._python_step(
+            'assets.backfill_cohorts',
+            'backfill_snapshots.py',
+            [*self.ads_flags, '--restore-cohorts'],
+            [fetch],
+          )
+        )
+        last_step = 'assets.backfill_cohorts'
+    elif module == 'ios_skan':
+      steps.append(
+        self._python_step(
+          'ios_skan.skan_schema',
+          'create_skan_schema.py',
+          [f'-c={self.config_path}', f'--log={self.loglevel}'],
+        )
+      )
+      output_dependencies.append('ios_skan.skan_schema')
+
+    if os.path.isdir(snapshots_dir := os.path.join(queries_dir, 'snapshots')):
+      steps.append(
+        self._bq_step(
+          f'{module}.snapshots',
+          snapshots_dir,
+          [last_step, *core_dependencies],
+        )
+      )
+      last_step = f'{module}.snapshots'
+    if module == 'core' and self.config.get('backfill'):
+      steps.append(
+        self._python_step(
+          'core.backfill_bid_budgets',
+          'backfill_snapshots.py',
+          [*self.ads_flags, '--restore-bid-budgets'],
+          [last_step],
+        )
+      )
+      last_step = 'core.backfill_bid_budgets'
+    if os.path.isdir(views_dir := os.path.join(queries_dir, 'views')):
+      steps.append(
+        self._bq_step(
+          f'{module}.views',
+          views_dir,
+          [last_step, *core_dependencies, *output_dependencies],
+        )
+      )
+      last_step = f'{module}.views'
+    steps.append(
+      self._bq_step(
+        f'{module}.outputs',
+        queries_dir,
+        [last_step, *core_dependencies, *output_dependencies],
+      )
+    )
+    legacy_dir = os.path.join(queries_dir, 'legacy_views')
+    if self.legacy and os.path.isdir(legacy_dir):
+      steps.append(
+        self._bq_step(
+          f'{module}.legacy_views', legacy_dir, [f'{module}.outputs']
+        )
+      )
+    incremental_query = os.path.join(
+      queries_dir, 'incremental', 'incremental_saving.sql'
+    )
+    if self.config.get('incremental') and os.path.isfile(incremental_query):
+      steps.append(
+        self._bq_step(
+          f'{module}.incremental_saving',
+          incremental_query,
+          [f'{module}.outputs'],
+        )
+      )
+    return steps
+
+  def _fetch(self, module: str) -> None:
+    """Fetches data for module from Ads API.
+
+    If incremental table of the module has missing snapshots, data are
+    fetched starting from the first missing day.
+    """
+    flags = self.ads_flags
+    if table := _INCREMENTAL_TABLES.get(module):
+      output = pipeline.run_command(
+        [
+          sys.executable,
+          os.path.join(SCRIPTS_DIR, 'backfill_snapshots.py'),
+          *self.ads_flags,
+          '--restore-incremental-snapshots',
+          f'--incremental-table={table}',
+        ],
+        name=f'{module}.fetch',
+        merge_stderr=False,
+      )
+      if new_start_date := next(reversed(output.split()), None):
+        logging.info(
+          "'%s' has missing snapshots, changing start_date to %s",
+          table,
+          new_start_date,
+        )
+        flags = [*flags, f'--macro.start_date={new_start_date}']
+    queries = sql_graph.list_queries(
+      os.path.join(self.app_dir, module, 'google_ads_queries')
+    )
+    if self.fetch_report_dir:
+      flags.append(
+        f'--report={os.path.join(self.fetch_report_dir, module)}.json'
+      )
+    self._run(
+      f'{module}.fetch',
+      [
+        sys.executable,
+        os.path.join(SCRIPTS_DIR, 'fetch_ads_queries.py'),
+        *queries,
+        *flags,
+      ],
+    )
+
+  def _save_last_run(self) -> None:
+    """Saves time of the run to BigQuery."""
+    gaarf_config = self.config.get('gaarf') or {}
+    dataset = (gaarf_config.get('bq') or {}).get('dataset')
+    with tempfile.NamedTemporaryFile(
+      'w', suffix='.sql', encoding='utf-8', delete=False
+    ) as f:
+      f.write(
+        f"CREATE OR REPLACE TABLE `{dataset}.last_run` AS\n"
+        "SELECT '{current_datetime}' AS last_run\n"
+      )
+    try:
+      self._run('last_run', ['gaarf-bq', f.name, f'-c={self.config_path}'])
+    finally:
+      os.remove(f.name)
+
+  def _python_step(
+    self,
+    name: str,
+    script: str,
+    flags: Sequence[str],
+    dependencies: Sequence[str] = (),
+  ) -> pipeline.Step:
+    """Creates step running one of App Reporting Pack scripts."""
+    return pipeline.Step(
+      name,
+      functools.partial(
+        self._run,
+        name,
+        [sys.executable, os.path.join(SCRIPTS_DIR, script), *flags],
+      ),
+      dependencies,
+    )
+
+  def _bq_step(
+    self, name: str, path: str, dependencies: Sequence[str]
+  ) -> pipeline.Step:
+    """Creates step running BigQuery queries from a file or a directory."""
+    queries = sql_graph.list_queries(path)
+    parsed_queries = [sql_graph.parse_query(query) for query in queries]
+    return pipeline.Step(
+      name,
+      functools.partial(
+        self._run,
+        name,
+        [
+          'gaarf-bq',
+          *queries,
+          f'-c={self.config_path}',
+          f'--log={self.loglevel}',
+        ],
+      ),
+      dependencies,
+      inputs=set().union(*(query.sources for query in parsed_queries)),
+      outputs=set().union(*(query.targets for query in parsed_queries)),
+    )
+
+  def _run(self, name: str, command: Sequence[str]) -> None:
+    """Runs command of a step."""
+    pipeline.run_command(command, name=name)
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('-c', '--config', dest='config', required=True)
+  parser.add_argument('--ads-config', dest='ads_config', default=None)
+  parser.add_argument('--log', '--loglevel', dest='loglevel', default='info')
+  parser.add_argument('--logger', dest='logger', default='local')
+  parser.add_argument('--api-version', dest='api_version', default=None)
+  parser.add_argument(
+    '--modules', dest='modules', default=','.join(DEFAULT_MODULES)
+  )
+  parser.add_argument('--legacy', dest='legacy', action='store_true')
+  parser.add_argument(
+    '--max-workers', dest='max_workers', type=int, default=DEFAULT_MAX_WORKERS
+  )
+  parser.add_argument('--report', dest='report', default=None)
+  parser.add_argument(
+    '--fetch-report-dir', dest='fetch_report_dir', default=None
+  )
+  parser.add_argument('--dry-run', dest='dry_run', action='store_true')
+  args = parser.parse_args()
+
+  gaarf_utils.init_logging(
+    loglevel=args.loglevel.upper(), logger_type=args.logger
+  )
+  with smart_open.open(args.config, 'r', encoding='utf-8') as f:
+    config = yaml.safe_load(f) or {}
+  steps = PipelineBuilder(
+    args.config,
+    config,
+    ads_config=args.ads_config,
+    loglevel=args.loglevel,
+    api_version=args.api_version,
+    legacy=args.legacy,
+    fetch_report_dir=args.fetch_report_dir,
+  ).build([module.strip() for module in args.modules.split(',')])
+  app_pipeline = pipeline.Pipeline(steps)
+  if args.dry_run:
+    for i, level in enumerate(app_pipeline.levels):
+      print(f'{i}: {", ".join(level)}')
+    return
+  try:
+    app_pipeline.run(max_workers=args.max_workers)
+  finally:
+    report = app_pipeline.get_report()
+    for step in report['steps']:
+      logging.info(
+        '%-35s %-10s %8.1fs', step['name'], step['status'], step['seconds']
+      )
+    logging.info(
+      'Wall time %.1fs, critical path %.1fs: %s',
+      report['wall_time_seconds'],
+      report['critical_path_seconds'],
+      ' -> '.join(report['critical_path']),
+    )
+    if args.report:
+      with smart_open.open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+  main()
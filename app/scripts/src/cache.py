@@ -0,0 +1,175 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module for caching reports fetched from Ads API on a local disk.
+
+Reports are saved as parquet files built from their own results so that
+types of values (i.e. integers in columns with missing values) are the same
+on cache hit as on fetching from API; a file is reused only if it was fetched
+with the same query, accounts and API version on the same day and is not
+older than the specified TTL.
+"""
+
+import contextlib
+import datetime
+import hashlib
+import json
+import logging
+import os
+import time
+from collections.abc import Sequence
+
+import gaarf
+import pyarrow as pa
+from gaarf import base_query
+from pyarrow import parquet
+
+DEFAULT_TTL = datetime.timedelta(hours=24)
+DEFAULT_MAX_SIZE_MB = 1024
+
+
+class CachedReportFetcher:
+  """Fetches reports from Ads API reusing results of previous fetches.
+
+  Attributes:
+    report_fetcher: AdsReportFetcher to get data on cache miss.
+    cache_dir: Directory to store cached reports in.
+    ttl: Maximum age of cached report.
+    max_size_bytes: Maximum total size of cached reports.
+  """
+
+  def __init__(
+    self,
+    report_fetcher: gaarf.report_fetcher.AdsReportFetcher,
+    cache_dir: str,
+    ttl: datetime.timedelta = DEFAULT_TTL,
+    max_size_mb: float = DEFAULT_MAX_SIZE_MB,
+  ) -> None:
+    """Initializes CachedReportFetcher.
+
+    Args:
+      report_fetcher: AdsReportFetcher to get data on cache miss.
+      cache_dir: Directory to store cached reports in.
+      ttl: Maximum age of cached report.
+      max_size_mb: Maximum total size of cached reports in megabytes.
+    """
+    self.report_fetcher = report_fetcher
+    self.cache_dir = cache_dir
+    self.ttl = ttl
+    self.max_size_bytes = int(max_size_mb * 2**20)
+    os.makedirs(cache_dir, exist_ok=True)
+
+  def expand_mcc(self, *args, **kwargs) -> list[str]:
+    """Expands MCC without caching."""
+    return self.report_fetcher.expand_mcc(*args, **kwargs)
+
+  def fetch(
+    self,
+    query: base_query.BaseQuery | str,
+    customer_ids: Sequence[str] | str,
+  ) -> gaarf.report.GaarfReport:
+    """Fetches report from cache or from Ads API on cache miss.
+
+    Args:
+      query: Query to fetch.
+      customer_ids: Account(s) to fetch data from.
+
+    Returns:
+      Report with query results.
+    """
+    query_name = type(query).__name__
+    path = os.path.join(
+      self.cache_dir, f'{self._get_key(query, customer_ids)}.parquet'
+    )
+    if (report := self._load(path)) is not None:
+      logging.info('cache hit for %s', query_name)
+      return report
+    logging.info('cache miss for %s', query_name)
+    report = self.report_fetcher.fetch(query, customer_ids)
+    self._save(report, path)
+    return report
+
+  def _get_key(
+    self,
+    query: base_query.BaseQuery | str,
+    customer_ids: Sequence[str] | str,
+  ) -> str:
+    """Builds cache key based on query, accounts, API version and date."""
+    if isinstance(customer_ids, str):
+      customer_ids = [customer_ids]
+    key = {
+      'query': str(query),
+      'customer_ids': sorted(str(customer_id) for customer_id in customer_ids),
+      'api_version': str(
+        getattr(self.report_fetcher.api_client, 'api_version', '')
+      ),
+      'date': datetime.date.today().isoformat(),
+    }
+    return hashlib.sha256(
+      json.dumps(key, sort_keys=True).encode('utf-8')
+    ).hexdigest()
+
+  def _load(self, path: str) -> gaarf.report.GaarfReport | None:
+    """Reads report from cache if it exists and not expired."""
+    try:
+      modified_at = os.path.getmtime(path)
+    except FileNotFoundError:
+      return None
+    if time.time() - modified_at > self.ttl.total_seconds():
+      with contextlib.suppress(FileNotFoundError):
+        os.remove(path)
+      return None
+    table = parquet.read_table(path)
+    os.utime(path)
+    columns = [column.to_pylist() for column in table.columns]
+    return gaarf.report.GaarfReport(
+      results=[list(row) for row in zip(*columns)],
+      column_names=table.column_names,
+    )
+
+  def _save(self, report: gaarf.report.GaarfReport, path: str) -> None:
+    """Writes report to cache and evicts the oldest reports if needed."""
+    tmp_path = f'{path}.{os.getpid()}.{time.monotonic_ns()}.tmp'
+    try:
+      table = pa.table(
+        {
+          name: [row[i] for row in report.results]
+          for i, name in enumerate(report.column_names)
+        }
+      )
+      parquet.write_table(table, tmp_path)
+      os.replace(tmp_path, path)
+    except (pa.ArrowException, ValueError, TypeError) as e:
+      logging.warning('Failed to cache report: %s', e)
+      with contextlib.suppress(FileNotFoundError):
+        os.remove(tmp_path)
+      return
+    self._evict()
+
+  def _evict(self) -> None:
+    """Removes least recently used reports exceeding cache size."""
+    cached_files = []
+    for entry in os.scandir(self.cache_dir):
+      if entry.name.endswith('.parquet'):
+        with contextlib.suppress(FileNotFoundError):
+          stat = entry.stat()
+          cached_files.append((stat.st_mtime, stat.st_size, entry.path))
+    total_size = sum(size for _, size, _ in cached_files)
+    for _, size, path in sorted(cached_files):
+      if total_size <= self.max_size_bytes:
+        break
+      with contextlib.suppress(FileNotFoundError):
+        os.remove(path)
+        logging.debug('Evicted %s from cache', path)
+      total_size -= size
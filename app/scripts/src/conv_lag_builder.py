@@ -16,19 +16,42 @@
 
 Conversion lag adjustment tables contains network specific lags (from 1 till
 max 90) for each conversion_id that can be applied to any performance dataset.
+Lags can be calculated for several granularity levels (i.e. for each campaign
+or account in addition to network and conversion_id). Lags for a large number
+of groups can be calculated in several processes.
 """
 
+import itertools
 import os
-from functools import reduce
+from collections.abc import Mapping, Sequence
+from concurrent import futures
+from multiprocessing import shared_memory
 
 import gaarf
+import numpy as np
 import pandas as pd
 
+BASE_GROUPBY = ['network', 'conversion_id']
+GRANULARITY_LEVELS = {
+  'conversion': [],
+  'campaign': ['campaign_id'],
+  'account': ['account_id'],
+}
+
+_LAG_ENUMS = pd.read_csv(
+  os.path.join(os.path.dirname(__file__), '../data/conversion_lag_mapping.csv')
+)
+_LAG_BUCKETS = pd.CategoricalDtype(_LAG_ENUMS['conversion_lag_bucket'])
+# Lag number for each code of _LAG_BUCKETS; unknown buckets (code -1) get NaN.
+_LAG_NUMBERS = np.append(_LAG_ENUMS['lag_number'].to_numpy(dtype=float), np.nan)
+
 
 class ConversionLagBuilder:
   """Class for generating conversion lag adjustment table."""
 
-  def __init__(self, lag_data: pd.DataFrame, base_groupby: list[str]) -> None:
+  def __init__(
+    self, lag_data: pd.DataFrame, base_groupby: list[str], workers: int = 1
+  ) -> None:
     """Initilizes ConversionLagBuilder with lag_data and groupby bases.
 
     Args:
@@ -38,52 +61,155 @@ class ConversionLagBuilder:
       base_groupby:
         Attributes of lag_data to control the granularity of calculating
           conversion lags.
+      workers:
+        Number of processes to calculate lags in.
     """
     self.lag_data = lag_data
     self.group_by = base_groupby
-
-  def _read_lag_enums(self) -> pd.DataFrame:
-    dirname = os.path.dirname(__file__)
-    return pd.read_csv(
-      os.path.join(dirname, '../data/conversion_lag_mapping.csv')
-    )
+    self.workers = workers
 
   def calculate_reference_values(self) -> gaarf.report.GaarfReport:
     """Method for getting conversion lag adjustment table.
 
+    All groups are processed at once; every step relies on group-aware
+    operations instead of iterating over groups. String attributes are
+    grouped as categoricals and decoded back only in the final table.
+
     Returns:
        DataFrame with conversion lag adjustment table.
     """
-    joined_data = self.join_lag_data_and_enums(self.lag_data)
-    grouped = joined_data.groupby(self.group_by)
-    conversion_lag_table = []
-    for _, df_group in grouped:
-      grouped_data = self.calculate_conversions_by_name_network_lag(df_group)
-      if grouped_data.empty:
-        continue
-      cumulative_data = self.calculate_cumulative_sum_ordered_by_n(grouped_data)
-      expanded_data = self.expand_and_join_lags(cumulative_data)
-      incremental_lag = self.calculate_incremental_lag(expanded_data)
-      conversion_lag_table.append(incremental_lag)
+    joined_data = _encode_dimensions(
+      self.join_lag_data_and_enums(self.lag_data), self.group_by
+    )
+    grouped_data = self.calculate_conversions_by_name_network_lag(joined_data)
     return gaarf.report.GaarfReport.from_pandas(
-      reduce(
-        lambda left, right: pd.concat([left, right], ignore_index=True),
-        conversion_lag_table,
+      _decode_dimensions(self.calculate_lags(grouped_data))
+    )
+
+  def calculate_reference_values_by_levels(
+    self, levels: Mapping[str, Sequence[str]]
+  ) -> dict[str, pd.DataFrame]:
+    """Method for getting conversion lag adjustment tables for several levels.
+
+    Conversions are summed once on the finest granularity among all levels;
+    lags for each level are calculated from this aggregate.
+
+    Args:
+      levels: Mapping between level name and attributes of lag_data that
+        are added to base groupby to get lags on this level.
+
+    Returns:
+      Mapping between level name and conversion lag adjustment table.
+    """
+    finest_groupby = list(
+      dict.fromkeys(itertools.chain(self.group_by, *levels.values()))
+    )
+    aggregated_data = ConversionLagBuilder(
+      self.lag_data, finest_groupby
+    ).calculate_conversions_by_name_network_lag(
+      _encode_dimensions(
+        self.join_lag_data_and_enums(self.lag_data), finest_groupby
+      )
+    )
+    conversion_lag_tables = {}
+    for level, level_groupby in levels.items():
+      builder = ConversionLagBuilder(
+        aggregated_data, self.group_by + list(level_groupby), self.workers
       )
+      grouped_data = builder.calculate_conversions_by_name_network_lag(
+        aggregated_data
+      )
+      conversion_lag_tables[level] = _decode_dimensions(
+        builder.calculate_lags(grouped_data)
+      )
+    return conversion_lag_tables
+
+  def calculate_lags(self, grouped_data: pd.DataFrame) -> pd.DataFrame:
+    """Calculates lag adjustment for each lag day of every group.
+
+    Args:
+      grouped_data: Sum of all_conversions by group_by and lag_number.
+
+    Returns:
+      DataFrame with group_by attributes, lag_day and lag_adjustment.
+    """
+    if self.workers > 1:
+      return self._calculate_lags_in_processes(grouped_data)
+    cumulative_data = self.calculate_cumulative_sum_ordered_by_n(grouped_data)
+    expanded_data = self.expand_and_join_lags(cumulative_data)
+    return self.calculate_incremental_lag(expanded_data)
+
+  def _calculate_lags_in_processes(
+    self, grouped_data: pd.DataFrame
+  ) -> pd.DataFrame:
+    """Calculates lags with groups partitioned between several processes.
+
+    Groups are replaced with integer codes and passed to processes via shared
+    memory together with lag numbers and conversions; each process calculates
+    lags for groups with `code % workers` equal to its index. Results are
+    ordered by group and lag day so they don't depend on number of workers.
+    """
+    grouped_data = grouped_data.reset_index(drop=True)
+    groups = grouped_data.groupby(self.group_by, sort=False, observed=True)
+    group_codes = groups.ngroup().to_numpy(dtype=np.int64)
+    group_keys = grouped_data.loc[
+      groups.cumcount().to_numpy() == 0, self.group_by
+    ].reset_index(drop=True)
+    arrays = {
+      'group': group_codes,
+      'lag_number': grouped_data['lag_number'].to_numpy(dtype=float),
+      'all_conversions': grouped_data['all_conversions'].to_numpy(
+        dtype=float
+      ),
+    }
+    shared_arrays = {
+      name: shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+      for name, array in arrays.items()
+    }
+    try:
+      specs = {}
+      for name, array in arrays.items():
+        np.ndarray(
+          array.shape, array.dtype, buffer=shared_arrays[name].buf
+        )[:] = array
+        specs[name] = (shared_arrays[name].name, array.shape, array.dtype.str)
+      with futures.ProcessPoolExecutor(max_workers=self.workers) as executor:
+        partitions = list(
+          executor.map(
+            _calculate_partition_lags,
+            itertools.repeat(specs),
+            range(self.workers),
+            itertools.repeat(self.workers),
+          )
+        )
+    finally:
+      for shared_array in shared_arrays.values():
+        shared_array.close()
+        shared_array.unlink()
+    group, lag_day, lag_adjustment = (
+      np.concatenate(partition_arrays) for partition_arrays in zip(*partitions)
     )
+    order = np.lexsort((lag_day, group))
+    lags = group_keys.take(group[order]).reset_index(drop=True)
+    lags['lag_day'] = lag_day[order]
+    lags['lag_adjustment'] = lag_adjustment[order]
+    return lags
 
   def join_lag_data_and_enums(self, lag_data: pd.DataFrame) -> pd.DataFrame:
     """Joins conversion lag data enums from Google Ads API with INT values."""
-    return pd.merge(
-      lag_data, self._read_lag_enums(), on='conversion_lag_bucket', how='left'
+    bucket_codes = (
+      lag_data['conversion_lag_bucket'].astype(_LAG_BUCKETS).cat.codes
     )
+    return lag_data.assign(lag_number=_LAG_NUMBERS[bucket_codes])
 
   def calculate_conversions_by_name_network_lag(
     self, joined_data: pd.DataFrame
   ) -> pd.DataFrame:
     """Sums and sorts all_conversions by group_by parameter for each lag."""
     return (
-      joined_data.groupby(self.group_by + ['lag_number'], as_index=False)
+      joined_data.groupby(
+        self.group_by + ['lag_number'], as_index=False, observed=True
+      )
       .agg({'all_conversions': 'sum'})
       .sort_values(by=self.group_by + ['lag_number'])
     )
@@ -102,28 +228,18 @@ class ConversionLagBuilder:
         * daily_incremental_lag - difference in pct_conv between current
             and previous value of the lag bucket
     """
-    grouped_data['cumsum'] = grouped_data.groupby(
-      self.group_by, as_index=False
-    )['all_conversions'].cumsum()
-    total_conversions_by_group = grouped_data.groupby(
-      self.group_by, as_index=False
-    )['all_conversions'].sum()
-    new_ds = pd.merge(
-      grouped_data[self.group_by + ['lag_number', 'cumsum']],
-      total_conversions_by_group[self.group_by + ['all_conversions']],
-      on=self.group_by,
-      how='left',
-    )
+    grouped_data = grouped_data.reset_index(drop=True)
+    groups = grouped_data.groupby(self.group_by, sort=False, observed=True)
+    is_first_lag = groups.cumcount() == 0
+    new_ds = grouped_data[self.group_by + ['lag_number']].copy()
+    new_ds['cumsum'] = groups['all_conversions'].cumsum()
+    new_ds['all_conversions'] = groups['all_conversions'].transform('sum')
     new_ds['pct_conv'] = new_ds['cumsum'] / new_ds['all_conversions']
-    new_ds['shifted_lag_number'] = new_ds['lag_number'].shift(1)
-    new_ds['shifted_pct_conv'] = new_ds['pct_conv'].shift(1)
-    new_ds['lag_distance'] = new_ds['lag_number'] - new_ds['shifted_lag_number']
-    new_ds['lag_distance'] = new_ds['lag_distance'].fillna(1)
-    new_ds['daily_incremental_lag'] = (
-      new_ds['pct_conv'] - new_ds['shifted_pct_conv']
+    new_ds['lag_distance'] = (
+      new_ds['lag_number'].diff().mask(is_first_lag, 1)
     )
-    new_ds['daily_incremental_lag'] = new_ds['daily_incremental_lag'].fillna(
-      new_ds['pct_conv'][0]
+    new_ds['daily_incremental_lag'] = (
+      new_ds['pct_conv'].diff().mask(is_first_lag, new_ds['pct_conv'])
     )
     return new_ds
 
@@ -132,7 +248,9 @@ class ConversionLagBuilder:
 
     Number of repeats are equal to lag_distance.
     """
-    return lag_data.loc[lag_data.index.repeat(lag_data.lag_distance)]
+    return lag_data.loc[
+      lag_data.index.repeat(lag_data.lag_distance.astype(int))
+    ].reset_index(drop=True)
 
   def calculate_incremental_lag(
     self, expanded_data: pd.DataFrame
@@ -145,10 +263,71 @@ class ConversionLagBuilder:
     expanded_data['incremental_lag'] = (
       expanded_data['daily_incremental_lag'] / expanded_data['lag_distance']
     )
-    expanded_data['lag_adjustment'] = expanded_data.groupby(
-      self.group_by, as_index=False
-    )['incremental_lag'].cumsum()
-    expanded_data['lag_day'] = (
-      expanded_data.groupby(self.group_by).cumcount() + 1
-    )
+    groups = expanded_data.groupby(self.group_by, sort=False, observed=True)
+    expanded_data['lag_adjustment'] = groups['incremental_lag'].cumsum()
+    expanded_data['lag_day'] = groups.cumcount() + 1
     return expanded_data[self.group_by + ['lag_day', 'lag_adjustment']]
+
+
+def _calculate_partition_lags(
+  specs: dict[str, tuple[str, tuple[int, ...], str]],
+  partition: int,
+  partitions: int,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+  """Calculates lags for groups of a single partition.
+
+  Args:
+    specs: Mapping between column and name, shape and dtype of shared memory
+      block it's stored in.
+    partition: Index of partition to calculate lags for.
+    partitions: Total number of partitions.
+
+  Returns:
+    Group codes, lag days and lag adjustments of the partition.
+  """
+  shared_arrays = {
+    name: shared_memory.SharedMemory(name=shared_name)
+    for name, (shared_name, _, _) in specs.items()
+  }
+  try:
+    views = {
+      name: np.ndarray(shape, dtype, buffer=shared_arrays[name].buf)
+      for name, (_, shape, dtype) in specs.items()
+    }
+    is_in_partition = views['group'] % partitions == partition
+    partition_data = pd.DataFrame(
+      {name: view[is_in_partition] for name, view in views.items()}
+    )
+    del views
+  finally:
+    for shared_array in shared_arrays.values():
+      shared_array.close()
+  lags = ConversionLagBuilder(partition_data, ['group']).calculate_lags(
+    partition_data
+  )
+  return (
+    lags['group'].to_numpy(),
+    lags['lag_day'].to_numpy(),
+    lags['lag_adjustment'].to_numpy(),
+  )
+
+
+def _encode_dimensions(data: pd.DataFrame, columns: list[str]) -> pd.DataFrame:
+  """Converts string columns to categoricals to speed up grouping."""
+  return data.astype(
+    {
+      column: 'category'
+      for column in columns
+      if pd.api.types.is_string_dtype(data[column])
+    }
+  )
+
+
+def _decode_dimensions(data: pd.DataFrame) -> pd.DataFrame:
+  """Converts categorical columns back to their original type."""
+  return data.astype(
+    {
+      column: data[column].cat.categories.dtype
+      for column in data.select_dtypes('category').columns
+    }
+  )
@@ -0,0 +1,403 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module for fetching data from Ads API concurrently.
+
+Each query is fetched for every account (or shard of accounts) as a separate
+request; requests for all queries share a single pool of threads with a
+limited size.
+"""
+
+import itertools
+import logging
+import threading
+import time
+from collections.abc import Iterator, Mapping, Sequence
+from concurrent import futures
+from typing import Any
+
+import gaarf
+import grpc
+import pandas as pd
+from gaarf import base_query, query_editor
+from google.ads.googleads import errors as googleads_errors
+
+DEFAULT_SHARD_SIZE = 20
+DEFAULT_MAX_RETRIES = 3
+
+
+class BoundedReportFetcher:
+  """Limits number of concurrent requests made through a report fetcher.
+
+  Several pools of threads sharing a single BoundedReportFetcher make at
+  most `max_requests` requests to Ads API at the same time.
+
+  Attributes:
+    report_fetcher: Fetcher making requests to Ads API.
+    api_client: Client of the wrapped report fetcher.
+  """
+
+  def __init__(
+    self,
+    report_fetcher: gaarf.report_fetcher.AdsReportFetcher,
+    max_requests: int,
+  ) -> None:
+    """Initializes BoundedReportFetcher.
+
+    Args:
+      report_fetcher: Fetcher making requests to Ads API.
+      max_requests: Maximum number of concurrent requests.
+    """
+    self.report_fetcher = report_fetcher
+    self.api_client = getattr(report_fetcher, 'api_client', None)
+    self._semaphore = threading.BoundedSemaphore(max_requests)
+
+  def expand_mcc(self, *args, **kwargs) -> list[str]:
+    """Expands MCC without limiting concurrency."""
+    return self.report_fetcher.expand_mcc(*args, **kwargs)
+
+  def fetch(
+    self,
+    query: base_query.BaseQuery | query_editor.QueryElements | str,
+    customer_ids: Sequence[str] | str,
+  ) -> gaarf.report.GaarfReport:
+    """Fetches report waiting for a free slot if the limit is reached."""
+    with self._semaphore:
+      return self.report_fetcher.fetch(query, customer_ids)
+
+
+def fetch_reports(
+  report_fetcher: gaarf.report_fetcher.AdsReportFetcher,
+  report_queries: Mapping[str, base_query.BaseQuery],
+  customer_ids: Sequence[str],
+  max_workers: int = 1,
+) -> dict[str, gaarf.report.GaarfReport]:
+  """Fetches several independent queries for all accounts concurrently.
+
+  Args:
+    report_fetcher: Instantiated AdsReportFetcher to get data from Ads API.
+    report_queries: Mapping between report name and query to fetch.
+    customer_ids: Accounts to fetch data from.
+    max_workers: Maximum number of concurrent requests to Ads API.
+
+  Returns:
+    Mapping between report name and report with data for all accounts.
+  """
+  with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+    tasks = {
+      name: [
+        executor.submit(
+          _fetch_report, report_fetcher, name, query, customer_id
+        )
+        for customer_id in customer_ids
+      ]
+      for name, query in report_queries.items()
+    }
+    return {
+      name: combine_reports([task.result() for task in report_tasks])
+      for name, report_tasks in tasks.items()
+    }
+
+
+def fetch_and_aggregate(
+  report_fetcher: gaarf.report_fetcher.AdsReportFetcher,
+  query: base_query.BaseQuery,
+  customer_ids: Sequence[str],
+  group_by: Sequence[str],
+  value_columns: Sequence[str],
+  max_workers: int = 1,
+) -> pd.DataFrame:
+  """Fetches query for each account and sums its results as they arrive.
+
+  Report for an account is reduced to sums by group_by columns right after
+  it's fetched; at most max_workers reports are fetched at the same time so
+  memory usage depends on number of unique groups rather than on number of
+  rows in all reports.
+
+  Args:
+    report_fetcher: Instantiated AdsReportFetcher to get data from Ads API.
+    query: Query to fetch.
+    customer_ids: Accounts to fetch data from.
+    group_by: Columns of the report to group by.
+    value_columns: Columns of the report to be summed.
+    max_workers: Maximum number of concurrent requests to Ads API.
+
+  Returns:
+    DataFrame with sums of value_columns for each group in all accounts.
+  """
+  group_by, value_columns = list(group_by), list(value_columns)
+  name = type(query).__name__
+  aggregated = pd.DataFrame(columns=group_by + value_columns)
+  partials = []
+  partial_rows = 0
+  customer_ids = iter(customer_ids)
+  with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+    pending = {
+      executor.submit(_fetch_report, report_fetcher, name, query, customer_id)
+      for customer_id in itertools.islice(customer_ids, max_workers)
+    }
+    while pending:
+      done, pending = futures.wait(
+        pending, return_when=futures.FIRST_COMPLETED
+      )
+      for task in done:
+        if (customer_id := next(customer_ids, None)) is not None:
+          pending.add(
+            executor.submit(
+              _fetch_report, report_fetcher, name, query, customer_id
+            )
+          )
+        if not (report := task.result()):
+          continue
+        partial = _sum_by(report.to_pandas(), group_by, value_columns)
+        partials.append(partial)
+        partial_rows += len(partial)
+        if partial_rows >= len(aggregated):
+          aggregated = _merge_partials(
+            aggregated, partials, group_by, value_columns
+          )
+          partials, partial_rows = [], 0
+  if partials:
+    aggregated = _merge_partials(aggregated, partials, group_by, value_columns)
+  return aggregated
+
+
+def fetch_sharded_reports(
+  report_fetcher: gaarf.report_fetcher.AdsReportFetcher,
+  report_queries: Mapping[
+    str, base_query.BaseQuery | query_editor.QueryElements
+  ],
+  customer_ids: Sequence[str],
+  shard_size: int = DEFAULT_SHARD_SIZE,
+  max_workers: int = 1,
+  max_retries: int = DEFAULT_MAX_RETRIES,
+  backoff_seconds: float = 5.0,
+) -> Iterator[tuple[str, gaarf.report.GaarfReport | None, dict[str, Any]]]:
+  """Fetches queries for shards of accounts yielding reports as they complete.
+
+  Every query is split into shards of `shard_size` accounts and each shard is
+  fetched as a separate task; shards of different queries are submitted in
+  turns so that queries overlap instead of waiting for each other. Queries to
+  constant resources are fetched once. Shards failed because of exhausted
+  Ads API quota are retried with exponential backoff.
+
+  Args:
+    report_fetcher: Instantiated AdsReportFetcher to get data from Ads API.
+    report_queries: Mapping between report name and query to fetch.
+    customer_ids: Accounts to fetch data from.
+    shard_size: Maximum number of accounts in a single task.
+    max_workers: Maximum number of concurrent requests to Ads API.
+    max_retries: Number of retries of a shard when quota is exhausted.
+    backoff_seconds: Delay before the first retry, doubled on each retry.
+
+  Yields:
+    Name of the report, report with data for all accounts and statistics of
+    fetching (status, number of accounts, shards and rows, total duration of
+    all shards as `fetch_seconds` and time from start of the first shard till
+    end of the last one as `wall_seconds`). If any shard of a query fails,
+    its other shards are dropped, report is None and statistics have
+    'failed' status and the error; other queries are fetched as usual.
+  """
+  customer_ids = list(customer_ids)
+  shard_size = shard_size or len(customer_ids) or 1
+  shards = [
+    customer_ids[shard_start : shard_start + shard_size]
+    for shard_start in range(0, len(customer_ids), shard_size)
+  ]
+  report_shards = {
+    name: (
+      [customer_ids[:1]]
+      if getattr(query, 'is_constant_resource', False)
+      else shards
+    )
+    for name, query in report_queries.items()
+  }
+  reports = {
+    name: [None] * len(query_shards)
+    for name, query_shards in report_shards.items()
+  }
+  timings = {name: [] for name in report_shards}
+  executor = futures.ThreadPoolExecutor(max_workers=max_workers)
+  try:
+    tasks = {
+      executor.submit(
+        _fetch_shard,
+        report_fetcher,
+        name,
+        report_queries[name],
+        report_shards[name][index],
+        max_retries,
+        backoff_seconds,
+      ): (name, index)
+      for index, name in _interleave(report_shards)
+    }
+    for task in futures.as_completed(tasks):
+      name, index = tasks[task]
+      if name not in reports:
+        continue
+      query_stats = {
+        'query': name,
+        'accounts': sum(len(shard) for shard in report_shards[name]),
+        'shards': len(report_shards[name]),
+      }
+      try:
+        report, started_at, finished_at = task.result()
+      except Exception as e:
+        logging.error("Failed to fetch report '%s': %s", name, e)
+        reports.pop(name)
+        for other_task, (other_name, _) in tasks.items():
+          if other_name == name:
+            other_task.cancel()
+        yield (
+          name,
+          None,
+          {
+            **query_stats,
+            'status': 'failed',
+            'error': str(e),
+            'rows': 0,
+            'fetch_seconds': 0.0,
+            'wall_seconds': 0.0,
+          },
+        )
+        continue
+      reports[name][index] = report
+      timings[name].append((started_at, finished_at))
+      if len(timings[name]) < len(reports[name]):
+        continue
+      started, finished = zip(*timings[name])
+      query_stats.update(
+        {
+          'status': 'completed',
+          'rows': sum(len(report) for report in reports[name]),
+          'fetch_seconds': sum(finished) - sum(started),
+          'wall_seconds': max(finished) - min(started),
+        }
+      )
+      yield name, combine_reports(reports.pop(name)), query_stats
+  finally:
+    executor.shutdown(cancel_futures=True)
+
+
+def combine_reports(
+  reports: Sequence[gaarf.report.GaarfReport],
+) -> gaarf.report.GaarfReport:
+  """Combines reports with the same columns into a single report.
+
+  Args:
+    reports: Reports to be combined.
+
+  Returns:
+    Report containing results of all reports; empty report without columns
+    if there are no reports.
+  """
+  if not reports:
+    return gaarf.report.GaarfReport(results=[], column_names=[])
+  results = [row for report in reports for row in report.results]
+  return gaarf.report.GaarfReport(
+    results=results,
+    column_names=reports[0].column_names,
+    results_placeholder=[] if results else reports[0].results_placeholder,
+  )
+
+
+def _fetch_report(
+  report_fetcher: gaarf.report_fetcher.AdsReportFetcher,
+  name: str,
+  query: base_query.BaseQuery,
+  customer_id: str,
+) -> gaarf.report.GaarfReport:
+  """Fetches a single query for a single account and logs its duration."""
+  start = time.perf_counter()
+  report = report_fetcher.fetch(query, customer_id)
+  logging.debug(
+    "report '%s' for account %s has been fetched in %.2f seconds",
+    name,
+    customer_id,
+    time.perf_counter() - start,
+  )
+  return report
+
+
+def _fetch_shard(
+  report_fetcher: gaarf.report_fetcher.AdsReportFetcher,
+  name: str,
+  query: base_query.BaseQuery | query_editor.QueryElements,
+  customer_ids: list[str],
+  max_retries: int,
+  backoff_seconds: float,
+) -> tuple[gaarf.report.GaarfReport, float, float]:
+  """Fetches a single query for a shard of accounts retrying exhausted quota.
+
+  Returns:
+    Report and times when the successful attempt started and finished.
+  """
+  for attempt in itertools.count():
+    start = time.perf_counter()
+    try:
+      report = report_fetcher.fetch(query, customer_ids)
+    except googleads_errors.GoogleAdsException as e:
+      if not _is_quota_exhausted(e) or attempt >= max_retries:
+        raise
+      delay = backoff_seconds * 2**attempt
+      logging.warning(
+        "Ads API quota is exhausted when fetching report '%s', "
+        'retrying in %.1f seconds',
+        name,
+        delay,
+      )
+      time.sleep(delay)
+      continue
+    end = time.perf_counter()
+    logging.debug(
+      "report '%s' for %d account(s) has been fetched in %.2f seconds",
+      name,
+      len(customer_ids),
+      end - start,
+    )
+    return report, start, end
+
+
+def _is_quota_exhausted(error: googleads_errors.GoogleAdsException) -> bool:
+  """Checks whether Ads API request failed because of exhausted quota."""
+  return error.error.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+
+
+def _interleave(shards: Mapping[str, list]) -> Iterator[tuple[int, str]]:
+  """Orders shards of all reports in turns: first shards, second, etc."""
+  for index in range(max((len(value) for value in shards.values()), default=0)):
+    for name, report_shards in shards.items():
+      if index < len(report_shards):
+        yield index, name
+
+
+def _sum_by(
+  data: pd.DataFrame, group_by: list[str], value_columns: list[str]
+) -> pd.DataFrame:
+  """Sums value_columns of data by group_by columns."""
+  return data.groupby(group_by, as_index=False)[value_columns].sum()
+
+
+def _merge_partials(
+  aggregated: pd.DataFrame,
+  partials: list[pd.DataFrame],
+  group_by: list[str],
+  value_columns: list[str],
+) -> pd.DataFrame:
+  """Adds partial sums to already aggregated data."""
+  if not aggregated.empty:
+    partials = [aggregated, *partials]
+  return _sum_by(
+    pd.concat(partials, ignore_index=True), group_by, value_columns
+  )
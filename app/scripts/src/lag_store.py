@@ -0,0 +1,202 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module for storing daily conversion lag data between runs.
+
+Store keeps number of conversions by lag bucket for each day and account;
+on every run only days that were not fetched before are requested from Ads
+API and days outside of lookback window are removed. Conversions of a day keep
+arriving until the largest lag bucket (90 days) is over so days inside this
+attribution window are fetched again on every run and frozen only afterwards.
+"""
+
+import datetime
+import json
+import logging
+import os
+from collections import defaultdict
+from collections.abc import Sequence
+
+import gaarf
+import pandas as pd
+from src import fetchers, queries
+
+LAG_DATA_FILE = 'lag_data.parquet'
+FETCHED_DATES_FILE = 'fetched_dates.json'
+ATTRIBUTION_WINDOW_DAYS = 90
+_GROUPBY = [
+  'date',
+  'account_id',
+  'campaign_id',
+  'network',
+  'conversion_id',
+  'conversion_lag_bucket',
+]
+
+
+class ConversionLagStore:
+  """Keeps daily conversion lag data in a local directory.
+
+  Attributes:
+    store_dir: Directory to store lag data in.
+  """
+
+  def __init__(self, store_dir: str) -> None:
+    """Initializes ConversionLagStore.
+
+    Args:
+      store_dir: Directory to store lag data in.
+    """
+    self.store_dir = store_dir
+    os.makedirs(store_dir, exist_ok=True)
+
+  def update(
+    self,
+    report_fetcher: gaarf.report_fetcher.AdsReportFetcher,
+    customer_ids: Sequence[str],
+    start_date: str,
+    end_date: str,
+    max_workers: int = 1,
+    attribution_window_days: int = ATTRIBUTION_WINDOW_DAYS,
+  ) -> pd.DataFrame:
+    """Fetches missing days and returns lag data for the whole period.
+
+    Args:
+      report_fetcher: Instantiated AdsReportFetcher to get data from Ads API.
+      customer_ids: Accounts to get lag data for.
+      start_date: First day of the period in YYYY-MM-DD format.
+      end_date: Last day of the period in YYYY-MM-DD format.
+      max_workers: Maximum number of concurrent requests to Ads API.
+      attribution_window_days: Number of days conversions of a day can be
+        reported for; more recent days are always fetched again.
+
+    Returns:
+      DataFrame with number of conversions for each lag bucket.
+    """
+    lag_data, fetched_dates = self._load()
+    customer_ids = [str(customer_id) for customer_id in customer_ids]
+    first_open_date = (
+      datetime.date.today() - datetime.timedelta(days=attribution_window_days)
+    ).strftime('%Y-%m-%d')
+    lag_data = lag_data.loc[
+      lag_data['date'].between(start_date, end_date)
+      & (lag_data['date'] < first_open_date)
+      & lag_data['account_id'].astype(str).isin(customer_ids)
+    ]
+    dates = [
+      date.strftime('%Y-%m-%d')
+      for date in pd.date_range(start_date, end_date)
+    ]
+    frozen_dates = {date for date in dates if date < first_open_date}
+    fetched_dates = {
+      customer_id: fetched_dates.get(customer_id, set()) & frozen_dates
+      for customer_id in customer_ids
+    }
+    new_lag_data = []
+    for date_range, accounts in _get_missing_date_ranges(
+      fetched_dates, dates
+    ).items():
+      logging.info(
+        'fetching conversion lag data from %s to %s for %d account(s)',
+        *date_range,
+        len(accounts),
+      )
+      new_lag_data.append(
+        fetchers.fetch_and_aggregate(
+          report_fetcher,
+          queries.DailyConversionLagQuery(*date_range),
+          accounts,
+          _GROUPBY,
+          ['all_conversions'],
+          max_workers,
+        )
+      )
+      fetched_range = set(pd.date_range(*date_range).strftime('%Y-%m-%d'))
+      for account in accounts:
+        fetched_dates[account].update(fetched_range)
+    new_lag_data = [data for data in new_lag_data if not data.empty]
+    if new_lag_data:
+      if not lag_data.empty:
+        new_lag_data.insert(0, lag_data)
+      lag_data = pd.concat(new_lag_data, ignore_index=True)
+    self._save(lag_data, fetched_dates)
+    return lag_data.drop(columns='date').reset_index(drop=True)
+
+  def _load(self) -> tuple[pd.DataFrame, dict[str, set[str]]]:
+    """Reads lag data and days they were fetched for from store."""
+    lag_data_path = os.path.join(self.store_dir, LAG_DATA_FILE)
+    fetched_dates_path = os.path.join(self.store_dir, FETCHED_DATES_FILE)
+    if not (
+      os.path.exists(lag_data_path) and os.path.exists(fetched_dates_path)
+    ):
+      return pd.DataFrame(columns=_GROUPBY + ['all_conversions']), {}
+    with open(fetched_dates_path, 'r', encoding='utf-8') as f:
+      fetched_dates = {
+        customer_id: set(dates) for customer_id, dates in json.load(f).items()
+      }
+    return pd.read_parquet(lag_data_path), fetched_dates
+
+  def _save(
+    self, lag_data: pd.DataFrame, fetched_dates: dict[str, set[str]]
+  ) -> None:
+    """Writes lag data and days they were fetched for to store."""
+    lag_data.to_parquet(
+      os.path.join(self.store_dir, LAG_DATA_FILE), index=False
+    )
+    with open(
+      os.path.join(self.store_dir, FETCHED_DATES_FILE), 'w', encoding='utf-8'
+    ) as f:
+      json.dump(
+        {
+          customer_id: sorted(dates)
+          for customer_id, dates in fetched_dates.items()
+        },
+        f,
+      )
+
+
+def _get_missing_date_ranges(
+  fetched_dates: dict[str, set[str]], dates: Sequence[str]
+) -> dict[tuple[str, str], list[str]]:
+  """Groups accounts by consecutive days that were not fetched for them.
+
+  Args:
+    fetched_dates: Mapping between account and days fetched for it.
+    dates: All days in YYYY-MM-DD format that should be fetched.
+
+  Returns:
+    Mapping between first and last day of a range and accounts to fetch it.
+  """
+  missing_date_ranges = defaultdict(list)
+  for customer_id, account_fetched_dates in fetched_dates.items():
+    range_start = previous_date = None
+    for date in dates:
+      if date in account_fetched_dates:
+        continue
+      if previous_date and _next_day(previous_date) == date:
+        previous_date = date
+        continue
+      if range_start:
+        missing_date_ranges[(range_start, previous_date)].append(customer_id)
+      range_start = previous_date = date
+    if range_start:
+      missing_date_ranges[(range_start, previous_date)].append(customer_id)
+  return dict(missing_date_ranges)
+
+
+def _next_day(date: str) -> str:
+  """Returns day after a given one in YYYY-MM-DD format."""
+  return (
+    datetime.datetime.strptime(date, '%Y-%m-%d') + datetime.timedelta(days=1)
+  ).strftime('%Y-%m-%d')
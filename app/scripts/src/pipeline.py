@@ -0,0 +1,291 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module for running steps of a pipeline as a dependency graph.
+
+Each step starts as soon as all its dependencies are completed so that
+independent branches of the graph run concurrently; once any step fails no
+new steps are started.
+"""
+
+from __future__ import annotations
+
+import logging
+import subprocess
+import time
+from collections.abc import Callable, Sequence
+from concurrent import futures
+from typing import Any
+
+
+class PipelineError(Exception):
+  """Raised when pipeline is misconfigured or its steps failed."""
+
+
+class Step:
+  """Single unit of work of a pipeline.
+
+  Attributes:
+    name: Unique name of the step.
+    action: Function without arguments performing the step.
+    dependencies: Names of steps that should be completed before the step.
+    inputs: Names of objects (i.e. tables) read by the step.
+    outputs: Names of objects (i.e. tables) created by the step.
+    status: One of 'pending', 'running', 'completed', 'failed', 'skipped'.
+    started_at: Monotonic time when the step started.
+    finished_at: Monotonic time when the step finished.
+  """
+
+  def __init__(
+    self,
+    name: str,
+    action: Callable[[], Any],
+    dependencies: Sequence[str] = (),
+    inputs: Sequence[str] = (),
+    outputs: Sequence[str] = (),
+  ) -> None:
+    """Initializes Step.
+
+    Args:
+      name: Unique name of the step.
+      action: Function without arguments performing the step.
+      dependencies: Names of steps that should be completed before the step.
+      inputs: Names of objects (i.e. tables) read by the step.
+      outputs: Names of objects (i.e. tables) created by the step.
+    """
+    self.name = name
+    self.action = action
+    self.dependencies = list(dict.fromkeys(dependencies))
+    self.inputs = set(inputs)
+    self.outputs = set(outputs)
+    self.status = 'pending'
+    self.started_at: float | None = None
+    self.finished_at: float | None = None
+
+  @property
+  def duration(self) -> float:
+    """Number of seconds the step was running."""
+    if self.started_at is None or self.finished_at is None:
+      return 0.0
+    return self.finished_at - self.started_at
+
+  def __repr__(self) -> str:
+    return f'Step(name={self.name!r}, dependencies={self.dependencies!r})'
+
+
+class Pipeline:
+  """Runs steps respecting dependencies between them.
+
+  Attributes:
+    steps: Mapping between name of a step and the step in topological order.
+  """
+
+  def __init__(self, steps: Sequence[Step]) -> None:
+    """Initializes Pipeline.
+
+    Args:
+      steps: Steps of the pipeline.
+
+    Raises:
+      PipelineError: If steps have duplicated names, unknown dependencies or
+        dependency cycles.
+    """
+    steps_by_name = {}
+    for step in steps:
+      if step.name in steps_by_name:
+        raise PipelineError(f'Duplicated step {step.name}')
+      steps_by_name[step.name] = step
+    for step in steps:
+      if unknown := set(step.dependencies) - set(steps_by_name):
+        raise PipelineError(
+          f'Step {step.name} depends on unknown steps: '
+          f'{", ".join(sorted(unknown))}'
+        )
+    self.steps = {
+      name: steps_by_name[name]
+      for level in _get_levels(steps)
+      for name in level
+    }
+
+  @property
+  def levels(self) -> list[list[str]]:
+    """Steps grouped by the earliest stage they can run at."""
+    return _get_levels(self.steps.values())
+
+  def run(self, max_workers: int = 1) -> None:
+    """Runs all steps of the pipeline.
+
+    Args:
+      max_workers: Maximum number of steps running at the same time.
+
+    Raises:
+      PipelineError: If any of the steps failed.
+    """
+    remaining_dependencies = {
+      name: set(step.dependencies) for name, step in self.steps.items()
+    }
+    dependants = {name: [] for name in self.steps}
+    for name, step in self.steps.items():
+      for dependency in step.dependencies:
+        dependants[dependency].append(name)
+    ready = [name for name, deps in remaining_dependencies.items() if not deps]
+    failed_steps = []
+    with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+      running = {}
+      while ready or running:
+        while ready and not failed_steps:
+          step = self.steps[ready.pop(0)]
+          logging.info('Starting %s', step.name)
+          step.status = 'running'
+          step.started_at = time.monotonic()
+          running[executor.submit(step.action)] = step
+        if not running:
+          break
+        done, _ = futures.wait(running, return_when=futures.FIRST_COMPLETED)
+        for future in done:
+          step = running.pop(future)
+          step.finished_at = time.monotonic()
+          try:
+            future.result()
+          except Exception as e:  # pylint: disable=broad-exception-caught
+            logging.error('%s failed: %s', step.name, e)
+            step.status = 'failed'
+            failed_steps.append(step.name)
+            continue
+          step.status = 'completed'
+          logging.info('Completed %s in %.1f seconds', step.name, step.duration)
+          for dependant in dependants[step.name]:
+            remaining_dependencies[dependant].discard(step.name)
+            if not remaining_dependencies[dependant]:
+              ready.append(dependant)
+    for step in self.steps.values():
+      if step.status == 'pending':
+        step.status = 'skipped'
+    if failed_steps:
+      raise PipelineError(f'Failed steps: {", ".join(failed_steps)}')
+
+  def get_critical_path(self) -> list[Step]:
+    """Returns the longest chain of dependent steps by their duration."""
+    longest_paths: dict[str, tuple[float, list[str]]] = {}
+    for name, step in self.steps.items():
+      duration, path = max(
+        (longest_paths[dependency] for dependency in step.dependencies),
+        key=lambda value: value[0],
+        default=(0.0, []),
+      )
+      longest_paths[name] = (duration + step.duration, [*path, name])
+    _, path = max(
+      longest_paths.values(), key=lambda value: value[0], default=(0.0, [])
+    )
+    return [self.steps[name] for name in path]
+
+  def get_report(self) -> dict[str, Any]:
+    """Summarizes timings of the last run of the pipeline.
+
+    Returns:
+      Status and duration of each step, total wall time and duration of
+      the critical path.
+    """
+    started = [
+      step.started_at
+      for step in self.steps.values()
+      if step.started_at is not None
+    ]
+    finished = [
+      step.finished_at
+      for step in self.steps.values()
+      if step.finished_at is not None
+    ]
+    critical_path = self.get_critical_path()
+    return {
+      'wall_time_seconds': max(finished) - min(started) if finished else 0.0,
+      'critical_path_seconds': sum(step.duration for step in critical_path),
+      'critical_path': [step.name for step in critical_path],
+      'steps': [
+        {
+          'name': step.name,
+          'status': step.status,
+          'dependencies': step.dependencies,
+          'seconds': step.duration,
+        }
+        for step in self.steps.values()
+      ],
+    }
+
+
+def run_command(
+  command: Sequence[str],
+  name: str | None = None,
+  merge_stderr: bool = True,
+) -> str:
+  """Runs command streaming its output to log.
+
+  Args:
+    command: Command with its arguments.
+    name: Name prefixed to each line of output.
+    merge_stderr: Whether standard error should be logged along with
+      standard output; otherwise it is passed through unchanged.
+
+  Returns:
+    Standard output of the command.
+
+  Raises:
+    PipelineError: If command exits with non-zero code.
+  """
+  name = name or command[0]
+  logging.debug('Running %s', ' '.join(command))
+  with subprocess.Popen(
+    command,
+    stdout=subprocess.PIPE,
+    stderr=subprocess.STDOUT if merge_stderr else None,
+    text=True,
+  ) as process:
+    output = []
+    for line in process.stdout:
+      output.append(line)
+      logging.info('[%s] %s', name, line.rstrip())
+  if process.returncode:
+    raise PipelineError(f'{name} exited with code {process.returncode}')
+  return ''.join(output)
+
+
+def _get_levels(steps: Sequence[Step]) -> list[list[str]]:
+  """Groups steps by the length of the longest chain of their dependencies.
+
+  Raises:
+    PipelineError: If steps have dependency cycles.
+  """
+  steps = {step.name: step for step in steps}
+  levels: dict[str, int] = {}
+  visiting = set()
+
+  def get_level(name: str) -> int:
+    if name in levels:
+      return levels[name]
+    if name in visiting:
+      raise PipelineError(f'Dependency cycle involving step {name}')
+    visiting.add(name)
+    levels[name] = 1 + max(
+      (get_level(dependency) for dependency in steps[name].dependencies),
+      default=-1,
+    )
+    visiting.discard(name)
+    return levels[name]
+
+  grouped_steps: list[list[str]] = []
+  for name in steps:
+    level = get_level(name)
+    grouped_steps.extend([] for _ in range(level + 1 - len(grouped_steps)))
+    grouped_steps[level].append(name)
+  return grouped_steps
@@ -16,6 +16,8 @@
 
 from gaarf import base_query
 
+CHANGE_EVENT_LIMIT = 10000
+
 
 class DateRangeQuery(base_query.BaseQuery):
   """Defines common class of queries with customizable date range."""
@@ -31,6 +33,7 @@ class ConversionLagQuery(DateRangeQuery):
 
   query_text = """
       SELECT
+        customer.id AS account_id,
         campaign.id AS campaign_id,
         segments.ad_network_type AS network,
         segments.conversion_action~0 AS conversion_id,
@@ -44,8 +47,31 @@ class ConversionLagQuery(DateRangeQuery):
       """
 
 
+class DailyConversionLagQuery(DateRangeQuery):
+  """Fetches all_conversions by date, network and conversion_id."""
+
+  query_text = """
+      SELECT
+        segments.date AS date,
+        customer.id AS account_id,
+        campaign.id AS campaign_id,
+        segments.ad_network_type AS network,
+        segments.conversion_action~0 AS conversion_id,
+        segments.conversion_lag_bucket AS conversion_lag_bucket,
+        metrics.all_conversions AS all_conversions
+      FROM campaign
+      WHERE
+        segments.date >= '{start_date}'
+        AND segments.date <= '{end_date}'
+      """
+
+
 class ChangeHistory(DateRangeQuery):
-  """Fetches change history for bids and budgets for app campaigns."""
+  """Fetches change history for bids and budgets for app campaigns.
+
+  Ads API returns at most `limit` change events per account in a single
+  request; start_date and end_date can be either dates or datetimes.
+  """
 
   query_text = """
       SELECT
@@ -69,9 +95,16 @@ class ChangeHistory(DateRangeQuery):
         AND change_event.change_date_time >= '{start_date}'
         AND change_event.change_date_time <= '{end_date}'
         AND change_event.change_resource_type IN (CAMPAIGN_BUDGET, CAMPAIGN)
-      LIMIT 10000
+      LIMIT {limit}
       """
 
+  def __init__(
+    self, start_date: str, end_date: str, limit: int = CHANGE_EVENT_LIMIT
+  ) -> None:
+    """Replaces date range and limit in query with supplied values."""
+    super().__init__(start_date, end_date)
+    self.limit = limit
+
 
 class BidsBudgetsActiveCampaigns(base_query.BaseQuery):
   """Fetches bids and budget values for active app campaigns."""
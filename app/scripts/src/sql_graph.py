@@ -0,0 +1,217 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module for finding dependencies between BigQuery queries.
+
+Queries are parsed for objects (tables, views and functions) in datasets
+defined by macros (i.e. `{bq_dataset}.asset_performance`) they write and
+read. A query depends on:
+  * the last preceding query writing an object it reads;
+  * the last preceding query writing the same object;
+  * preceding queries reading the previous version of an object it writes.
+Running queries along these dependencies gives the same result as running
+them one after another in the given order while independent queries can
+run concurrently.
+"""
+
+from __future__ import annotations
+
+import glob
+import os
+import re
+from collections.abc import Mapping, Sequence
+
+# Modules in order they run one after another in run-local.sh; directions of
+# dependencies between queries of different modules are derived from it.
+MODULES = ('core', 'assets', 'disapprovals', 'geo', 'ios_skan')
+# Stages of a module in order of their execution.
+_STAGES = ('snapshots', 'views', '', 'legacy_views')
+
+_OBJECT = r'`?(\{\w*dataset\w*\}\.[A-Za-z_][\w{}]*\*?)`?'
+_CREATED_OBJECT_PATTERN = re.compile(
+  r'\bCREATE\s+(?:OR\s+REPLACE\s+)?(?:MATERIALIZED\s+)?'
+  r'(?:TABLE|VIEW|FUNCTION)(?:\s+IF\s+NOT\s+EXISTS)?\s+' + _OBJECT,
+  re.IGNORECASE,
+)
+_MODIFIED_OBJECT_PATTERN = re.compile(
+  r'\b(?:INSERT(?:\s+INTO)?|MERGE(?:\s+INTO)?|DELETE(?:\s+FROM)?|UPDATE)\s+'
+  + _OBJECT,
+  re.IGNORECASE,
+)
+_REFERENCED_OBJECT_PATTERN = re.compile(_OBJECT)
+_MACRO_PATTERN = re.compile(r'\{(\w+)\}')
+
+
+class SqlQuery:
+  """Objects written and read by a file with BigQuery queries.
+
+  Attributes:
+    path: Path to the file.
+    targets: Names of objects created or modified by the query.
+    sources: Names of objects read by the query; names ending with `*` are
+      wildcards matching all objects starting with the same prefix.
+  """
+
+  def __init__(
+    self, path: str, targets: set[str], sources: set[str]
+  ) -> None:
+    """Initializes SqlQuery.
+
+    Args:
+      path: Path to the file.
+      targets: Names of objects created or modified by the query.
+      sources: Names of objects read by the query.
+    """
+    self.path = path
+    self.targets = targets
+    self.sources = sources
+
+  def reads(self, name: str) -> bool:
+    """Checks whether the query reads an object."""
+    return any(_matches(source, name) for source in self.sources)
+
+  def __repr__(self) -> str:
+    return (
+      f'SqlQuery(path={self.path!r}, targets={sorted(self.targets)!r}, '
+      f'sources={sorted(self.sources)!r})'
+    )
+
+
+def parse_query(
+  path: str,
+  text: str | None = None,
+  macros: Mapping[str, str] | None = None,
+) -> SqlQuery:
+  """Finds objects written and read by a query.
+
+  Args:
+    path: Path to the file with the query.
+    text: Text of the query, read from path if not provided.
+    macros: Values of macros to substitute in object names, i.e. when
+      several dataset macros point to the same dataset.
+
+  Returns:
+    Parsed query.
+  """
+  if text is None:
+    with open(path, encoding='utf-8') as f:
+      text = f.read()
+  created = set(_CREATED_OBJECT_PATTERN.findall(text))
+  modified = set(_MODIFIED_OBJECT_PATTERN.findall(text))
+  referenced = set(
+    _REFERENCED_OBJECT_PATTERN.findall(_CREATED_OBJECT_PATTERN.sub('', text))
+  )
+  return SqlQuery(
+    path,
+    targets={_resolve(name, macros) for name in created | modified},
+    sources={_resolve(name, macros) for name in referenced},
+  )
+
+
+def get_dependencies(queries: Sequence[SqlQuery]) -> dict[str, list[str]]:
+  """Finds queries each query should wait for.
+
+  Args:
+    queries: Parsed queries in order they would run one after another.
+
+  Returns:
+    Mapping between path of a query and paths of queries it depends on.
+  """
+  last_writers: dict[str, int] = {}
+  dependencies = {}
+  for position, query in enumerate(queries):
+    query_dependencies = set()
+    for name, writer in last_writers.items():
+      if query.reads(name) or name in query.targets:
+        query_dependencies.add(writer)
+    for target in query.targets:
+      previous_write = last_writers.get(target, -1)
+      query_dependencies.update(
+        reader
+        for reader in range(previous_write + 1, position)
+        if queries[reader].reads(target)
+      )
+    query_dependencies.discard(position)
+    dependencies[query.path] = [
+      queries[dependency].path for dependency in sorted(query_dependencies)
+    ]
+    for target in query.targets:
+      last_writers[target] = position
+  return dependencies
+
+
+def list_queries(path: str) -> list[str]:
+  """Returns SQL file or all SQL files in a directory in sorted order."""
+  if os.path.isfile(path):
+    return [path]
+  return sorted(glob.glob(os.path.join(path, '*.sql')))
+
+
+def get_module_queries(
+  app_dir: str,
+  modules: Sequence[str],
+  legacy: bool = False,
+  incremental: bool = False,
+) -> list[str]:
+  """Lists BigQuery queries of modules in order they are run by run-local.sh.
+
+  Args:
+    app_dir: Directory with modules.
+    modules: Modules to get queries for.
+    legacy: Whether to include legacy views.
+    incremental: Whether to include saving of incremental snapshots.
+
+  Returns:
+    Paths to queries of all stages of all modules.
+  """
+  paths = []
+  for module in sort_modules(modules):
+    queries_dir = os.path.join(app_dir, module, 'bq_queries')
+    for stage in _STAGES:
+      if stage == 'legacy_views' and not legacy:
+        continue
+      if os.path.isdir(stage_dir := os.path.join(queries_dir, stage)):
+        paths.extend(list_queries(stage_dir))
+    incremental_query = os.path.join(
+      queries_dir, 'incremental', 'incremental_saving.sql'
+    )
+    if incremental and os.path.isfile(incremental_query):
+      paths.append(incremental_query)
+  return paths
+
+
+def sort_modules(modules: Sequence[str]) -> list[str]:
+  """Orders modules as they run one after another; unknown modules go last."""
+  return sorted(
+    modules,
+    key=lambda module: (
+      MODULES.index(module) if module in MODULES else len(MODULES)
+    ),
+  )
+
+
+def _matches(source: str, name: str) -> bool:
+  """Checks whether source (possibly a wildcard) refers to an object."""
+  if source.endswith('*'):
+    return name.startswith(source[:-1])
+  return source == name
+
+
+def _resolve(name: str, macros: Mapping[str, str] | None) -> str:
+  """Substitutes known macros in the name of an object."""
+  if not macros:
+    return name
+  return _MACRO_PATTERN.sub(
+    lambda match: str(macros.get(match.group(1), match.group(0))), name
+  )
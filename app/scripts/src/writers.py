@@ -0,0 +1,377 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module for writing DataFrames to BigQuery without converting them to rows.
+
+DataFrames are serialized to parquet and loaded to BigQuery in a single load
+job; if DataFrame cannot be serialized data are written with gaarf
+BigQueryWriter instead.
+"""
+
+import contextlib
+import datetime
+import functools
+import io
+import logging
+import os
+import threading
+
+import gaarf
+import pandas as pd
+import pyarrow as pa
+from gaarf.io.writers import bigquery_writer
+from google.api_core import exceptions as google_api_exceptions
+from google.cloud import bigquery
+from google.cloud import exceptions as google_cloud_exceptions
+from pyarrow import parquet
+
+
+class BigQueryLoader:
+  """Loads parquet data to BigQuery tables.
+
+  Client is shared by all loads so a loader can be used by several threads;
+  datasets are created (if missing) before the first load to them.
+
+  Attributes:
+    project: Id of Google Cloud Project.
+    location: Location of BigQuery dataset.
+  """
+
+  def __init__(self, project: str, location: str = 'US') -> None:
+    """Initializes BigQueryLoader.
+
+    Args:
+      project: Id of Google Cloud Project.
+      location: Location of BigQuery dataset.
+    """
+    self.project = project
+    self.location = location
+    self._datasets: set[str] = set()
+    self._lock = threading.Lock()
+
+  @functools.cached_property
+  def client(self) -> bigquery.Client:
+    """Instantiated BigQuery client."""
+    return bigquery.Client(self.project)
+
+  def create_or_get_dataset(self, dataset: str) -> None:
+    """Creates dataset in BigQuery unless it already exists.
+
+    Args:
+      dataset: Name of the dataset.
+    """
+    with self._lock:
+      if dataset in self._datasets:
+        return
+      dataset_id = f'{self.project}.{dataset}'
+      try:
+        self.client.get_dataset(dataset_id)
+      except google_cloud_exceptions.NotFound:
+        bq_dataset = bigquery.Dataset(dataset_id)
+        bq_dataset.location = self.location
+        self.client.create_dataset(bq_dataset, exists_ok=True, timeout=30)
+        logging.debug('Created new dataset %s', dataset_id)
+      self._datasets.add(dataset)
+
+  def load(
+    self,
+    data: io.BytesIO,
+    table_id: str,
+    schema: list[bigquery.SchemaField],
+    write_disposition: str,
+  ) -> None:
+    """Loads parquet data to BigQuery table.
+
+    Args:
+      data: Data in parquet format.
+      table_id: Table in `dataset.table` format.
+      schema: Schema of the table.
+      write_disposition: Option for overwriting data.
+
+    Raises:
+      ValueError: If data cannot be loaded to the table.
+    """
+    self.create_or_get_dataset(table_id.split('.')[0])
+    job = self.client.load_table_from_file(
+      data,
+      f'{self.project}.{table_id}',
+      job_config=bigquery.LoadJobConfig(
+        source_format=bigquery.SourceFormat.PARQUET,
+        schema=schema,
+        write_disposition=write_disposition,
+      ),
+      location=self.location,
+    )
+    try:
+      job.result()
+    except google_api_exceptions.BadRequest as e:
+      raise ValueError(f'Unable to save data to BigQuery! {str(e)}') from e
+
+  def copy(
+    self, source_table_id: str, table_id: str, write_disposition: str
+  ) -> None:
+    """Copies BigQuery table in a single copy job.
+
+    Args:
+      source_table_id: Table to copy in `dataset.table` format.
+      table_id: Destination table in `dataset.table` format.
+      write_disposition: Option for overwriting data.
+    """
+    self.client.copy_table(
+      f'{self.project}.{source_table_id}',
+      f'{self.project}.{table_id}',
+      job_config=bigquery.CopyJobConfig(write_disposition=write_disposition),
+      location=self.location,
+    ).result()
+
+  def delete(self, table_id: str) -> None:
+    """Deletes BigQuery table if it exists.
+
+    Args:
+      table_id: Table in `dataset.table` format.
+    """
+    self.client.delete_table(f'{self.project}.{table_id}', not_found_ok=True)
+
+
+class LocalLoader:
+  """Saves parquet data to local directory instead of BigQuery.
+
+  Used to check data and schema of tables without access to BigQuery.
+
+  Attributes:
+    directory: Directory to save tables to.
+    schemas: Mapping between table and its schema.
+  """
+
+  def __init__(self, directory: str) -> None:
+    """Initializes LocalLoader.
+
+    Args:
+      directory: Directory to save tables to.
+    """
+    self.directory = directory
+    self.schemas: dict[str, list[bigquery.SchemaField]] = {}
+    os.makedirs(directory, exist_ok=True)
+
+  def load(
+    self,
+    data: io.BytesIO,
+    table_id: str,
+    schema: list[bigquery.SchemaField],
+    write_disposition: str,
+  ) -> None:
+    """Saves parquet data to `table_id.parquet` file.
+
+    Args:
+      data: Data in parquet format.
+      table_id: Table in `dataset.table` format.
+      schema: Schema of the table.
+      write_disposition: Option for overwriting data.
+
+    Raises:
+      Conflict: If table exists and write_disposition is WRITE_EMPTY.
+    """
+    path = os.path.join(self.directory, f'{table_id}.parquet')
+    table = parquet.read_table(data)
+    if os.path.exists(path):
+      if write_disposition == bigquery.WriteDisposition.WRITE_EMPTY:
+        raise google_api_exceptions.Conflict(f'{table_id} already exists')
+      if write_disposition == bigquery.WriteDisposition.WRITE_APPEND:
+        table = pa.concat_tables([parquet.read_table(path), table])
+    parquet.write_table(table, path)
+    self.schemas[table_id] = schema
+
+  def copy(
+    self, source_table_id: str, table_id: str, write_disposition: str
+  ) -> None:
+    """Copies `source_table_id.parquet` file to `table_id.parquet`.
+
+    Args:
+      source_table_id: Table to copy in `dataset.table` format.
+      table_id: Destination table in `dataset.table` format.
+      write_disposition: Option for overwriting data.
+    """
+    with open(
+      os.path.join(self.directory, f'{source_table_id}.parquet'), 'rb'
+    ) as f:
+      self.load(
+        io.BytesIO(f.read()),
+        table_id,
+        self.schemas.get(source_table_id, []),
+        write_disposition,
+      )
+
+  def delete(self, table_id: str) -> None:
+    """Removes `table_id.parquet` file if it exists.
+
+    Args:
+      table_id: Table in `dataset.table` format.
+    """
+    with contextlib.suppress(FileNotFoundError):
+      os.remove(os.path.join(self.directory, f'{table_id}.parquet'))
+    self.schemas.pop(table_id, None)
+
+
+class ColumnarBigQueryWriter:
+  """Writes DataFrames to BigQuery as parquet in a single load job.
+
+  Attributes:
+    dataset: BigQuery dataset to write data to.
+    write_disposition: Option for overwriting data.
+    loader: Loader performing writing of parquet data.
+    fallback_writer: Writer used for reports and non-serializable data.
+  """
+
+  def __init__(
+    self,
+    project: str,
+    dataset: str,
+    location: str = 'US',
+    write_disposition: str = bigquery.WriteDisposition.WRITE_TRUNCATE,
+    loader: BigQueryLoader | LocalLoader | None = None,
+  ) -> None:
+    """Initializes ColumnarBigQueryWriter.
+
+    Args:
+      project: Id of Google Cloud Project.
+      dataset: BigQuery dataset to write data to.
+      location: Location of a newly created dataset.
+      write_disposition: Option for overwriting data.
+      loader: Loader performing writing of parquet data.
+    """
+    self.dataset = dataset
+    self.write_disposition = write_disposition
+    self.loader = loader or BigQueryLoader(project, location)
+    self.fallback_writer = bigquery_writer.BigQueryWriter(
+      project=project,
+      dataset=dataset,
+      location=location,
+      write_disposition=write_disposition,
+    )
+
+  def write(
+    self, data: pd.DataFrame | gaarf.report.GaarfReport, destination: str
+  ) -> str:
+    """Writes data to a BigQuery table.
+
+    Args:
+      data: DataFrame or report to write.
+      destination: Name of the table data should be written to.
+
+    Returns:
+      Name of the table in `dataset.table` format.
+    """
+    if isinstance(data, gaarf.report.GaarfReport):
+      return self.fallback_writer.write(data, destination)
+    try:
+      parquet_data = to_parquet(data)
+    except (pa.ArrowException, ValueError) as e:
+      logging.warning(
+        'Unable to convert data for %s to parquet, falling back to '
+        'row-based writing: %s',
+        destination,
+        e,
+      )
+      return self.fallback_writer.write(
+        gaarf.report.GaarfReport.from_pandas(data), destination
+      )
+    table_id = f'{self.dataset}.{destination}'
+    logging.debug('Writing %d rows of data to %s', len(data), destination)
+    self.loader.load(
+      parquet_data, table_id, infer_schema(data), self.write_disposition
+    )
+    logging.debug('Writing to %s is completed', destination)
+    return f'[BigQuery] - at {table_id}'
+
+  def copy(self, source: str, destination: str) -> str:
+    """Copies a table of the dataset to another table of the dataset.
+
+    Args:
+      source: Name of the table to copy.
+      destination: Name of the table data should be copied to.
+
+    Returns:
+      Name of the table in `dataset.table` format.
+    """
+    table_id = f'{self.dataset}.{destination}'
+    self.loader.copy(
+      f'{self.dataset}.{source}', table_id, self.write_disposition
+    )
+    return f'[BigQuery] - at {table_id}'
+
+  def delete(self, destination: str) -> None:
+    """Deletes a table of the dataset if it exists.
+
+    Args:
+      destination: Name of the table to delete.
+    """
+    self.loader.delete(f'{self.dataset}.{destination}')
+
+
+def to_parquet(data: pd.DataFrame) -> io.BytesIO:
+  """Serializes DataFrame to parquet; NaN values are saved as NULL."""
+  buffer = io.BytesIO()
+  parquet.write_table(
+    pa.Table.from_pandas(data, preserve_index=False),
+    buffer,
+    coerce_timestamps='us',
+    allow_truncated_timestamps=True,
+  )
+  buffer.seek(0)
+  return buffer
+
+
+def infer_schema(data: pd.DataFrame) -> list[bigquery.SchemaField]:
+  """Maps each column of DataFrame to BigQuery field type.
+
+  Args:
+    data: DataFrame to infer schema from.
+
+  Returns:
+    Schema fields for a given DataFrame.
+  """
+  return [
+    bigquery.SchemaField(
+      name=column, field_type=_get_field_type(values), mode='NULLABLE'
+    )
+    for column, values in data.items()
+  ]
+
+
+def _get_field_type(values: pd.Series) -> str:
+  """Infers BigQuery field type of a column."""
+  if isinstance(values.dtype, pd.CategoricalDtype):
+    values = values.astype(values.cat.categories.dtype)
+  if pd.api.types.is_bool_dtype(values):
+    return 'BOOL'
+  if pd.api.types.is_integer_dtype(values):
+    return 'INT64'
+  if pd.api.types.is_float_dtype(values):
+    return 'FLOAT64'
+  if isinstance(values.dtype, pd.DatetimeTZDtype):
+    return 'TIMESTAMP'
+  if pd.api.types.is_datetime64_any_dtype(values):
+    return 'DATETIME'
+  value = values.dropna().iloc[0] if values.notna().any() else None
+  if isinstance(value, datetime.datetime):
+    return 'DATETIME'
+  if isinstance(value, datetime.date):
+    return 'DATE'
+  if isinstance(value, bool):
+    return 'BOOL'
+  if isinstance(value, int):
+    return 'INT64'
+  if isinstance(value, float):
+    return 'FLOAT64'
+  return 'STRING'
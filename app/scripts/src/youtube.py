@@ -0,0 +1,252 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module for fetching data from YouTube Data API concurrently.
+
+Ids are split into batches of the maximum size supported by API; batches are
+fetched in a pool of threads sharing a single rate limiter and transient
+errors are retried with exponential backoff. Ids of batches that failed are
+returned to the caller instead of failing the whole fetch.
+"""
+
+from __future__ import annotations
+
+import itertools
+import logging
+import os
+import threading
+import time
+from collections.abc import Sequence
+from concurrent import futures
+
+import garf_youtube_data_api
+import httplib2
+from garf_core import report as garf_report
+from garf_youtube_data_api import report_fetcher as youtube_report_fetcher
+from googleapiclient import discovery, errors
+
+MAX_BATCH_SIZE = youtube_report_fetcher.MAX_BATCH_SIZE
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_REQUESTS_PER_SECOND = 10.0
+DEFAULT_MAX_RETRIES = 3
+_TRANSIENT_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class QuotaExceededError(Exception):
+  """Raised when no more requests to YouTube Data API can be made."""
+
+
+class YouTubeDataApiClient(garf_youtube_data_api.YouTubeDataApiClient):
+  """YouTube Data API client safe to use from several threads.
+
+  Each thread gets its own service since underlying http client is not
+  thread-safe; requests can be sent to a custom API endpoint.
+
+  Attributes:
+    api_endpoint: Optional URL of YouTube Data API.
+  """
+
+  def __init__(
+    self,
+    api_key: str | None = None,
+    api_version: str = 'v3',
+    api_endpoint: str | None = None,
+    **kwargs: str,
+  ) -> None:
+    """Initializes YouTubeDataApiClient.
+
+    Args:
+      api_key: API key, taken from GOOGLE_API_KEY env variable if not set.
+      api_version: Version of YouTube Data API.
+      api_endpoint: Optional URL of YouTube Data API.
+      kwargs: Optional arguments passed to API.
+    """
+    super().__init__(
+      api_key=api_key or os.getenv('GOOGLE_API_KEY'),
+      api_version=api_version,
+      **kwargs,
+    )
+    self.api_endpoint = api_endpoint
+    self._local = threading.local()
+
+  @property
+  def service(self):
+    """Service of the current thread."""
+    if (service := getattr(self._local, 'service', None)) is None:
+      service = discovery.build(
+        'youtube',
+        self.api_version,
+        developerKey=self.api_key,
+        client_options=(
+          {'api_endpoint': self.api_endpoint} if self.api_endpoint else None
+        ),
+        static_discovery=True,
+      )
+      self._local.service = service
+    return service
+
+
+class RateLimiter:
+  """Spreads requests in time and limits their total number.
+
+  Attributes:
+    interval: Minimal number of seconds between two requests.
+    max_requests: Maximum number of requests that can be made.
+  """
+
+  def __init__(
+    self,
+    requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND,
+    max_requests: int | None = None,
+  ) -> None:
+    """Initializes RateLimiter.
+
+    Args:
+      requests_per_second: Maximum number of requests per second.
+      max_requests: Maximum number of requests that can be made.
+    """
+    self.interval = 1 / requests_per_second if requests_per_second else 0
+    self.max_requests = max_requests
+    self._requests = 0
+    self._next_request_at = 0.0
+    self._lock = threading.Lock()
+
+  def wait(self) -> None:
+    """Blocks until the next request can be made.
+
+    Raises:
+      QuotaExceededError: If the maximum number of requests is reached.
+    """
+    with self._lock:
+      if self.max_requests is not None and self._requests >= self.max_requests:
+        raise QuotaExceededError('YouTube Data API quota has been exhausted')
+      self._requests += 1
+      now = time.monotonic()
+      request_at = max(now, self._next_request_at)
+      self._next_request_at = request_at + self.interval
+    if request_at > now:
+      time.sleep(request_at - now)
+
+  def exhaust(self) -> None:
+    """Prevents any further requests."""
+    with self._lock:
+      self.max_requests = self._requests
+
+
+def fetch_by_ids(
+  report_fetcher: garf_youtube_data_api.YouTubeDataApiReportFetcher,
+  query: str,
+  ids: Sequence[str],
+  max_workers: int = DEFAULT_MAX_WORKERS,
+  rate_limiter: RateLimiter | None = None,
+  max_retries: int = DEFAULT_MAX_RETRIES,
+  backoff_seconds: float = 1.0,
+  **kwargs: str,
+) -> tuple[garf_report.GarfReport | None, list[str]]:
+  """Fetches query for ids in concurrent batches.
+
+  Args:
+    report_fetcher: Instantiated YouTubeDataApiReportFetcher.
+    query: Query to fetch.
+    ids: Ids of resources to fetch.
+    max_workers: Maximum number of concurrent requests.
+    rate_limiter: Limiter shared by all requests.
+    max_retries: Number of retries of a batch on transient errors.
+    backoff_seconds: Delay before the first retry, doubled on each retry.
+    kwargs: Optional arguments passed to API.
+
+  Returns:
+    Report with results of all successful batches (None if all batches
+    failed) and ids from failed batches.
+  """
+  rate_limiter = rate_limiter or RateLimiter()
+  iterator = iter(ids)
+  batches = []
+  while batch := list(itertools.islice(iterator, MAX_BATCH_SIZE)):
+    batches.append(batch)
+  reports, failed_ids = [], []
+  with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+    tasks = [
+      executor.submit(
+        _fetch_batch,
+        report_fetcher,
+        query,
+        batch,
+        rate_limiter,
+        max_retries,
+        backoff_seconds,
+        **kwargs,
+      )
+      for batch in batches
+    ]
+    for batch, task in zip(batches, tasks):
+      try:
+        reports.append(task.result())
+      except (
+        errors.HttpError,
+        httplib2.HttpLib2Error,
+        OSError,
+        QuotaExceededError,
+      ) as e:
+        logging.error('Failed to fetch %d id(s): %s', len(batch), e)
+        failed_ids.extend(batch)
+  if not reports:
+    return None, failed_ids
+  return (
+    garf_report.GarfReport(
+      results=[row for report in reports for row in report.results],
+      column_names=reports[0].column_names,
+    ),
+    failed_ids,
+  )
+
+
+def _fetch_batch(
+  report_fetcher: garf_youtube_data_api.YouTubeDataApiReportFetcher,
+  query: str,
+  batch: list[str],
+  rate_limiter: RateLimiter,
+  max_retries: int,
+  backoff_seconds: float,
+  **kwargs: str,
+) -> garf_report.GarfReport:
+  """Fetches a single batch retrying transient errors."""
+  for attempt in itertools.count():
+    rate_limiter.wait()
+    try:
+      return report_fetcher.fetch(query, id=batch, **kwargs)
+    except errors.HttpError as e:
+      if _is_quota_exceeded(e):
+        rate_limiter.exhaust()
+        raise
+      if e.resp.status not in _TRANSIENT_STATUSES or attempt >= max_retries:
+        raise
+      error = e
+    except (httplib2.HttpLib2Error, OSError) as e:
+      if attempt >= max_retries:
+        raise
+      error = e
+    delay = backoff_seconds * 2**attempt
+    logging.warning(
+      'Failed to fetch %d id(s), retrying in %.1f seconds: %s',
+      len(batch),
+      delay,
+      error,
+    )
+    time.sleep(delay)
+
+
+def _is_quota_exceeded(error: errors.HttpError) -> bool:
+  """Checks whether error is caused by exhausted daily quota."""
+  return error.resp.status == 403 and 'quotaExceeded' in str(error.content)
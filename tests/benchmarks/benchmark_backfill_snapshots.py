@@ -0,0 +1,244 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmarks backfill_snapshots operations on synthetic data.
+
+Generates change history, bids / budgets and snapshot dates of configurable
+size and measures execution time and peak memory of backfilling operations;
+results can be saved to JSON to compare them between releases.
+
+Run from the repository root:
+
+  PYTHONPATH=app:app/scripts python \\
+    tests/benchmarks/benchmark_backfill_snapshots.py --output=results.json
+"""
+
+import argparse
+import datetime
+import json
+import platform
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable, Sequence
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from scripts import backfill_snapshots
+from src import writers
+
+
+def generate_change_history(
+  campaign_ids: np.ndarray,
+  dates: list[str],
+  event_density: float,
+  seed: int = 42,
+) -> pd.DataFrame:
+  """Generates bid and budget change events for a set of campaigns.
+
+  Args:
+    campaign_ids: Campaigns to generate events for.
+    dates: Days when events can happen.
+    event_density: Average number of events per campaign per day.
+    seed: Seed for random number generator.
+
+  Returns:
+    DataFrame with the same schema as `queries.ChangeHistory` report.
+  """
+  rng = np.random.default_rng(seed)
+  n_events = int(len(campaign_ids) * len(dates) * event_density)
+  change_history = pd.DataFrame(
+    {
+      'change_date': (
+        pd.Series(rng.choice(dates, n_events))
+        + ' '
+        + pd.Series(rng.integers(0, 24, n_events)).astype(str).str.zfill(2)
+        + ':00:00.000000'
+      ),
+      'campaign_id': rng.choice(campaign_ids, n_events),
+    }
+  )
+  for event_type, scale in (
+    ('budget_amount', 1_000_000),
+    ('target_cpa', 100_000),
+    ('target_roas', 1),
+  ):
+    is_event = rng.random(n_events) < 0.5
+    for prefix in ('old', 'new'):
+      values = rng.integers(1, 100, n_events).astype(float) * scale
+      change_history[f'{prefix}_{event_type}'] = np.where(
+        is_event, values, np.nan
+      )
+  return change_history
+
+
+def generate_current_bids_budgets(
+  campaign_ids: np.ndarray, seed: int = 42
+) -> pd.DataFrame:
+  """Generates last observable bids and budgets for a set of campaigns."""
+  rng = np.random.default_rng(seed)
+  return pd.DataFrame(
+    {
+      'campaign_id': campaign_ids,
+      'budget_amount': rng.integers(1, 100, len(campaign_ids)) * 1_000_000,
+      'target_cpa': rng.integers(1, 100, len(campaign_ids)) * 100_000,
+      'target_roas': rng.random(len(campaign_ids)),
+    }
+  )
+
+
+def generate_snapshot_dates(
+  dates: Sequence[str], missing_ratio: float, seed: int = 42
+) -> set[str]:
+  """Generates days with existing snapshots; first and last days always exist.
+
+  Args:
+    dates: All days in YYYY-MM-DD format when snapshots should exist.
+    missing_ratio: Share of days without snapshots.
+    seed: Seed for random number generator.
+
+  Returns:
+    Days when snapshots are present.
+  """
+  rng = np.random.default_rng(seed)
+  is_present = rng.random(len(dates)) >= missing_ratio
+  is_present[0] = is_present[-1] = True
+  return {date for date, present in zip(dates, is_present) if present}
+
+
+def run_benchmark(
+  name: str, function: Callable[[], Any], repeats: int
+) -> dict[str, Any]:
+  """Measures execution time and peak memory of a function.
+
+  Args:
+    name: Name of the benchmark.
+    function: Function without arguments to benchmark.
+    repeats: Number of times function should be executed.
+
+  Returns:
+    Best execution time and worst peak memory among all runs.
+  """
+  timings, peak_memory = [], []
+  for _ in range(repeats):
+    tracemalloc.start()
+    start = time.perf_counter()
+    function()
+    timings.append(time.perf_counter() - start)
+    peak_memory.append(tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+  result = {
+    'name': name,
+    'seconds': min(timings),
+    'peak_memory_mib': max(peak_memory) / 2**20,
+  }
+  print(
+    f'{name}: {result["seconds"]:.3f}s, '
+    f'peak memory {result["peak_memory_mib"]:.1f} MiB'
+  )
+  return result
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--campaigns', dest='campaigns', type=int, default=10000)
+  parser.add_argument('--days', dest='days', type=int, default=28)
+  parser.add_argument(
+    '--event-density', dest='event_density', type=float, default=0.1
+  )
+  parser.add_argument(
+    '--missing-ratio', dest='missing_ratio', type=float, default=0.3
+  )
+  parser.add_argument('--repeats', dest='repeats', type=int, default=3)
+  parser.add_argument('--output', dest='output', default=None)
+  args = parser.parse_args()
+
+  campaign_ids = np.arange(1, args.campaigns + 1) * 1000
+  dates = [
+    date.strftime('%Y-%m-%d')
+    for date in pd.date_range(end='2024-01-28', periods=args.days)
+  ]
+  date_range = (dates[0], dates[-1])
+  change_history = generate_change_history(
+    campaign_ids, dates, args.event_density
+  )
+  current_bids_budgets = generate_current_bids_budgets(campaign_ids)
+  placeholders = backfill_snapshots._prepare_placeholders(
+    campaign_ids.tolist(), dates
+  )
+  snapshot_dates = generate_snapshot_dates(dates, args.missing_ratio)
+  cohort_snapshot_dates = {
+    datetime.datetime.strptime(date, '%Y-%m-%d').date()
+    for date in snapshot_dates
+  }
+  missing_dates = backfill_snapshots._get_bid_budget_snapshot_missing_dates(
+    snapshot_dates, date_range
+  )
+  restored_bid_budget_history = backfill_snapshots._restore_bid_budget_history(
+    change_history, current_bids_budgets, placeholders
+  )
+
+  bq_writer = writers.ColumnarBigQueryWriter(
+    'benchmark_project',
+    'benchmark_dataset',
+    loader=writers.LocalLoader(tempfile.mkdtemp()),
+  )
+  benchmarks = {
+    '_restore_bid_budget_history': (
+      lambda: backfill_snapshots._restore_bid_budget_history(
+        change_history, current_bids_budgets, placeholders
+      )
+    ),
+    'restore_missing_cohorts': (
+      lambda: list(
+        backfill_snapshots.restore_missing_cohorts(
+          cohort_snapshot_dates, 'benchmark_dataset'
+        )
+      )
+    ),
+    '_get_bid_budget_snapshot_missing_dates': (
+      lambda: backfill_snapshots._get_bid_budget_snapshot_missing_dates(
+        snapshot_dates, date_range
+      )
+    ),
+    'save_restored_change_history': (
+      lambda: backfill_snapshots.save_restored_change_history(
+        bq_writer, restored_bid_budget_history, missing_dates
+      )
+    ),
+  }
+  print(
+    f'{args.campaigns} campaigns, {args.days} days, '
+    f'{len(change_history)} events, {len(missing_dates)} missing snapshots'
+  )
+  results = {
+    'parameters': vars(args),
+    'environment': {
+      'python': platform.python_version(),
+      'numpy': np.__version__,
+      'pandas': pd.__version__,
+    },
+    'created_at': datetime.datetime.now().isoformat(),
+    'benchmarks': [
+      run_benchmark(name, function, args.repeats)
+      for name, function in benchmarks.items()
+    ],
+  }
+  if args.output:
+    with open(args.output, 'w', encoding='utf-8') as f:
+      json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,129 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmarks conversion lag adjustment table calculation on synthetic data.
+
+Optionally compares the vectorized calculation with calculating each group
+separately as it was done before.
+
+Run from the repository root:
+
+  PYTHONPATH=app/scripts python \\
+    tests/benchmarks/benchmark_conv_lag_builder.py --compare-per-group
+"""
+
+import argparse
+import json
+import time
+
+import gaarf
+import numpy as np
+import pandas as pd
+from src import conv_lag_builder
+
+_NETWORKS = ('SEARCH', 'YOUTUBE', 'CONTENT', 'MIXED')
+
+
+class PerGroupConversionLagBuilder(conv_lag_builder.ConversionLagBuilder):
+  """Calculates conversion lag adjustment table one group at a time."""
+
+  def calculate_reference_values(self) -> gaarf.report.GaarfReport:
+    joined_data = self.join_lag_data_and_enums(self.lag_data)
+    conversion_lag_table = []
+    for _, df_group in joined_data.groupby(self.group_by):
+      grouped_data = self.calculate_conversions_by_name_network_lag(df_group)
+      if grouped_data.empty:
+        continue
+      cumulative_data = self.calculate_cumulative_sum_ordered_by_n(grouped_data)
+      expanded_data = self.expand_and_join_lags(cumulative_data)
+      conversion_lag_table.append(self.calculate_incremental_lag(expanded_data))
+    return gaarf.report.GaarfReport.from_pandas(
+      pd.concat(conversion_lag_table, ignore_index=True)
+    )
+
+
+def generate_lag_data(
+  conversion_actions: int, rows_per_action: int, seed: int = 42
+) -> pd.DataFrame:
+  """Generates data with the same schema as `queries.ConversionLagQuery`.
+
+  Args:
+    conversion_actions: Number of unique conversion_ids.
+    rows_per_action: Average number of rows for each conversion_id.
+    seed: Seed for random number generator.
+
+  Returns:
+    DataFrame with number of conversions by lag bucket.
+  """
+  rng = np.random.default_rng(seed)
+  buckets = conv_lag_builder._LAG_ENUMS['conversion_lag_bucket']
+  n_rows = conversion_actions * rows_per_action
+  return pd.DataFrame(
+    {
+      'campaign_id': rng.integers(1, 1000, n_rows),
+      'network': rng.choice(_NETWORKS, n_rows),
+      'conversion_id': rng.integers(1, conversion_actions + 1, n_rows).astype(
+        str
+      ),
+      'conversion_lag_bucket': rng.choice(buckets, n_rows),
+      'all_conversions': rng.integers(0, 10, n_rows).astype(float),
+    }
+  )
+
+
+def run_benchmark(
+  builder_class: type[conv_lag_builder.ConversionLagBuilder],
+  lag_data: pd.DataFrame,
+) -> dict[str, float | str]:
+  """Measures time of calculating conversion lag adjustment table."""
+  start = time.perf_counter()
+  builder_class(
+    lag_data.copy(), ['network', 'conversion_id']
+  ).calculate_reference_values()
+  result = {
+    'name': builder_class.__name__,
+    'seconds': time.perf_counter() - start,
+  }
+  print(f'{result["name"]}: {result["seconds"]:.3f}s')
+  return result
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument(
+    '--conversion-actions', dest='conversion_actions', type=int, default=2000
+  )
+  parser.add_argument(
+    '--rows-per-action', dest='rows_per_action', type=int, default=30
+  )
+  parser.add_argument(
+    '--compare-per-group', dest='compare_per_group', action='store_true'
+  )
+  parser.add_argument('--output', dest='output', default=None)
+  args = parser.parse_args()
+
+  lag_data = generate_lag_data(args.conversion_actions, args.rows_per_action)
+  builders = [conv_lag_builder.ConversionLagBuilder]
+  if args.compare_per_group:
+    builders.append(PerGroupConversionLagBuilder)
+  results = {
+    'parameters': vars(args),
+    'benchmarks': [run_benchmark(builder, lag_data) for builder in builders],
+  }
+  if args.output:
+    with open(args.output, 'w', encoding='utf-8') as f:
+      json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+  main()
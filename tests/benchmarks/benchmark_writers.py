@@ -0,0 +1,103 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compares columnar and row-based preparation of data for BigQuery.
+
+Columnar path serializes DataFrame to parquet and saves it with LocalLoader;
+row-based path converts DataFrame to report and back as it's done before
+writing with gaarf BigQueryWriter.
+
+Run from the repository root:
+
+  PYTHONPATH=app/scripts python tests/benchmarks/benchmark_writers.py
+"""
+
+import argparse
+import io
+import json
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+
+import gaarf
+import numpy as np
+import pandas as pd
+from src import writers
+
+
+def generate_data(rows: int, seed: int = 42) -> pd.DataFrame:
+  """Generates DataFrame resembling conversion lag adjustment table."""
+  rng = np.random.default_rng(seed)
+  return pd.DataFrame(
+    {
+      'network': rng.choice(['SEARCH', 'YOUTUBE', 'CONTENT'], rows),
+      'conversion_id': rng.integers(1, 10000, rows).astype(str),
+      'lag_day': rng.integers(1, 91, rows),
+      'lag_adjustment': rng.random(rows),
+    }
+  )
+
+
+def write_row_based(data: pd.DataFrame) -> None:
+  """Converts data to rows and back before serializing it."""
+  report = gaarf.report.GaarfReport.from_pandas(data)
+  report.to_pandas().replace({np.nan: None}).to_parquet(io.BytesIO())
+
+
+def run_benchmark(
+  name: str, function: Callable[[], object]
+) -> dict[str, float | str]:
+  """Measures execution time and peak memory of a function."""
+  tracemalloc.start()
+  start = time.perf_counter()
+  function()
+  result = {
+    'name': name,
+    'seconds': time.perf_counter() - start,
+    'peak_memory_mib': tracemalloc.get_traced_memory()[1] / 2**20,
+  }
+  tracemalloc.stop()
+  print(
+    f'{name}: {result["seconds"]:.3f}s, '
+    f'peak memory {result["peak_memory_mib"]:.1f} MiB'
+  )
+  return result
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--rows', dest='rows', type=int, default=1_000_000)
+  parser.add_argument('--output', dest='output', default=None)
+  args = parser.parse_args()
+
+  data = generate_data(args.rows)
+  writer = writers.ColumnarBigQueryWriter(
+    'benchmark_project',
+    'benchmark_dataset',
+    loader=writers.LocalLoader(tempfile.mkdtemp()),
+  )
+  results = {
+    'parameters': vars(args),
+    'benchmarks': [
+      run_benchmark('columnar', lambda: writer.write(data, 'table')),
+      run_benchmark('row_based', lambda: write_row_based(data)),
+    ],
+  }
+  if args.output:
+    with open(args.output, 'w', encoding='utf-8') as f:
+      json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,141 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Fakes of Ads API and BigQuery clients shared by unit tests."""
+
+import threading
+import types
+
+import pandas as pd
+import pytest
+from gaarf.executors import bq_executor
+
+
+class FakeReportFetcher:
+  """Fake AdsReportFetcher returning reports built by a function.
+
+  Attributes:
+    get_report: Function building report for a query and account(s).
+    failures: Errors raised by the first requests in order of arrival.
+    api_client: Fake Ads API client with API version.
+    requests: Query and account(s) of every request in order of arrival.
+    max_active_requests: Maximum number of requests made at the same time.
+  """
+
+  def __init__(self, get_report, failures=None):
+    self.get_report = get_report
+    self.failures = list(failures or [])
+    self.api_client = types.SimpleNamespace(api_version='19')
+    self.requests = []
+    self.max_active_requests = 0
+    self._active_requests = 0
+    self._lock = threading.Lock()
+
+  def expand_mcc(self, account, customer_ids_query=None):
+    return [account]
+
+  def fetch(self, query, customer_ids):
+    with self._lock:
+      self.requests.append((query, customer_ids))
+      failure = self.failures.pop(0) if self.failures else None
+      self._active_requests += 1
+      self.max_active_requests = max(
+        self.max_active_requests, self._active_requests
+      )
+    try:
+      if failure:
+        raise failure
+      return self.get_report(query, customer_ids)
+    finally:
+      with self._lock:
+        self._active_requests -= 1
+
+
+class FakeQueryJob:
+  def result(self):
+    return None
+
+
+class FakeBigQueryClient:
+  """Fake BigQuery client listing tables and recording parametrized queries.
+
+  Attributes:
+    tables: Ids of tables in every dataset.
+    queries: Text and job config of every query.
+  """
+
+  def __init__(self, tables=None):
+    self.tables = list(tables or [])
+    self.queries = []
+
+  def list_tables(self, dataset_id):
+    return [
+      types.SimpleNamespace(table_id=table_id) for table_id in self.tables
+    ]
+
+  def query(self, query, job_config=None):
+    self.queries.append((query, job_config))
+    return FakeQueryJob()
+
+
+class FakeBigQueryExecutor:
+  """Fake BigQueryExecutor returning predefined results of scripts.
+
+  Attributes:
+    results: Mapping between script name and its result.
+    failing_queries: Script names or parts of query texts that fail.
+    error: Type of error raised by failing queries.
+    client: Fake BigQuery client.
+    executed_scripts: Names of executed scripts in order of execution.
+    queries: Mapping between script name and its last query text.
+  """
+
+  project_id = 'test_project'
+
+  def __init__(
+    self,
+    results=None,
+    failing_queries=None,
+    tables=None,
+    error=bq_executor.BigQueryExecutorException,
+  ):
+    self.results = results or {}
+    self.failing_queries = set(failing_queries or [])
+    self.error = error
+    self.client = FakeBigQueryClient(tables)
+    self.executed_scripts = []
+    self.queries = {}
+    self._lock = threading.Lock()
+
+  def execute(self, script_name, query_text, params=None):
+    with self._lock:
+      self.executed_scripts.append(script_name)
+      self.queries[script_name] = query_text
+    if any(
+      query == script_name or query in query_text
+      for query in self.failing_queries
+    ):
+      raise self.error(f'{script_name} failed')
+    return self.results.get(script_name, pd.DataFrame())
+
+
+@pytest.fixture
+def fake_report_fetcher():
+  """Factory of fake report fetchers."""
+  return FakeReportFetcher
+
+
+@pytest.fixture
+def fake_bigquery_executor():
+  """Factory of fake BigQuery executors."""
+  return FakeBigQueryExecutor
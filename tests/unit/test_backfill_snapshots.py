@@ -13,9 +13,58 @@
 # limitations under the License.
 import datetime
 import itertools
+import time
 
+import gaarf
 import pandas as pd
+import pytest
+from google.api_core import exceptions as google_api_exceptions
 from scripts import backfill_snapshots
+from src import queries
+
+
+def _get_backfill_report(change_history, reports=None, delay=0.0):
+  reports = reports or {}
+
+  def get_report(query, customer_ids):
+    time.sleep(delay)
+    if (report := reports.get(type(query))) is not None:
+      return gaarf.report.GaarfReport.from_pandas(
+        report.loc[report['customer_id'] == customer_ids].drop(
+          columns='customer_id'
+        )
+      )
+    events = change_history.loc[
+      (change_history['customer_id'] == customer_ids)
+      & (change_history['change_date'] >= query.start_date)
+      & (change_history['change_date'] <= query.end_date)
+    ].drop(columns='customer_id')
+    return gaarf.report.GaarfReport.from_pandas(events.head(query.limit))
+
+  return get_report
+
+
+class FakeBigQueryWriter:
+  def __init__(self, existing_tables=None, tables=None, append=False):
+    self.existing_tables = set(existing_tables or [])
+    self.tables = {} if tables is None else tables
+    self.append = append
+
+  def write(self, data, destination):
+    if destination in self.existing_tables:
+      raise google_api_exceptions.Conflict(f'{destination} already exists')
+    if self.append and destination in self.tables:
+      self.tables[destination] = pd.concat(
+        [self.tables[destination], data], ignore_index=True
+      )
+    else:
+      self.tables[destination] = data
+
+  def copy(self, source, destination):
+    self.write(self.tables[source], destination)
+
+  def delete(self, destination):
+    self.tables.pop(destination, None)
 
 
 def test_restore_bid_budget_history():
@@ -74,7 +123,7 @@ def test_restore_bid_budget_history():
 
   expected_change_history = pd.DataFrame(
     {
-      'day': dates * len(campaign_ids),
+      'day': pd.to_datetime(dates * len(campaign_ids)),
       'campaign_id': list(
         itertools.chain.from_iterable(
           itertools.repeat(x, len(dates)) for x in campaign_ids
@@ -129,3 +178,436 @@ def test_restore_missing_cohorts_with_with_only_end_date_does_nothing():
     backfill_snapshots.restore_missing_cohorts(snapshot_dates, 'test_dataset')
   )
   assert not statements
+
+
+def test_restore_bid_budget_history_does_not_fill_across_campaigns():
+  change_history = pd.DataFrame(
+    data=[
+      ['2024-01-02 10:00:00', 1, 10, 20, None, None, 1.5, 2.5],
+      ['2024-01-02 12:00:00', 1, 20, 30, None, None, None, None],
+    ],
+    columns=(
+      'change_date',
+      'campaign_id',
+      'old_budget_amount',
+      'new_budget_amount',
+      'old_target_cpa',
+      'new_target_cpa',
+      'old_target_roas',
+      'new_target_roas',
+    ),
+  )
+  current_bid_budgets = pd.DataFrame(
+    data=[[1, 30, 5, 2.5], [2, 40, 6, 3.0]],
+    columns=('campaign_id', 'budget_amount', 'target_cpa', 'target_roas'),
+  )
+  dates = ['2024-01-01', '2024-01-02', '2024-01-03']
+  placeholders = backfill_snapshots._prepare_placeholders([2, 1], dates)
+  restored_change_history = backfill_snapshots._restore_bid_budget_history(
+    change_history, current_bid_budgets, placeholders
+  )
+
+  expected_change_history = pd.DataFrame(
+    {
+      'day': pd.to_datetime(dates * 2),
+      'campaign_id': [2, 2, 2, 1, 1, 1],
+      'budget_amount': [40, 40, 40, 20, 30, 30],
+      'target_cpa': [6, 6, 6, 5, 5, 5],
+      'target_roas': [3.0, 3.0, 3.0, 1.5, 2.5, 2.5],
+    }
+  )
+  assert restored_change_history.equals(expected_change_history)
+
+
+def test_save_restored_change_history_writes_only_missing_dates():
+  restored_bid_budget_history = pd.DataFrame(
+    {
+      'day': ['2024-01-01', '2024-01-01', '2024-01-02', '2024-01-03'],
+      'campaign_id': [1, 2, 1, 1],
+      'budget_amount': [10, 20, 10, 10],
+      'target_cpa': [1, 2, 1, 1],
+      'target_roas': [None] * 4,
+    }
+  )
+  bq_writer = FakeBigQueryWriter(existing_tables={'bid_budgets_20240103'})
+  backfill_snapshots.save_restored_change_history(
+    bq_writer,
+    restored_bid_budget_history,
+    {'2024-01-01', '2024-01-03'},
+    max_workers=2,
+  )
+
+  assert set(bq_writer.tables) == {'bid_budgets_20240101'}
+  saved_snapshot = bq_writer.tables['bid_budgets_20240101']
+  assert saved_snapshot['campaign_id'].tolist() == [1, 2]
+  assert saved_snapshot['day'].tolist() == [datetime.date(2024, 1, 1)] * 2
+
+
+def test_save_restored_asset_cohorts_reports_outcome_for_each_table(
+  fake_bigquery_executor,
+):
+  snapshot_dates = {
+    datetime.date(2024, 1, 1),
+    datetime.date(2024, 1, 5),
+  }
+  bigquery_executor = fake_bigquery_executor(
+    failing_queries={'conversion_lags_20240103'}
+  )
+  outcomes = backfill_snapshots.save_restored_asset_cohorts(
+    bigquery_executor,
+    backfill_snapshots.restore_missing_cohorts(snapshot_dates, 'test_dataset'),
+    max_workers=3,
+  )
+
+  assert len(bigquery_executor.executed_scripts) == 3
+  assert outcomes == {
+    'test_dataset.conversion_lags_20240102': True,
+    'test_dataset.conversion_lags_20240103': False,
+    'test_dataset.conversion_lags_20240104': True,
+  }
+
+
+def test_fetch_change_history_splits_chunks_reaching_the_limit(
+  fake_report_fetcher,
+):
+  change_history = pd.DataFrame(
+    {
+      'customer_id': ['1'] * 5 + ['2'],
+      'change_date': [
+        '2024-01-01 01:00:00.000000',
+        '2024-01-01 02:00:00.000000',
+        '2024-01-01 13:00:00.000000',
+        '2024-01-01 14:00:00.000000',
+        '2024-01-02 00:00:00.000000',
+        '2024-01-02 10:00:00.000000',
+      ],
+      'campaign_id': [1, 1, 1, 2, 1, 3],
+      'old_budget_amount': [10, 20, 30, 40, 50, 60],
+      'new_budget_amount': [20, 30, 40, 50, 60, 70],
+    }
+  )
+  report_fetcher = fake_report_fetcher(_get_backfill_report(change_history))
+  fetched_change_history = backfill_snapshots.fetch_change_history(
+    report_fetcher,
+    ['1', '2'],
+    ('2024-01-01', '2024-01-02'),
+    max_workers=2,
+    limit=2,
+  )
+
+  assert len(report_fetcher.requests) > 4
+  assert sorted(fetched_change_history['old_budget_amount'].tolist()) == [
+    10,
+    20,
+    30,
+    40,
+    50,
+    60,
+  ]
+
+
+def test_restore_missing_bid_budgets_combines_reports_for_all_accounts(
+  fake_report_fetcher,
+):
+  change_history = pd.DataFrame(
+    {
+      'customer_id': ['1'],
+      'change_date': ['2024-01-02 10:00:00.000000'],
+      'campaign_id': [1],
+      'old_budget_amount': [10],
+      'new_budget_amount': [20],
+      'old_target_cpa': [None],
+      'new_target_cpa': [None],
+      'old_target_roas': [None],
+      'new_target_roas': [None],
+    }
+  )
+  bids_budgets = pd.DataFrame(
+    {
+      'customer_id': ['1', '2'],
+      'campaign_id': [1, 2],
+      'budget_amount': [20, 30],
+      'target_cpa': [5, 6],
+      'target_roas': [None, None],
+    }
+  )
+  report_fetcher = fake_report_fetcher(
+    _get_backfill_report(
+      change_history,
+      reports={
+        queries.CampaignsWithSpend: bids_budgets[
+          ['customer_id', 'campaign_id']
+        ],
+        queries.BidsBudgetsActiveCampaigns: bids_budgets.head(1),
+        queries.BidsBudgetsInactiveCampaigns: bids_budgets.tail(1),
+      },
+    )
+  )
+  restored_change_history = backfill_snapshots.restore_missing_bid_budgets(
+    report_fetcher, ['1', '2'], ('2024-01-01', '2024-01-02'), max_workers=4
+  )
+
+  assert restored_change_history['campaign_id'].tolist() == [1, 1, 2, 2]
+  assert restored_change_history['budget_amount'].tolist() == [10, 20, 30, 30]
+
+
+def test_restore_missing_bid_budgets_limits_concurrent_requests(
+  fake_report_fetcher,
+):
+  customer_ids = [str(i) for i in range(8)]
+  change_history = pd.DataFrame(
+    {
+      'customer_id': customer_ids,
+      'change_date': ['2024-01-02 10:00:00.000000'] * 8,
+      'campaign_id': range(8),
+      'old_budget_amount': [10] * 8,
+      'new_budget_amount': [20] * 8,
+      'old_target_cpa': [None] * 8,
+      'new_target_cpa': [None] * 8,
+      'old_target_roas': [None] * 8,
+      'new_target_roas': [None] * 8,
+    }
+  )
+  bids_budgets = pd.DataFrame(
+    {
+      'customer_id': customer_ids,
+      'campaign_id': range(8),
+      'budget_amount': [20] * 8,
+      'target_cpa': [5] * 8,
+      'target_roas': [None] * 8,
+    }
+  )
+  report_fetcher = fake_report_fetcher(
+    _get_backfill_report(
+      change_history,
+      reports={
+        queries.CampaignsWithSpend: bids_budgets[
+          ['customer_id', 'campaign_id']
+        ],
+        queries.BidsBudgetsActiveCampaigns: bids_budgets,
+        queries.BidsBudgetsInactiveCampaigns: bids_budgets.head(0),
+      },
+      delay=0.01,
+    )
+  )
+
+  backfill_snapshots.restore_missing_bid_budgets(
+    report_fetcher, customer_ids, ('2024-01-01', '2024-01-02'), max_workers=3
+  )
+
+  assert len(report_fetcher.requests) == 8 * 2 + 8 * 3
+  assert report_fetcher.max_active_requests == 3
+
+
+def test_find_missing_incremental_snapshot_queries_only_latest_snapshot(
+  fake_bigquery_executor,
+):
+  bigquery_executor = fake_bigquery_executor(
+    tables=[
+      'asset_performance_20240101',
+      'asset_performance_20240110',
+      'asset_performance_missing',
+      'asset_performance_conversion_split_20240201',
+    ],
+    results={
+      'missing_incremental_snapshot': pd.DataFrame(
+        {'new_start_date': [datetime.date(2024, 1, 2)]}
+      )
+    },
+  )
+  missing_snapshot = backfill_snapshots.find_missing_incremental_snapshot(
+    bigquery_executor,
+    'test_dataset_output',
+    'asset_performance',
+    current_date=datetime.date(2024, 1, 15),
+  )
+
+  assert missing_snapshot == ('2024-01-02', '20240110')
+  assert bigquery_executor.executed_scripts == ['missing_incremental_snapshot']
+  assert (
+    'asset_performance_20240110'
+    in bigquery_executor.queries['missing_incremental_snapshot']
+  )
+
+
+def test_find_missing_incremental_snapshot_without_gaps_returns_none(
+  fake_bigquery_executor,
+):
+  bigquery_executor = fake_bigquery_executor(
+    tables=['asset_performance_20240101', 'asset_performance_20240114']
+  )
+  missing_snapshot = backfill_snapshots.find_missing_incremental_snapshot(
+    bigquery_executor,
+    'test_dataset_output',
+    'asset_performance',
+    current_date=datetime.date(2024, 1, 15),
+  )
+
+  assert missing_snapshot is None
+  assert not bigquery_executor.queries
+
+
+def test_restore_and_save_bid_budgets_with_shards_matches_unsharded_run(
+  fake_report_fetcher,
+):
+  change_history = pd.DataFrame(
+    {
+      'customer_id': ['1', '3'],
+      'change_date': ['2024-01-02 10:00:00.000000'] * 2,
+      'campaign_id': [1, 3],
+      'old_budget_amount': [10, 15],
+      'new_budget_amount': [20, 25],
+      'old_target_cpa': [None, None],
+      'new_target_cpa': [None, None],
+      'old_target_roas': [None, None],
+      'new_target_roas': [None, None],
+    }
+  )
+  bids_budgets = pd.DataFrame(
+    {
+      'customer_id': ['1', '2', '3'],
+      'campaign_id': [1, 2, 3],
+      'budget_amount': [20, 30, 25],
+      'target_cpa': [5, 6, 7],
+      'target_roas': [None, None, None],
+    }
+  )
+  report_fetcher = fake_report_fetcher(
+    _get_backfill_report(
+      change_history,
+      reports={
+        queries.CampaignsWithSpend: bids_budgets[
+          ['customer_id', 'campaign_id']
+        ],
+        queries.BidsBudgetsActiveCampaigns: bids_budgets,
+        queries.BidsBudgetsInactiveCampaigns: bids_budgets.head(0),
+      },
+    )
+  )
+  snapshots = []
+  for shard_size in (0, 1):
+    tables = {}
+    backfill_snapshots.restore_and_save_bid_budgets(
+      report_fetcher,
+      ['1', '2', '3'],
+      ('2024-01-01', '2024-01-02'),
+      {'2024-01-01', '2024-01-02'},
+      FakeBigQueryWriter(
+        existing_tables={'bid_budgets_20240102'}, tables=tables
+      ),
+      FakeBigQueryWriter(tables=tables, append=True),
+      shard_size=shard_size,
+    )
+    snapshots.append(tables)
+
+  unsharded_snapshots, sharded_snapshots = snapshots
+  assert set(sharded_snapshots) == {'bid_budgets_20240101'}
+  assert set(unsharded_snapshots) == set(sharded_snapshots)
+  assert sharded_snapshots['bid_budgets_20240101'].equals(
+    unsharded_snapshots['bid_budgets_20240101']
+    .sort_values('campaign_id')
+    .reset_index(drop=True)
+  )
+  budgets = sharded_snapshots['bid_budgets_20240101']['budget_amount']
+  assert budgets.tolist() == [10, 30, 15]
+
+
+def test_restore_and_save_bid_budgets_leaves_no_partial_snapshots(
+  fake_report_fetcher,
+):
+  bids_budgets = pd.DataFrame(
+    {
+      'customer_id': ['1', '2'],
+      'campaign_id': [1, 2],
+      'budget_amount': [20, 30],
+      'target_cpa': [5, 6],
+      'target_roas': [None, None],
+    }
+  )
+
+  get_report = _get_backfill_report(
+    pd.DataFrame(
+      columns=[
+        'customer_id',
+        'change_date',
+        'campaign_id',
+        'old_budget_amount',
+        'new_budget_amount',
+        'old_target_cpa',
+        'new_target_cpa',
+        'old_target_roas',
+        'new_target_roas',
+      ]
+    ),
+    reports={
+      queries.CampaignsWithSpend: bids_budgets[['customer_id', 'campaign_id']],
+      queries.BidsBudgetsActiveCampaigns: bids_budgets,
+      queries.BidsBudgetsInactiveCampaigns: bids_budgets.head(0),
+    },
+  )
+
+  def get_failing_report(query, customer_ids):
+    if customer_ids == '2':
+      raise RuntimeError('Ads API is unavailable')
+    return get_report(query, customer_ids)
+
+  report_fetcher = fake_report_fetcher(get_failing_report)
+  tables = {}
+
+  with pytest.raises(RuntimeError, match='Ads API is unavailable'):
+    backfill_snapshots.restore_and_save_bid_budgets(
+      report_fetcher,
+      ['1', '2'],
+      ('2024-01-01', '2024-01-02'),
+      {'2024-01-01', '2024-01-02'},
+      FakeBigQueryWriter(tables=tables),
+      FakeBigQueryWriter(tables=tables, append=True),
+      shard_size=1,
+    )
+
+  assert not tables
+
+
+def test_restore_and_save_bid_budgets_raises_when_staging_write_fails(
+  fake_report_fetcher,
+):
+  class FailingBigQueryWriter(FakeBigQueryWriter):
+    def write(self, data, destination):
+      if destination.endswith('20240101'):
+        raise ValueError('Unable to save data to BigQuery!')
+      super().write(data, destination)
+
+  bids_budgets = pd.DataFrame(
+    {
+      'customer_id': ['1'],
+      'campaign_id': [1],
+      'budget_amount': [20],
+      'target_cpa': [5],
+      'target_roas': [None],
+    }
+  )
+  report_fetcher = fake_report_fetcher(
+    _get_backfill_report(
+      pd.DataFrame(columns=['customer_id', 'change_date']),
+      reports={
+        queries.CampaignsWithSpend: bids_budgets[
+          ['customer_id', 'campaign_id']
+        ],
+        queries.BidsBudgetsActiveCampaigns: bids_budgets,
+        queries.BidsBudgetsInactiveCampaigns: bids_budgets.head(0),
+      },
+    )
+  )
+  tables = {}
+
+  with pytest.raises(ValueError, match='2024-01-01'):
+    backfill_snapshots.restore_and_save_bid_budgets(
+      report_fetcher,
+      ['1'],
+      ('2024-01-01', '2024-01-02'),
+      {'2024-01-01', '2024-01-02'},
+      FakeBigQueryWriter(tables=tables),
+      FailingBigQueryWriter(tables=tables, append=True),
+    )
+
+  assert not tables
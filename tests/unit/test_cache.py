@@ -0,0 +1,110 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import datetime
+import os
+
+import gaarf
+from src import cache, queries
+
+
+def _get_report(query, customer_ids):
+  return gaarf.report.GaarfReport(
+    results=[[1, None], [2, 0.5]], column_names=['campaign_id', 'value']
+  )
+
+
+def test_cached_report_fetcher_reuses_report_on_second_fetch(
+  fake_report_fetcher, tmp_path
+):
+  report_fetcher = fake_report_fetcher(_get_report)
+  cached_report_fetcher = cache.CachedReportFetcher(
+    report_fetcher, str(tmp_path)
+  )
+  query = queries.CampaignsWithSpend('2024-01-01', '2024-01-28')
+
+  first_report = cached_report_fetcher.fetch(query, ['2', '1'])
+  second_report = cached_report_fetcher.fetch(query, ['1', '2'])
+
+  assert len(report_fetcher.requests) == 1
+  assert second_report.column_names == first_report.column_names
+  assert second_report.results == [[1, None], [2, 0.5]]
+
+
+def test_cached_report_fetcher_keeps_types_of_nullable_columns(
+  fake_report_fetcher, tmp_path
+):
+  report_fetcher = fake_report_fetcher(
+    lambda query, customer_ids: gaarf.report.GaarfReport(
+      results=[[10, None, 'SEARCH'], [None, 1.5, None]],
+      column_names=['conversions', 'cost', 'network'],
+    )
+  )
+  cached_report_fetcher = cache.CachedReportFetcher(
+    report_fetcher, str(tmp_path)
+  )
+  query = queries.CampaignsWithSpend('2024-01-01', '2024-01-28')
+
+  live_report = cached_report_fetcher.fetch(query, '1')
+  cached_report = cached_report_fetcher.fetch(query, '1')
+
+  assert len(report_fetcher.requests) == 1
+  assert cached_report.results == live_report.results
+  assert type(cached_report.results[0][0]) is int
+
+
+def test_cached_report_fetcher_refetches_different_dates(
+  fake_report_fetcher, tmp_path
+):
+  report_fetcher = fake_report_fetcher(_get_report)
+  cached_report_fetcher = cache.CachedReportFetcher(
+    report_fetcher, str(tmp_path)
+  )
+
+  cached_report_fetcher.fetch(
+    queries.CampaignsWithSpend('2024-01-01', '2024-01-28'), '1'
+  )
+  cached_report_fetcher.fetch(
+    queries.CampaignsWithSpend('2024-01-02', '2024-01-29'), '1'
+  )
+
+  assert len(report_fetcher.requests) == 2
+
+
+def test_cached_report_fetcher_ignores_expired_reports(
+  fake_report_fetcher, tmp_path
+):
+  report_fetcher = fake_report_fetcher(_get_report)
+  cached_report_fetcher = cache.CachedReportFetcher(
+    report_fetcher, str(tmp_path), ttl=datetime.timedelta(seconds=0)
+  )
+  query = queries.BidsBudgetsActiveCampaigns()
+
+  cached_report_fetcher.fetch(query, '1')
+  for entry in os.scandir(tmp_path):
+    os.utime(entry.path, (0, 0))
+  cached_report_fetcher.fetch(query, '1')
+
+  assert len(report_fetcher.requests) == 2
+
+
+def test_cached_report_fetcher_evicts_reports_exceeding_max_size(
+  fake_report_fetcher, tmp_path
+):
+  cached_report_fetcher = cache.CachedReportFetcher(
+    fake_report_fetcher(_get_report), str(tmp_path), max_size_mb=0
+  )
+
+  cached_report_fetcher.fetch(queries.BidsBudgetsActiveCampaigns(), '1')
+
+  assert not os.listdir(tmp_path)
@@ -0,0 +1,152 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pandas as pd
+from src import conv_lag_builder
+
+
+def test_calculate_reference_values_returns_lags_for_each_group():
+  lag_data = pd.DataFrame(
+    data=[
+      ('SEARCH', '1', 'LESS_THAN_ONE_DAY', 1.0),
+      ('SEARCH', '1', 'LESS_THAN_ONE_DAY', 1.0),
+      ('SEARCH', '1', 'TWO_TO_THREE_DAYS', 2.0),
+      ('YOUTUBE', '1', 'ONE_TO_TWO_DAYS', 3.0),
+      ('YOUTUBE', '1', 'UNKNOWN', 3.0),
+    ],
+    columns=[
+      'network',
+      'conversion_id',
+      'conversion_lag_bucket',
+      'all_conversions',
+    ],
+  )
+
+  conversion_lag_table = conv_lag_builder.ConversionLagBuilder(
+    lag_data, ['network', 'conversion_id']
+  ).calculate_reference_values()
+
+  expected_table = pd.DataFrame(
+    data=[
+      ('SEARCH', '1', 1, 0.5),
+      ('SEARCH', '1', 2, 0.75),
+      ('SEARCH', '1', 3, 1.0),
+      ('YOUTUBE', '1', 1, 1.0),
+    ],
+    columns=['network', 'conversion_id', 'lag_day', 'lag_adjustment'],
+  )
+  pd.testing.assert_frame_equal(
+    conversion_lag_table.to_pandas(), expected_table, check_dtype=False
+  )
+
+
+def test_calculate_reference_values_by_levels_returns_lags_for_each_level():
+  lag_data = pd.DataFrame(
+    data=[
+      (1, 10, 'SEARCH', '1', 'LESS_THAN_ONE_DAY', 1.0),
+      (1, 10, 'SEARCH', '1', 'ONE_TO_TWO_DAYS', 1.0),
+      (1, 20, 'SEARCH', '1', 'LESS_THAN_ONE_DAY', 2.0),
+      (2, 30, 'SEARCH', '1', 'ONE_TO_TWO_DAYS', 4.0),
+    ],
+    columns=[
+      'account_id',
+      'campaign_id',
+      'network',
+      'conversion_id',
+      'conversion_lag_bucket',
+      'all_conversions',
+    ],
+  )
+  builder = conv_lag_builder.ConversionLagBuilder(
+    lag_data, conv_lag_builder.BASE_GROUPBY
+  )
+
+  conversion_lag_tables = builder.calculate_reference_values_by_levels(
+    conv_lag_builder.GRANULARITY_LEVELS
+  )
+
+  pd.testing.assert_frame_equal(
+    conversion_lag_tables['conversion'],
+    builder.calculate_reference_values().to_pandas(),
+  )
+  expected_campaign_table = pd.DataFrame(
+    data=[
+      ('SEARCH', '1', 10, 1, 0.5),
+      ('SEARCH', '1', 10, 2, 1.0),
+      ('SEARCH', '1', 20, 1, 1.0),
+      ('SEARCH', '1', 30, 1, 1.0),
+    ],
+    columns=[
+      'network',
+      'conversion_id',
+      'campaign_id',
+      'lag_day',
+      'lag_adjustment',
+    ],
+  )
+  pd.testing.assert_frame_equal(
+    conversion_lag_tables['campaign'],
+    expected_campaign_table,
+    check_dtype=False,
+  )
+  expected_account_table = pd.DataFrame(
+    data=[
+      ('SEARCH', '1', 1, 1, 0.75),
+      ('SEARCH', '1', 1, 2, 1.0),
+      ('SEARCH', '1', 2, 1, 1.0),
+    ],
+    columns=[
+      'network',
+      'conversion_id',
+      'account_id',
+      'lag_day',
+      'lag_adjustment',
+    ],
+  )
+  pd.testing.assert_frame_equal(
+    conversion_lag_tables['account'],
+    expected_account_table,
+    check_dtype=False,
+  )
+
+
+def test_calculate_reference_values_does_not_depend_on_number_of_workers():
+  lag_data = pd.DataFrame(
+    data=[
+      ('SEARCH', str(conversion_id), bucket, float(conversion_id % 7 + 1))
+      for conversion_id in range(20)
+      for bucket in (
+        'LESS_THAN_ONE_DAY',
+        'THREE_TO_FOUR_DAYS',
+        'FOURTEEN_TO_TWENTY_ONE_DAYS',
+      )
+    ],
+    columns=[
+      'network',
+      'conversion_id',
+      'conversion_lag_bucket',
+      'all_conversions',
+    ],
+  )
+
+  conversion_lag_table = conv_lag_builder.ConversionLagBuilder(
+    lag_data, conv_lag_builder.BASE_GROUPBY
+  ).calculate_reference_values()
+  parallel_conversion_lag_table = conv_lag_builder.ConversionLagBuilder(
+    lag_data, conv_lag_builder.BASE_GROUPBY, workers=3
+  ).calculate_reference_values()
+
+  pd.testing.assert_frame_equal(
+    parallel_conversion_lag_table.to_pandas(),
+    conversion_lag_table.to_pandas(),
+  )
@@ -0,0 +1,212 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pandas as pd
+import pytest
+from gaarf.cli import utils as gaarf_utils
+from scripts import create_skan_schema
+
+_SOURCE_TABLE = 'project.dataset.skan_schema'
+
+
+@pytest.fixture
+def config():
+  return gaarf_utils.GaarfBqConfig(
+    project='project',
+    params={
+      'macro': {
+        'bq_dataset': 'arp',
+        'skan_schema_input_table': _SOURCE_TABLE,
+      }
+    },
+  )
+
+
+def _saved_fingerprint(**kwargs):
+  fingerprint = {
+    'source_table': _SOURCE_TABLE,
+    'last_modified_time': 1000,
+    'row_count': 64,
+    'content_hash': 42,
+  }
+  fingerprint.update(kwargs)
+  return pd.DataFrame([fingerprint])
+
+
+def _results(saved_fingerprint=None, last_modified_time=1000, row_count=64):
+  results = {
+    'check_existing_skan_schema': pd.DataFrame({'app_id': ['com.example']}),
+    'skan_schema_input_table_metadata': pd.DataFrame(
+      {'last_modified_time': [last_modified_time], 'row_count': [row_count]}
+    ),
+    'skan_schema_input_table_fingerprint': pd.DataFrame(
+      {'row_count': [row_count], 'content_hash': [42]}
+    ),
+  }
+  if saved_fingerprint is not None:
+    results['skan_schema_fingerprint'] = saved_fingerprint
+  return results
+
+
+def test_copy_schema_if_changed_copies_schema_without_saved_fingerprint(
+  fake_bigquery_executor, config
+):
+  executor = fake_bigquery_executor(results=_results())
+
+  copied = create_skan_schema.copy_schema_if_changed(executor, config)
+
+  assert copied
+  assert 'skan_schema' in executor.executed_scripts
+  assert 'save_skan_schema_fingerprint' in executor.executed_scripts
+
+
+def test_copy_schema_if_changed_skips_not_modified_source(
+  fake_bigquery_executor, config
+):
+  executor = fake_bigquery_executor(results=_results(_saved_fingerprint()))
+
+  copied = create_skan_schema.copy_schema_if_changed(executor, config)
+
+  assert not copied
+  assert 'skan_schema_input_table_fingerprint' not in executor.executed_scripts
+  assert 'skan_schema' not in executor.executed_scripts
+
+
+def test_copy_schema_if_changed_skips_source_with_same_content(
+  fake_bigquery_executor, config
+):
+  executor = fake_bigquery_executor(
+    results=_results(_saved_fingerprint(), last_modified_time=2000)
+  )
+
+  copied = create_skan_schema.copy_schema_if_changed(executor, config)
+
+  assert not copied
+  assert 'skan_schema' not in executor.executed_scripts
+  assert 'save_skan_schema_fingerprint' in executor.executed_scripts
+
+
+def test_copy_schema_if_changed_copies_changed_source(
+  fake_bigquery_executor, config
+):
+  saved_fingerprint = _saved_fingerprint(content_hash=1)
+  executor = fake_bigquery_executor(
+    results=_results(saved_fingerprint, last_modified_time=2000)
+  )
+
+  copied = create_skan_schema.copy_schema_if_changed(executor, config)
+
+  assert copied
+  assert 'skan_schema' in executor.executed_scripts
+
+
+def test_copy_schema_if_changed_copies_schema_from_different_source(
+  fake_bigquery_executor, config
+):
+  executor = fake_bigquery_executor(
+    results=_results(_saved_fingerprint(source_table='project.dataset.old'))
+  )
+
+  copied = create_skan_schema.copy_schema_if_changed(executor, config)
+
+  assert copied
+
+
+def test_copy_schema_if_changed_copies_schema_when_copy_is_missing(
+  fake_bigquery_executor, config
+):
+  executor = fake_bigquery_executor(
+    results=_results(_saved_fingerprint()),
+    failing_queries=['check_existing_skan_schema'],
+  )
+
+  copied = create_skan_schema.copy_schema_if_changed(executor, config)
+
+  assert copied
+
+
+def test_copy_schema_if_changed_hashes_content_of_views(
+  fake_bigquery_executor, config
+):
+  executor = fake_bigquery_executor(
+    results=_results(_saved_fingerprint(last_modified_time=None)),
+    failing_queries=['skan_schema_input_table_metadata'],
+  )
+
+  copied = create_skan_schema.copy_schema_if_changed(executor, config)
+
+  assert not copied
+  assert 'skan_schema_input_table_fingerprint' in executor.executed_scripts
+
+
+def test_copy_schema_if_changed_copies_schema_with_force(
+  fake_bigquery_executor, config
+):
+  executor = fake_bigquery_executor(results=_results(_saved_fingerprint()))
+
+  copied = create_skan_schema.copy_schema_if_changed(
+    executor, config, force=True
+  )
+
+  assert copied
+
+
+def test_compile_schema_creates_lookup_clustered_by_app_id(
+  fake_bigquery_executor,
+):
+  executor = fake_bigquery_executor()
+
+  create_skan_schema.compile_schema(executor, 'arp')
+
+  assert executor.executed_scripts == [
+    'validate_skan_schema',
+    'skan_schema_lookup',
+  ]
+  assert 'CLUSTER BY app_id' in executor.queries['skan_schema_lookup']
+  assert 'GENERATE_ARRAY(0, 63)' in executor.queries['skan_schema_lookup']
+
+
+def test_compile_schema_does_not_sum_values_of_merged_definitions(
+  fake_bigquery_executor,
+):
+  executor = fake_bigquery_executor()
+
+  create_skan_schema.compile_schema(executor, 'arp')
+
+  query = executor.queries['skan_schema_lookup']
+  assert 'MIN(skan_event_value_low)' in query
+  assert 'MAX(skan_event_value_high)' in query
+  assert 'AVG(skan_event_value_mean)' in query
+  assert 'SUM(skan_event_value' not in query
+
+
+def test_compile_schema_reports_schema_issues(fake_bigquery_executor, caplog):
+  issues = pd.DataFrame(
+    {
+      'app_id': ['com.example', 'com.example.other'],
+      'duplicate_rows': [2, 0],
+      'merged_values': [1, 0],
+      'missing_values': [0, 60],
+      'invalid_values': [0, 3],
+    }
+  )
+  executor = fake_bigquery_executor(results={'validate_skan_schema': issues})
+
+  with caplog.at_level('INFO'):
+    reported_issues = create_skan_schema.compile_schema(executor, 'arp')
+
+  assert reported_issues.equals(issues)
+  assert 'com.example: 2 duplicate row(s) removed' in caplog.text
+  assert 'com.example: 1 conversion value(s) defined several' in caplog.text
+  assert 'com.example.other: 3 row(s) with conversion value' in caplog.text
+  assert 'com.example.other: 60 conversion value(s)' in caplog.text
@@ -0,0 +1,111 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import time
+
+import gaarf
+from scripts import fetch_ads_queries
+
+
+def _get_delayed_report(delays, failing_queries=()):
+  def get_report(query, customer_ids):
+    time.sleep(delays[query])
+    if query in failing_queries and '3' in customer_ids:
+      raise ValueError(f'Unrecognized field in {query}')
+    return gaarf.report.GaarfReport(
+      results=[[customer_id] for customer_id in customer_ids],
+      column_names=['customer_id'],
+    )
+
+  return get_report
+
+
+class FakeWriter:
+  def __init__(self, failing_destinations=None):
+    self.reports = {}
+    self.failing_destinations = set(failing_destinations or [])
+
+  def write(self, report, destination):
+    if destination in self.failing_destinations:
+      raise ValueError(f'Unable to write {destination}')
+    self.reports[destination] = report
+
+
+def test_fetch_and_write_writes_reports_and_returns_stats(fake_report_fetcher):
+  report_fetcher = fake_report_fetcher(
+    _get_delayed_report({'slow.sql': 0.2, 'fast.sql': 0.0})
+  )
+  writer = FakeWriter()
+
+  start = time.perf_counter()
+  stats = fetch_ads_queries.fetch_and_write(
+    report_fetcher,
+    {'fast.sql': 'fast.sql', 'slow.sql': 'slow.sql'},
+    ['1', '2', '3', '4'],
+    writer,
+    shard_size=2,
+    max_workers=4,
+  )
+  elapsed = time.perf_counter() - start
+
+  assert sorted(writer.reports) == ['fast.sql', 'slow.sql']
+  assert len(writer.reports['slow.sql']) == 4
+  assert [query_stats['query'] for query_stats in stats] == [
+    'slow.sql',
+    'fast.sql',
+  ]
+  assert stats[0]['shards'] == 2
+  assert stats[0]['fetch_seconds'] >= 0.4
+  assert elapsed < 0.4
+  assert all('write_seconds' in query_stats for query_stats in stats)
+
+
+def test_fetch_and_write_skips_failed_queries_and_writes_others(
+  fake_report_fetcher,
+):
+  report_fetcher = fake_report_fetcher(
+    _get_delayed_report(
+      {'broken.sql': 0.0, 'unwritable.sql': 0.0, 'valid.sql': 0.1},
+      failing_queries=['broken.sql'],
+    )
+  )
+  writer = FakeWriter(failing_destinations=['unwritable.sql'])
+
+  stats = fetch_ads_queries.fetch_and_write(
+    report_fetcher,
+    {
+      'broken.sql': 'broken.sql',
+      'unwritable.sql': 'unwritable.sql',
+      'valid.sql': 'valid.sql',
+    },
+    ['1', '2', '3', '4'],
+    writer,
+    shard_size=2,
+    max_workers=4,
+  )
+
+  assert list(writer.reports) == ['valid.sql']
+  assert len(writer.reports['valid.sql']) == 4
+  statuses = {
+    query_stats['query']: query_stats['status'] for query_stats in stats
+  }
+  assert statuses == {
+    'broken.sql': 'failed',
+    'unwritable.sql': 'failed',
+    'valid.sql': 'completed',
+  }
+  errors = {
+    query_stats['query']: query_stats.get('error') for query_stats in stats
+  }
+  assert 'Unrecognized field' in errors['broken.sql']
+  assert 'Unable to write' in errors['unwritable.sql']
@@ -0,0 +1,157 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pandas as pd
+from garf_executors import bq_executor
+from scripts import fetch_video_orientation
+
+
+def test_get_videos_without_orientation_returns_new_videos(
+  fake_bigquery_executor,
+):
+  executor = fake_bigquery_executor(
+    results={
+      'new_video_orientations': pd.DataFrame({'youtube_video_id': ['a', 'b']})
+    }
+  )
+
+  videos = fetch_video_orientation.get_videos_without_orientation(
+    executor, 'dataset', retry_unknown_days=3
+  )
+
+  assert videos == ['a', 'b']
+  assert 'INTERVAL 3 DAY' in executor.queries['new_video_orientations']
+
+
+def test_get_videos_without_orientation_returns_empty_list_without_new_videos(
+  fake_bigquery_executor,
+):
+  videos = fetch_video_orientation.get_videos_without_orientation(
+    fake_bigquery_executor(), 'dataset'
+  )
+
+  assert videos == []
+
+
+def test_get_videos_without_orientation_returns_none_for_missing_table(
+  fake_bigquery_executor,
+):
+  executor = fake_bigquery_executor(
+    failing_queries=['new_video_orientations'],
+    error=bq_executor.BigQueryExecutorError,
+  )
+
+  videos = fetch_video_orientation.get_videos_without_orientation(
+    executor, 'dataset'
+  )
+
+  assert videos is None
+
+
+def test_delete_stale_unknown_orientations_passes_videos_as_parameter(
+  fake_bigquery_executor,
+):
+  executor = fake_bigquery_executor()
+  videos = [f'video_{i}' for i in range(10_000)]
+  fetched_at = pd.Timestamp('2024-01-01', tz='UTC')
+
+  fetch_video_orientation.delete_stale_unknown_orientations(
+    executor, 'dataset', videos, fetched_at
+  )
+
+  [(query, job_config)] = executor.client.queries
+  parameters = {
+    parameter.name: parameter for parameter in job_config.query_parameters
+  }
+  assert 'IN UNNEST(@videos)' in query
+  assert 'video_0' not in query
+  assert parameters['videos'].values == videos
+  assert parameters['fetched_at'].value == fetched_at.to_pydatetime()
+
+
+def test_classify_orientations_returns_unknown_for_invalid_dimensions():
+  orientations = fetch_video_orientation.classify_orientations(
+    pd.Series([1920, 1080, 1000, 1003, None, 1920]),
+    pd.Series([1080, 1920, 1000, 1000, 1080, 0]),
+  )
+
+  assert orientations.tolist() == [
+    'Landscape',
+    'Portrait',
+    'Square',
+    'Square',
+    'Unknown',
+    'Unknown',
+  ]
+
+
+def test_parse_dimensions_from_asset_names():
+  dimensions = fetch_video_orientation.parse_dimensions_from_asset_names(
+    pd.Series(['app_en_1920x1080_v1', 'app_en_1080x1920', 'app_1x1', None]),
+    element_delimiter='_',
+    orientation_position=2,
+    orientation_delimiter='x',
+  )
+
+  assert dimensions.fillna(-1).values.tolist() == [
+    [1920, 1080],
+    [1080, 1920],
+    [-1, -1],
+    [-1, -1],
+  ]
+
+
+def test_parse_dimensions_from_asset_names_with_multi_character_delimiter():
+  dimensions = fetch_video_orientation.parse_dimensions_from_asset_names(
+    pd.Series(['app - 1080 by 1920 - v1']),
+    element_delimiter=' - ',
+    orientation_position=1,
+    orientation_delimiter='by',
+  )
+
+  assert dimensions.values.tolist() == [[1080, 1920]]
+
+
+def test_extract_dimensions_from_asset_names():
+  dimensions = fetch_video_orientation.extract_dimensions_from_asset_names(
+    pd.Series(['app_w1920-h1080', 'app']),
+    width_expression=r'w\d+',
+    height_expression=r'h\d+',
+  )
+
+  assert dimensions.fillna(-1).values.tolist() == [[1920, 1080], [-1, -1]]
+
+
+def test_get_video_orientations_from_asset_names_prefers_parsed_names():
+  video_assets = pd.DataFrame(
+    {
+      'youtube_video_id': ['a', 'a', 'b', 'c'],
+      'asset_name': ['a_unknown', 'a_1080x1920', 'b_1920x1080', 'c_1x1'],
+    }
+  )
+
+  video_orientations = (
+    fetch_video_orientation.get_video_orientations_from_asset_names(
+      video_assets,
+      'regex',
+      element_delimiter='_',
+      orientation_position='1',
+      orientation_delimiter='x',
+    )
+  )
+
+  assert sorted(video_orientations.values.tolist()) == [
+    ['a', 'Portrait'],
+    ['b', 'Landscape'],
+    ['c', 'Square'],
+  ]
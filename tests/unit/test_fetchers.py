@@ -0,0 +1,191 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import gaarf
+import grpc
+import pandas as pd
+import pytest
+from google.ads.googleads import errors as googleads_errors
+from src import fetchers, queries
+
+
+def _get_lag_report(results):
+  def get_report(query, customer_id):
+    return gaarf.report.GaarfReport(
+      results=results.get(customer_id, []),
+      column_names=['network', 'conversion_id', 'all_conversions'],
+    )
+
+  return get_report
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_fetch_and_aggregate_sums_reports_from_all_accounts(
+  fake_report_fetcher, max_workers
+):
+  report_fetcher = fake_report_fetcher(
+    _get_lag_report(
+      {
+        '1': [
+          ['SEARCH', '1', 1.0],
+          ['SEARCH', '1', 2.0],
+          ['SEARCH', '2', 1.0],
+        ],
+        '2': [['SEARCH', '1', 3.0]],
+        '4': [['YOUTUBE', '1', 5.0]],
+      }
+    )
+  )
+
+  aggregated = fetchers.fetch_and_aggregate(
+    report_fetcher,
+    queries.ConversionLagQuery('2024-01-01', '2024-01-28'),
+    ['1', '2', '3', '4'],
+    group_by=['network', 'conversion_id'],
+    value_columns=['all_conversions'],
+    max_workers=max_workers,
+  )
+
+  assert sorted(
+    customer_id for _, customer_id in report_fetcher.requests
+  ) == ['1', '2', '3', '4']
+  expected_data = pd.DataFrame(
+    data=[('SEARCH', '1', 6.0), ('SEARCH', '2', 1.0), ('YOUTUBE', '1', 5.0)],
+    columns=['network', 'conversion_id', 'all_conversions'],
+  )
+  pd.testing.assert_frame_equal(
+    aggregated.sort_values(['network', 'conversion_id']).reset_index(
+      drop=True
+    ),
+    expected_data,
+  )
+
+
+class FakeRpcError(grpc.RpcError):
+  def __init__(self, code):
+    self._code = code
+
+  def code(self):
+    return self._code
+
+
+def _get_sharded_report(query, customer_ids):
+  return gaarf.report.GaarfReport(
+    results=[[query, customer_id] for customer_id in customer_ids],
+    column_names=['query', 'customer_id'],
+  )
+
+
+def _ads_error(code):
+  return googleads_errors.GoogleAdsException(
+    FakeRpcError(code), None, None, 'request_id'
+  )
+
+
+def test_fetch_sharded_reports_fetches_each_shard_separately(
+  fake_report_fetcher,
+):
+  report_fetcher = fake_report_fetcher(_get_sharded_report)
+  customer_ids = [str(i) for i in range(5)]
+
+  results = {
+    name: (report, stats)
+    for name, report, stats in fetchers.fetch_sharded_reports(
+      report_fetcher,
+      {'first': 'first', 'second': 'second'},
+      customer_ids,
+      shard_size=2,
+    )
+  }
+
+  assert report_fetcher.requests[:2] == [
+    ('first', ['0', '1']),
+    ('second', ['0', '1']),
+  ]
+  assert len(report_fetcher.requests) == 6
+  for name in ('first', 'second'):
+    report, stats = results[name]
+    assert [row.customer_id for row in report] == customer_ids
+    assert stats['accounts'] == 5
+    assert stats['shards'] == 3
+    assert stats['rows'] == 5
+    assert stats['wall_seconds'] >= 0
+
+
+def test_fetch_sharded_reports_fetches_constant_resources_once(
+  fake_report_fetcher,
+):
+  report_fetcher = fake_report_fetcher(_get_sharded_report)
+  query = gaarf.query_editor.QuerySpecification(
+    'SELECT geo_target_constant.id AS id FROM geo_target_constant'
+  ).generate()
+
+  results = list(
+    fetchers.fetch_sharded_reports(
+      report_fetcher, {'geo': query}, ['1', '2', '3'], shard_size=1
+    )
+  )
+
+  assert len(report_fetcher.requests) == 1
+  assert results[0][2]['shards'] == 1
+
+
+def test_fetch_sharded_reports_retries_exhausted_quota(fake_report_fetcher):
+  report_fetcher = fake_report_fetcher(
+    _get_sharded_report,
+    failures=[_ads_error(grpc.StatusCode.RESOURCE_EXHAUSTED)],
+  )
+
+  results = list(
+    fetchers.fetch_sharded_reports(
+      report_fetcher, {'first': 'first'}, ['1'], backoff_seconds=0
+    )
+  )
+
+  assert len(report_fetcher.requests) == 2
+  assert results[0][2]['rows'] == 1
+
+
+def test_fetch_sharded_reports_reports_failed_query_and_fetches_others(
+  fake_report_fetcher,
+):
+  report_fetcher = fake_report_fetcher(
+    _get_sharded_report,
+    failures=[_ads_error(grpc.StatusCode.INVALID_ARGUMENT)],
+  )
+
+  results = {
+    name: (report, stats)
+    for name, report, stats in fetchers.fetch_sharded_reports(
+      report_fetcher,
+      {'first': 'first', 'second': 'second'},
+      ['1', '2', '3'],
+      shard_size=1,
+      backoff_seconds=0,
+    )
+  }
+
+  failed_report, failed_stats = results['first']
+  assert failed_report is None
+  assert failed_stats['status'] == 'failed'
+  assert failed_stats['error']
+  report, stats = results['second']
+  assert stats['status'] == 'completed'
+  assert len(report) == 3
+
+
+def test_combine_reports_returns_empty_report_without_reports():
+  report = fetchers.combine_reports([])
+
+  assert not report
+  assert report.column_names == []
@@ -0,0 +1,121 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import datetime
+
+import gaarf
+import pandas as pd
+from src import lag_store
+
+
+def _get_lag_report(conversions=1.0):
+  def get_report(query, customer_ids):
+    if isinstance(customer_ids, str):
+      customer_ids = [customer_ids]
+    results = [
+      [
+        date.strftime('%Y-%m-%d'),
+        int(customer_id),
+        1,
+        'SEARCH',
+        '1',
+        'LESS_THAN_ONE_DAY',
+        conversions,
+      ]
+      for date in pd.date_range(query.start_date, query.end_date)
+      for customer_id in customer_ids
+    ]
+    return gaarf.report.GaarfReport(
+      results=results,
+      column_names=[
+        'date',
+        'account_id',
+        'campaign_id',
+        'network',
+        'conversion_id',
+        'conversion_lag_bucket',
+        'all_conversions',
+      ],
+    )
+
+  return get_report
+
+
+def _get_empty_report(query, customer_ids):
+  return gaarf.report.GaarfReport(results=[], column_names=['date'])
+
+
+def _get_requested_periods(report_fetcher):
+  return [
+    (query.start_date, query.end_date, customer_ids)
+    for query, customer_ids in report_fetcher.requests
+  ]
+
+
+def test_conversion_lag_store_fetches_only_missing_days(
+  fake_report_fetcher, tmp_path
+):
+  report_fetcher = fake_report_fetcher(_get_lag_report())
+  store = lag_store.ConversionLagStore(str(tmp_path))
+
+  store.update(report_fetcher, ['1'], '2024-01-01', '2024-01-10')
+  lag_data = store.update(
+    report_fetcher, ['1', '2'], '2024-01-02', '2024-01-11'
+  )
+
+  assert _get_requested_periods(report_fetcher) == [
+    ('2024-01-01', '2024-01-10', '1'),
+    ('2024-01-11', '2024-01-11', '1'),
+    ('2024-01-02', '2024-01-11', '2'),
+  ]
+  assert len(lag_data) == 20
+  assert 'date' not in lag_data.columns
+
+
+def test_conversion_lag_store_does_not_refetch_days_without_data(
+  fake_report_fetcher, tmp_path
+):
+  report_fetcher = fake_report_fetcher(_get_empty_report)
+  store = lag_store.ConversionLagStore(str(tmp_path))
+
+  store.update(report_fetcher, ['1'], '2024-01-01', '2024-01-10')
+  lag_data = store.update(report_fetcher, ['1'], '2024-01-01', '2024-01-10')
+
+  assert _get_requested_periods(report_fetcher) == [
+    ('2024-01-01', '2024-01-10', '1')
+  ]
+  assert lag_data.empty
+
+
+def test_conversion_lag_store_refetches_days_inside_attribution_window(
+  fake_report_fetcher, tmp_path
+):
+  today = datetime.date.today()
+  start_date, first_open_date, end_date = (
+    (today - datetime.timedelta(days=days)).strftime('%Y-%m-%d')
+    for days in (95, 90, 30)
+  )
+  report_fetcher = fake_report_fetcher(_get_lag_report())
+  store = lag_store.ConversionLagStore(str(tmp_path))
+
+  store.update(report_fetcher, ['1'], start_date, end_date)
+  report_fetcher.get_report = _get_lag_report(conversions=2.0)
+  lag_data = store.update(report_fetcher, ['1'], start_date, end_date)
+
+  assert _get_requested_periods(report_fetcher)[-1] == (
+    first_open_date,
+    end_date,
+    '1',
+  )
+  assert len(lag_data) == 66
+  assert lag_data['all_conversions'].sum() == 5 + 61 * 2
@@ -0,0 +1,149 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import sys
+import time
+
+import pytest
+from scripts import run_pipeline
+from src import pipeline
+
+
+def _sleep(seconds):
+  return lambda: time.sleep(seconds)
+
+
+def _fail():
+  raise ValueError('step failed')
+
+
+def test_pipeline_runs_independent_steps_concurrently():
+  steps = [
+    pipeline.Step('a', _sleep(0.2)),
+    pipeline.Step('b', _sleep(0.2)),
+    pipeline.Step('c', _sleep(0.2)),
+    pipeline.Step('d', _sleep(0.1), ['a', 'b']),
+  ]
+  app_pipeline = pipeline.Pipeline(steps)
+
+  app_pipeline.run(max_workers=4)
+  report = app_pipeline.get_report()
+
+  assert [step.status for step in steps] == ['completed'] * 4
+  assert report['wall_time_seconds'] < 0.5
+  assert report['critical_path'][-1] == 'd'
+  assert report['critical_path_seconds'] == pytest.approx(0.3, abs=0.1)
+
+
+def test_pipeline_starts_step_after_its_dependencies():
+  finished = []
+  steps = [
+    pipeline.Step('b', lambda: finished.append('b'), ['a']),
+    pipeline.Step('a', lambda: (time.sleep(0.05), finished.append('a'))),
+  ]
+
+  pipeline.Pipeline(steps).run(max_workers=2)
+
+  assert finished == ['a', 'b']
+
+
+def test_pipeline_skips_dependants_of_failed_step():
+  steps = [
+    pipeline.Step('a', _fail),
+    pipeline.Step('b', _sleep(0), ['a']),
+    pipeline.Step('c', _sleep(0.1)),
+  ]
+  app_pipeline = pipeline.Pipeline(steps)
+
+  with pytest.raises(pipeline.PipelineError, match='Failed steps: a'):
+    app_pipeline.run(max_workers=2)
+
+  assert [step.status for step in steps] == ['failed', 'skipped', 'completed']
+
+
+@pytest.mark.parametrize(
+  ('steps', 'error'),
+  [
+    (
+      [pipeline.Step('a', _fail), pipeline.Step('a', _fail)],
+      'Duplicated step a',
+    ),
+    ([pipeline.Step('a', _fail, ['b'])], 'depends on unknown steps: b'),
+    (
+      [pipeline.Step('a', _fail, ['b']), pipeline.Step('b', _fail, ['a'])],
+      'Dependency cycle',
+    ),
+  ],
+)
+def test_pipeline_raises_error_on_invalid_steps(steps, error):
+  with pytest.raises(pipeline.PipelineError, match=error):
+    pipeline.Pipeline(steps)
+
+
+def test_run_command_returns_output_and_raises_error_on_failure():
+  output = pipeline.run_command([sys.executable, '-c', 'print("2024-01-01")'])
+
+  assert output == '2024-01-01\n'
+  with pytest.raises(pipeline.PipelineError, match='exited with code 1'):
+    pipeline.run_command([sys.executable, '-c', 'exit(1)'], name='failing')
+
+
+@pytest.fixture
+def steps():
+  config = {
+    'gaarf': {'bq': {'dataset': 'arp'}},
+    'scripts': {'skan_mode': {'mode': 'table'}},
+    'incremental': True,
+  }
+  builder = run_pipeline.PipelineBuilder('app_reporting_pack.yaml', config)
+  steps = builder.build()
+  return {step.name: step for step in steps}
+
+
+def test_pipeline_builder_makes_modules_depend_on_core_views(steps):
+  assert 'core.views' in steps['geo.outputs'].dependencies
+  assert 'core.views' in steps['disapprovals.snapshots'].dependencies
+  assert 'geo.fetch' in steps['geo.outputs'].dependencies
+  assert steps['core.fetch'].dependencies == []
+  assert steps['assets.fetch'].dependencies == []
+
+
+def test_pipeline_builder_orders_steps_writing_same_tables(steps):
+  assert '{target_dataset}.change_history' in steps['core.outputs'].outputs
+  assert '{target_dataset}.change_history' in steps['assets.outputs'].outputs
+  assert 'core.outputs' in steps['assets.outputs'].dependencies
+
+
+def test_pipeline_builder_orders_steps_reading_tables_of_other_modules(steps):
+  assert 'assets.snapshots' in steps['disapprovals.outputs'].dependencies
+
+
+def test_pipeline_builder_builds_valid_pipeline(steps):
+  app_pipeline = pipeline.Pipeline(list(steps.values()))
+
+  assert set(app_pipeline.levels[0]) >= {
+    'core.fetch',
+    'assets.fetch',
+    'disapprovals.fetch',
+    'ios_skan.fetch',
+    'geo.fetch',
+  }
+  assert app_pipeline.levels[-1] == ['last_run']
+  assert 'geo.incremental_saving' in steps
+  assert 'core.legacy_views' not in steps
+
+
+def test_pipeline_builder_skips_ios_skan_without_skan_mode():
+  steps = run_pipeline.PipelineBuilder('app_reporting_pack.yaml', {}).build()
+
+  assert not [step for step in steps if step.name.startswith('ios_skan')]
@@ -0,0 +1,141 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+
+import pytest
+from scripts import run_bq_queries
+from src import pipeline, sql_graph
+
+_APP_DIR = run_bq_queries.APP_DIR
+
+
+def _query(module, *path):
+  return os.path.join(_APP_DIR, module, 'bq_queries', *path)
+
+
+@pytest.fixture(scope='module')
+def dependencies():
+  paths = sql_graph.get_module_queries(
+    _APP_DIR, sql_graph.MODULES, legacy=True, incremental=True
+  )
+  return sql_graph.get_dependencies(
+    [sql_graph.parse_query(path) for path in paths]
+  )
+
+
+def test_parse_query_finds_targets_and_sources():
+  query = sql_graph.parse_query(_query('assets', 'change_history.sql'))
+
+  assert query.targets == {'{target_dataset}.change_history'}
+  assert '{target_dataset}.change_history' in query.sources
+  assert '{bq_dataset}.asset_structure_snapshot_*' in query.sources
+
+
+def test_parse_query_finds_functions():
+  functions = sql_graph.parse_query(_query('core', 'views', 'functions.sql'))
+  change_history = sql_graph.parse_query(_query('core', 'change_history.sql'))
+
+  assert functions.targets & change_history.sources
+
+
+def test_parse_query_substitutes_macros():
+  query = sql_graph.parse_query(
+    'query.sql',
+    'CREATE OR REPLACE TABLE `{target_dataset}.a_{date_iso}` AS\n'
+    'SELECT * FROM `{bq_dataset}.b` JOIN {bq_dataset}.c USING (id)',
+    macros={'bq_dataset': 'arp', 'target_dataset': 'arp'},
+  )
+
+  assert query.targets == {'arp.a_{date_iso}'}
+  assert query.sources == {'arp.b', 'arp.c'}
+
+
+def test_get_module_queries_orders_modules_as_they_run():
+  assert sql_graph.get_module_queries(
+    _APP_DIR, ['geo', 'assets', 'core']
+  ) == sql_graph.get_module_queries(_APP_DIR, ['core', 'assets', 'geo'])
+  assert sql_graph.sort_modules(['ios_skan', 'custom', 'geo', 'core']) == [
+    'core',
+    'geo',
+    'ios_skan',
+    'custom',
+  ]
+
+
+def test_get_dependencies_orders_reads_and_writes():
+  queries = [
+    sql_graph.SqlQuery('write_a', {'a'}, set()),
+    sql_graph.SqlQuery('read_a', {'b'}, {'a'}),
+    sql_graph.SqlQuery('rewrite_a', {'a'}, set()),
+    sql_graph.SqlQuery('independent', {'c'}, {'external'}),
+  ]
+
+  assert sql_graph.get_dependencies(queries) == {
+    'write_a': [],
+    'read_a': ['write_a'],
+    'rewrite_a': ['write_a', 'read_a'],
+    'independent': [],
+  }
+
+
+def test_get_dependencies_matches_wildcards(dependencies):
+  assert _query('assets', 'snapshots', 'asset_structure_snapshot.sql') in (
+    dependencies[_query('assets', 'change_history.sql')]
+  )
+  assert _query('assets', 'asset_performance.sql') in (
+    dependencies[_query('assets', 'incremental', 'incremental_saving.sql')]
+  )
+
+
+def test_get_dependencies_finds_dependencies_across_modules(dependencies):
+  snapshot = _query(
+    'assets', 'snapshots', 'asset_approval_statuses_snapshot.sql'
+  )
+  approval_statuses = _query('disapprovals', 'approval_statuses.sql')
+  assert snapshot in dependencies[approval_statuses]
+  assert dependencies[_query('ios_skan', 'change_history.sql')][-1] == (
+    _query('assets', 'legacy_views', 'final_change_history.sql')
+  )
+
+
+def test_get_dependencies_runs_independent_outputs_concurrently(dependencies):
+  levels = pipeline.Pipeline(
+    [pipeline.Step(path, None, deps) for path, deps in dependencies.items()]
+  ).levels
+
+  assert len(levels) < len(dependencies) / 3
+  assert {
+    _query('assets', 'asset_conversion_split.sql'),
+    _query('assets', 'creative_excellence.sql'),
+    _query('core', 'change_history.sql'),
+    _query('geo', 'geo_performance.sql'),
+  } <= set(levels[1])
+
+
+def test_build_steps_runs_queries_after_their_dependencies(
+  fake_bigquery_executor,
+):
+  paths = sql_graph.get_module_queries(_APP_DIR, ['core', 'assets'])
+  executor = fake_bigquery_executor()
+  steps = run_bq_queries.build_steps(
+    paths, executor, {'macro': {'bq_dataset': 'arp'}}
+  )
+
+  pipeline.Pipeline(steps).run(max_workers=4)
+
+  assert sorted(executor.executed_scripts) == sorted(paths)
+  position = {path: i for i, path in enumerate(executor.executed_scripts)}
+  for step in steps:
+    for dependency in step.dependencies:
+      assert position[dependency] < position[step.name]
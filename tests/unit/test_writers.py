@@ -0,0 +1,161 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import datetime
+import os
+
+import gaarf
+import pandas as pd
+import pytest
+from google.api_core import exceptions as google_api_exceptions
+from google.cloud import exceptions as google_cloud_exceptions
+from src import writers
+
+
+class FakeBigQueryWriter:
+  def __init__(self):
+    self.reports = {}
+
+  def write(self, report, destination):
+    self.reports[destination] = report
+    return destination
+
+
+class FakeLoadJob:
+  def result(self):
+    return None
+
+
+class FakeBigQueryClient:
+  instances = 0
+
+  def __init__(self, project):
+    FakeBigQueryClient.instances += 1
+    self.datasets = set()
+    self.loaded_tables = []
+
+  def get_dataset(self, dataset_id):
+    if dataset_id not in self.datasets:
+      raise google_cloud_exceptions.NotFound(dataset_id)
+
+  def create_dataset(self, dataset, exists_ok=False, timeout=None):
+    self.datasets.add(f'{dataset.project}.{dataset.dataset_id}')
+
+  def load_table_from_file(self, data, table_id, job_config, location):
+    self.loaded_tables.append(table_id)
+    return FakeLoadJob()
+
+
+@pytest.fixture
+def loader(tmp_path):
+  return writers.LocalLoader(str(tmp_path))
+
+
+def test_columnar_writer_saves_data_with_inferred_schema(loader):
+  data = pd.DataFrame(
+    {
+      'day': [datetime.date(2024, 1, 1), datetime.date(2024, 1, 2)],
+      'campaign_id': [1, 2],
+      'network': pd.Categorical(['SEARCH', 'YOUTUBE']),
+      'target_roas': [1.5, float('nan')],
+    }
+  )
+  writer = writers.ColumnarBigQueryWriter('project', 'dataset', loader=loader)
+
+  writer.write(data, 'bid_budgets_20240101')
+
+  assert [
+    (field.name, field.field_type)
+    for field in loader.schemas['dataset.bid_budgets_20240101']
+  ] == [
+    ('day', 'DATE'),
+    ('campaign_id', 'INT64'),
+    ('network', 'STRING'),
+    ('target_roas', 'FLOAT64'),
+  ]
+  saved_data = pd.read_parquet(
+    os.path.join(loader.directory, 'dataset.bid_budgets_20240101.parquet')
+  )
+  assert saved_data['campaign_id'].tolist() == [1, 2]
+  assert saved_data['target_roas'].isna().tolist() == [False, True]
+
+
+def test_columnar_writer_respects_write_disposition(loader):
+  data = pd.DataFrame({'campaign_id': [1]})
+  writers.ColumnarBigQueryWriter(
+    'project', 'dataset', write_disposition='WRITE_APPEND', loader=loader
+  ).write(data, 'table')
+  writers.ColumnarBigQueryWriter(
+    'project', 'dataset', write_disposition='WRITE_APPEND', loader=loader
+  ).write(data, 'table')
+
+  with pytest.raises(google_api_exceptions.Conflict):
+    writers.ColumnarBigQueryWriter(
+      'project', 'dataset', write_disposition='WRITE_EMPTY', loader=loader
+    ).write(data, 'table')
+  assert len(
+    pd.read_parquet(os.path.join(loader.directory, 'dataset.table.parquet'))
+  ) == 2
+
+
+def test_columnar_writer_copies_and_deletes_tables(loader):
+  writer = writers.ColumnarBigQueryWriter(
+    'project', 'dataset', write_disposition='WRITE_EMPTY', loader=loader
+  )
+  writer.write(pd.DataFrame({'campaign_id': [1, 2]}), 'staging')
+
+  writer.copy('staging', 'snapshot')
+  writer.delete('staging')
+
+  with pytest.raises(google_api_exceptions.Conflict):
+    writer.copy('snapshot', 'snapshot')
+  assert sorted(os.listdir(loader.directory)) == ['dataset.snapshot.parquet']
+  assert pd.read_parquet(
+    os.path.join(loader.directory, 'dataset.snapshot.parquet')
+  )['campaign_id'].tolist() == [1, 2]
+
+
+def test_columnar_writer_falls_back_to_report_writer(loader):
+  writer = writers.ColumnarBigQueryWriter('project', 'dataset', loader=loader)
+  writer.fallback_writer = FakeBigQueryWriter()
+  report = gaarf.report.GaarfReport(results=[[1]], column_names=['value'])
+
+  writer.write(report, 'report')
+  writer.write(pd.DataFrame({'value': [1, 'a']}), 'mixed_types')
+
+  assert writer.fallback_writer.reports['report'] == report
+  assert writer.fallback_writer.reports['mixed_types'].results == [[1], ['a']]
+  assert not loader.schemas
+
+
+def test_bigquery_loader_reuses_client_and_creates_missing_dataset(
+  monkeypatch,
+):
+  monkeypatch.setattr(writers.bigquery, 'Client', FakeBigQueryClient)
+  FakeBigQueryClient.instances = 0
+  bigquery_loader = writers.BigQueryLoader('project')
+
+  for table in ('dataset.a', 'dataset.b'):
+    bigquery_loader.load(
+      writers.to_parquet(pd.DataFrame({'value': [1]})),
+      table,
+      [],
+      'WRITE_TRUNCATE',
+    )
+
+  assert FakeBigQueryClient.instances == 1
+  assert bigquery_loader.client.datasets == {'project.dataset'}
+  assert bigquery_loader.client.loaded_tables == [
+    'project.dataset.a',
+    'project.dataset.b',
+  ]
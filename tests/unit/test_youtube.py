@@ -0,0 +1,183 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import threading
+from http import server
+from urllib import parse
+
+import garf_youtube_data_api
+import pytest
+from scripts import fetch_video_orientation
+from src import youtube
+
+_QUERY = """
+SELECT
+  id AS video_id,
+  player.embedWidth AS width,
+  player.embedHeight AS height
+FROM videos
+"""
+
+
+class FakeYouTubeHandler(server.BaseHTTPRequestHandler):
+  def do_GET(self):
+    api = self.server.api
+    params = parse.parse_qs(parse.urlparse(self.path).query)
+    ids = [id for value in params.get('id', []) for id in value.split(',')]
+    with api.lock:
+      api.batches.append(ids)
+      status = api.statuses.pop(0) if api.statuses else 200
+    if status == 200 and api.bad_video in ids:
+      status = 400
+    if status == 200:
+      body = {
+        'items': [
+          {'id': id, 'player': api.videos[id]} for id in ids if id in api.videos
+        ]
+      }
+    else:
+      body = {'error': {'code': status, 'message': 'error'}}
+    payload = json.dumps(body).encode('utf-8')
+    self.send_response(status)
+    self.send_header('Content-Type', 'application/json')
+    self.send_header('Content-Length', str(len(payload)))
+    self.end_headers()
+    self.wfile.write(payload)
+
+  def log_message(self, *args):
+    pass
+
+
+class FakeYouTubeApi:
+  def __init__(self, videos, statuses=None, bad_video=None):
+    self.videos = videos
+    self.statuses = list(statuses or [])
+    self.bad_video = bad_video
+    self.batches = []
+    self.lock = threading.Lock()
+    self.server = server.ThreadingHTTPServer(
+      ('127.0.0.1', 0), FakeYouTubeHandler
+    )
+    self.server.api = self
+    self.thread = threading.Thread(target=self.server.serve_forever)
+
+  @property
+  def client(self):
+    return youtube.YouTubeDataApiClient(
+      api_key='fake',
+      api_endpoint=f'http://127.0.0.1:{self.server.server_port}',
+    )
+
+  def __enter__(self):
+    self.thread.start()
+    return self
+
+  def __exit__(self, *args):
+    self.server.shutdown()
+    self.server.server_close()
+    self.thread.join()
+
+
+def _generate_videos(n):
+  return {
+    f'video_{i}': {'embedWidth': 480, 'embedHeight': 270} for i in range(n)
+  }
+
+
+def _fetch(api, ids, **kwargs):
+  return youtube.fetch_by_ids(
+    garf_youtube_data_api.YouTubeDataApiReportFetcher(api.client),
+    _QUERY,
+    ids,
+    rate_limiter=youtube.RateLimiter(requests_per_second=0),
+    backoff_seconds=0,
+    **kwargs,
+  )
+
+
+def test_fetch_by_ids_splits_ids_into_batches():
+  videos = _generate_videos(120)
+  with FakeYouTubeApi(videos) as api:
+    report, failed_ids = _fetch(api, list(videos))
+
+  assert failed_ids == []
+  assert sorted(report['video_id'].to_list(row_type='scalar')) == sorted(videos)
+  assert sorted(len(batch) for batch in api.batches) == [20, 50, 50]
+
+
+def test_fetch_by_ids_retries_transient_errors():
+  videos = _generate_videos(10)
+  with FakeYouTubeApi(videos, statuses=[503]) as api:
+    report, failed_ids = _fetch(api, list(videos), max_workers=1)
+
+  assert failed_ids == []
+  assert len(report) == 10
+  assert len(api.batches) == 2
+
+
+def test_fetch_by_ids_returns_ids_of_failed_batches():
+  videos = _generate_videos(60)
+  with FakeYouTubeApi(videos, bad_video='video_55') as api:
+    report, failed_ids = _fetch(api, list(videos))
+
+  assert failed_ids == [f'video_{i}' for i in range(50, 60)]
+  assert len(report) == 50
+  assert len(api.batches) == 2
+
+
+def test_fetch_by_ids_stops_after_max_requests():
+  videos = _generate_videos(120)
+  with FakeYouTubeApi(videos) as api:
+    report, failed_ids = youtube.fetch_by_ids(
+      garf_youtube_data_api.YouTubeDataApiReportFetcher(api.client),
+      _QUERY,
+      list(videos),
+      max_workers=1,
+      rate_limiter=youtube.RateLimiter(requests_per_second=0, max_requests=2),
+    )
+
+  assert len(report) == 100
+  assert len(failed_ids) == 20
+  assert len(api.batches) == 2
+
+
+def test_rate_limiter_raises_error_when_quota_is_exhausted():
+  rate_limiter = youtube.RateLimiter(requests_per_second=0, max_requests=5)
+  rate_limiter.wait()
+  rate_limiter.exhaust()
+
+  with pytest.raises(youtube.QuotaExceededError):
+    rate_limiter.wait()
+
+
+def test_get_video_orientations_from_youtube_data_api_marks_failed_videos():
+  videos = {
+    'landscape': {'embedWidth': 480, 'embedHeight': 270},
+    'portrait': {'embedWidth': 270, 'embedHeight': 480},
+    'square': {'embedWidth': 480, 'embedHeight': 480},
+  }
+  with FakeYouTubeApi(videos) as api:
+    report = (
+      fetch_video_orientation.get_video_orientations_from_youtube_data_api(
+        ['landscape', 'portrait', 'square', 'missing'],
+        api_client=api.client,
+      )
+    )
+
+  assert sorted(report.values.tolist()) == [
+    ['landscape', 'Landscape'],
+    ['missing', 'Unknown'],
+    ['portrait', 'Portrait'],
+    ['square', 'Square'],
+  ]